@@ -1,9 +1,11 @@
 import json
 import os
 import pandas as pd
+import instrumentacao
 
 DATA_DIR = "."
 
+@instrumentacao.instrumentado("io.insights")
 def load_stock_insights_data(symbol_filename_stem):
     """Carrega os dados de insights de uma ação a partir de um arquivo JSON."""
     filepath = os.path.join(DATA_DIR, f"{symbol_filename_stem}_insights.json")
@@ -13,6 +15,7 @@ def load_stock_insights_data(symbol_filename_stem):
     try:
         with open(filepath, 'r') as f:
             data = json.load(f)
+        instrumentacao.anotar_arquivo_lido(filepath)
         return data
     except Exception as e:
         print(f"Erro ao carregar dados de insights de {filepath}: {e}")
@@ -2,9 +2,12 @@ import pandas as pd
 import numpy as np
 import json
 import os
+import calendario_mercado
+import instrumentacao
 
 DATA_DIR = "."
 
+@instrumentacao.instrumentado("io.historico")
 def load_stock_chart_data(symbol_filename_stem):
     """Carrega os dados históricos de uma ação a partir de um arquivo CSV."""
     filepath = os.path.join(DATA_DIR, f"{symbol_filename_stem}_chart.csv")
@@ -13,17 +16,21 @@ def load_stock_chart_data(symbol_filename_stem):
         return None
     try:
         df = pd.read_csv(filepath, index_col='Timestamp', parse_dates=True)
-        return df
+        instrumentacao.anotar_arquivo_lido(filepath)
+        # Índice por data de pregão, sem hora/fuso e sem barras duplicadas
+        return calendario_mercado.normalize_daily_index(df)
     except Exception as e:
         print(f"Erro ao carregar dados históricos de {filepath}: {e}")
         return None
 
+@instrumentacao.instrumentado("indicadores.sma")
 def calculate_moving_average(df, window, price_column='Adj Close'):
     """Calcula a média móvel simples."""
     if df is None or price_column not in df.columns:
         return None
     return df[price_column].rolling(window=window).mean()
 
+@instrumentacao.instrumentado("indicadores.rsi")
 def calculate_rsi(df, window=14, price_column='Adj Close'):
     """Calcula o Índice de Força Relativa (RSI)."""
     if df is None or price_column not in df.columns:
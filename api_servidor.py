@@ -0,0 +1,300 @@
+"""Serviço HTTP local (sem interface) para recomendações, indicadores, backtests e otimizações.
+
+Uso:
+    python api_servidor.py                          # http://127.0.0.1:8765
+    python api_servidor.py --porta 9000 --workers 4 --ttl 600
+
+Endpoints (GET, parâmetros na query string, respostas JSON):
+    /saude
+    /recomendacoes?stems=br_PETR4_SA,us_AAPL[&macro_BR=Positivo&macro_US=Neutro]
+    /indicadores?stem=br_PETR4_SA[&sma=50,200&rsi=14&ultimos=30]
+    /backtest?stem=br_PETR4_SA[&curta=50&longa=200]
+    /otimizacao?stems=br_PETR4_SA,us_AAPL[&metodo=max_sharpe&retornos=black_litterman]
+
+Os resultados são memorizados num cache TTL pela chave (endpoint, parâmetros normalizados, mtime dos
+arquivos de dados envolvidos), de modo que uma nova coleta invalida as respostas antigas. Requisições
+idênticas simultâneas aguardam o mesmo cálculo (coalescência) e o trabalho pesado roda num pool de
+processos, fora do loop de eventos; o corpo JSON já serializado é o que fica em cache.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import cachetools
+import tornado.web
+
+import analise_quantitativa
+import backtest_module
+import calendario_mercado
+import otimizacao_carteira
+import recomendacoes_module
+import universo
+
+DATA_DIR = "."
+DEFAULT_PORT = 8765
+DEFAULT_TTL = 300
+DEFAULT_CACHE_SIZE = 1024
+MAX_STEMS = 500
+MACRO_REGIMES = ("Positivo", "Neutro", "Negativo")
+
+class ErroRequisicao(ValueError):
+    """Parâmetros inválidos (resposta 400)."""
+
+# --- Serialização ---
+
+def _jsonable(value):
+    """Converte resultados (numpy/pandas, NaN) em tipos aceitos pelo JSON."""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (float, np.floating)):
+        return None if not math.isfinite(value) else float(value)
+    return value
+
+def _resposta(status, payload):
+    return status, json.dumps(_jsonable(payload), ensure_ascii=False).encode("utf-8")
+
+# --- Normalização dos parâmetros (processo principal) ---
+
+def _lista(params, nome, obrigatorio=True):
+    itens = [p.strip() for p in params.get(nome, "").split(",") if p.strip()]
+    if obrigatorio and not itens:
+        raise ErroRequisicao(f"Parâmetro '{nome}' é obrigatório.")
+    return list(dict.fromkeys(itens))
+
+def _inteiro(params, nome, padrao, minimo=1, maximo=10_000):
+    try:
+        valor = int(params.get(nome, padrao))
+    except ValueError:
+        raise ErroRequisicao(f"Parâmetro '{nome}' deve ser inteiro.")
+    if not minimo <= valor <= maximo:
+        raise ErroRequisicao(f"Parâmetro '{nome}' deve estar entre {minimo} e {maximo}.")
+    return valor
+
+def _stems(params, nome="stems"):
+    stems = _lista(params, nome)
+    if len(stems) > MAX_STEMS:
+        raise ErroRequisicao(f"No máximo {MAX_STEMS} stems por requisição.")
+    invalidos = [stem for stem in stems if "/" in stem or "\\" in stem or stem.startswith(".")]
+    if invalidos:
+        raise ErroRequisicao(f"Stems inválidos: {invalidos}")
+    return stems
+
+def _normalizar_recomendacoes(params):
+    macro = {}
+    for regiao in ("BR", "US"):
+        regime = params.get(f"macro_{regiao}", "Neutro")
+        if regime not in MACRO_REGIMES:
+            raise ErroRequisicao(f"macro_{regiao} deve ser um de {MACRO_REGIMES}.")
+        macro[regiao] = regime
+    return {"stems": _stems(params), "macro": macro}
+
+def _normalizar_indicadores(params):
+    return {"stem": _stems(params, "stem")[0],
+            "sma": sorted({_inteiro({"sma": s}, "sma", 0, 2, 1000) for s in _lista(params, "sma", False) or ["50", "200"]}),
+            "rsi": _inteiro(params, "rsi", 14, 2, 500),
+            "ultimos": _inteiro(params, "ultimos", 30, 1, 5000)}
+
+def _normalizar_backtest(params):
+    curta, longa = _inteiro(params, "curta", 50, 2, 1000), _inteiro(params, "longa", 200, 2, 2000)
+    if curta >= longa:
+        raise ErroRequisicao("A janela curta deve ser menor que a longa.")
+    return {"stem": _stems(params, "stem")[0], "curta": curta, "longa": longa}
+
+def _normalizar_otimizacao(params):
+    metodo = params.get("metodo", "max_sharpe")
+    if metodo not in otimizacao_carteira.OPTIMIZATION_METHODS:
+        raise ErroRequisicao(f"metodo deve ser um de {list(otimizacao_carteira.OPTIMIZATION_METHODS)}.")
+    stems = _stems(params)
+    if len(stems) < 2:
+        raise ErroRequisicao("A otimização precisa de pelo menos 2 stems.")
+    retornos = params.get("retornos", "historico")
+    if retornos not in otimizacao_carteira.RETURN_MODELS:
+        raise ErroRequisicao(f"retornos deve ser um de {list(otimizacao_carteira.RETURN_MODELS)}.")
+    return {"stems": stems, "metodo": metodo, "retornos": retornos}
+
+# --- Tarefas (executadas nos workers; funções de módulo para serem picklable) ---
+
+def _tarefa_recomendacoes(params):
+    return _resposta(200, recomendacoes_module.generate_recommendations(params["stems"], params["macro"]))
+
+def _tarefa_indicadores(params):
+    df = analise_quantitativa.load_stock_chart_data(params["stem"])
+    if df is None or df.empty:
+        return _resposta(404, {"erro": f"Histórico não encontrado para {params['stem']}."})
+    indicadores = pd.DataFrame({"Adj Close": df["Adj Close"]})
+    for janela in params["sma"]:
+        indicadores[f"SMA_{janela}"] = analise_quantitativa.calculate_moving_average(df, janela)
+    indicadores[f"RSI_{params['rsi']}"] = analise_quantitativa.calculate_rsi(df, params["rsi"])
+    ultimos = indicadores.tail(params["ultimos"])
+    return _resposta(200, {"ticker": universo.ticker_of(params["stem"]),
+                           "datas": [d.date().isoformat() for d in ultimos.index],
+                           "series": {c: ultimos[c].tolist() for c in ultimos.columns}})
+
+def _tarefa_backtest(params):
+    price_data, full_data_df = backtest_module.load_quant_analysis_data(params["stem"])
+    if price_data is None or price_data.empty:
+        return _resposta(404, {"erro": f"Análise quantitativa não encontrada para {params['stem']}."})
+    results = backtest_module.run_sma_crossover_backtest(price_data, full_data_df, price_data.columns[0],
+                                                         params["curta"], params["longa"])
+    if results is None:
+        return _resposta(422, {"erro": "O backtest não pôde ser executado com esses dados/parâmetros."})
+    stats = results.stats.iloc[:, 0]
+    return _resposta(200, {"ticker": price_data.columns[0], "estatisticas": stats.to_dict()})
+
+def _tarefa_otimizacao(params):
+    prices = otimizacao_carteira.load_stock_prices_for_optimization(params["stems"])
+    weights, performance = otimizacao_carteira.optimize_portfolio(prices, optimization_method=params["metodo"],
+                                                                retornos=params["retornos"])
+    if weights is None:
+        return _resposta(422, {"erro": "A otimização não encontrou solução para esses ativos."})
+    desempenho = dict(zip(("retorno_esperado", "volatilidade", "sharpe"), performance)) if performance else None
+    return _resposta(200, {"metodo": params["metodo"], "retornos": params["retornos"], "pesos": dict(weights), "desempenho": desempenho})
+
+ENDPOINTS = {
+    "recomendacoes": (_normalizar_recomendacoes, _tarefa_recomendacoes, ("quant", "insights")),
+    "indicadores": (_normalizar_indicadores, _tarefa_indicadores, ("chart",)),
+    "backtest": (_normalizar_backtest, _tarefa_backtest, ("quant",)),
+    "otimizacao": (_normalizar_otimizacao, _tarefa_otimizacao, ("quant", "insights")),
+}
+
+def _init_worker(data_dir):
+    for module in (analise_quantitativa, backtest_module, calendario_mercado, otimizacao_carteira,
+                   recomendacoes_module, universo):
+        module.DATA_DIR = data_dir
+
+def _executar(endpoint, params):
+    """Roda a tarefa no worker com os prints dos módulos silenciados; erros viram resposta 500."""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return ENDPOINTS[endpoint][1](params)
+    except Exception as e:
+        return _resposta(500, {"erro": f"{type(e).__name__}: {e}"})
+
+# --- Cache, coalescência e pool ---
+
+class ServicoResultados:
+    """Cache TTL de respostas serializadas + coalescência de requisições idênticas + pool de processos."""
+
+    def __init__(self, max_workers=None, ttl=DEFAULT_TTL, max_entradas=DEFAULT_CACHE_SIZE, data_dir=None):
+        self.data_dir = DATA_DIR if data_dir is None else data_dir
+        self.cache = cachetools.TTLCache(maxsize=max_entradas, ttl=ttl)
+        self.em_andamento = {}
+        self.contadores = Counter()
+        self.max_workers = max_workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker, initargs=(self.data_dir,))
+
+    def chave(self, endpoint, params):
+        """Endpoint + parâmetros normalizados + mtime dos arquivos dos stems (uma nova coleta muda a chave)."""
+        stems = params.get("stems") or [params["stem"]]
+        mtimes = []
+        for stem in stems:
+            for tipo in ENDPOINTS[endpoint][2]:
+                path = universo.file_path(stem, tipo, self.data_dir)
+                mtimes.append(os.path.getmtime(path) if os.path.exists(path) else None)
+        return endpoint, json.dumps(params, sort_keys=True), tuple(mtimes)
+
+    async def resultado(self, endpoint, params):
+        """(status, corpo_json, origem), com origem em "cache", "coalescido" ou "calculado"."""
+        key = self.chave(endpoint, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.contadores["cache"] += 1
+            return (*cached, "cache")
+        pending = self.em_andamento.get(key)
+        if pending is not None:
+            self.contadores["coalescido"] += 1
+            return (*(await pending), "coalescido")
+        self.contadores["calculado"] += 1
+        pending = asyncio.get_running_loop().run_in_executor(self.pool, _executar, endpoint, params)
+        self.em_andamento[key] = pending
+        try:
+            status, body = await pending
+        finally:
+            self.em_andamento.pop(key, None)
+        if status == 200:
+            self.cache[key] = (status, body)
+        return status, body, "calculado"
+
+    def estado(self):
+        return {"entradas_cache": len(self.cache), "ttl_s": self.cache.ttl, "em_andamento": len(self.em_andamento),
+                "workers": self.max_workers, **self.contadores}
+
+    def fechar(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# --- HTTP ---
+
+class EndpointHandler(tornado.web.RequestHandler):
+    def initialize(self, servico, endpoint):
+        self.servico = servico
+        self.endpoint = endpoint
+
+    async def get(self):
+        inicio = time.perf_counter()
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        params = {nome: self.get_argument(nome) for nome in self.request.arguments}
+        try:
+            params = ENDPOINTS[self.endpoint][0](params)
+        except ErroRequisicao as e:
+            self.set_status(400)
+            self.finish(json.dumps({"erro": str(e)}, ensure_ascii=False))
+            return
+        status, body, origem = await self.servico.resultado(self.endpoint, params)
+        self.set_status(status)
+        self.set_header("X-Cache", origem)
+        self.set_header("X-Tempo-ms", f"{1000 * (time.perf_counter() - inicio):.2f}")
+        self.finish(body)
+
+class SaudeHandler(tornado.web.RequestHandler):
+    def initialize(self, servico):
+        self.servico = servico
+
+    def get(self):
+        self.write({"status": "ok", "endpoints": sorted(ENDPOINTS), **self.servico.estado()})
+
+def criar_aplicacao(servico):
+    rotas = [(r"/saude", SaudeHandler, {"servico": servico})]
+    rotas += [(rf"/{nome}", EndpointHandler, {"servico": servico, "endpoint": nome}) for nome in ENDPOINTS]
+    return tornado.web.Application(rotas)
+
+async def servir(porta=DEFAULT_PORT, endereco="127.0.0.1", max_workers=None, ttl=DEFAULT_TTL,
+                 max_entradas=DEFAULT_CACHE_SIZE, data_dir=None):
+    servico = ServicoResultados(max_workers=max_workers, ttl=ttl, max_entradas=max_entradas, data_dir=data_dir)
+    servidor = criar_aplicacao(servico).listen(porta, address=endereco)
+    print(f"API de resultados em http://{endereco}:{porta} ({servico.max_workers} workers, cache TTL {ttl}s)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        servidor.stop()
+        servico.fechar()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--porta", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--endereco", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=None, help="Processos do pool (padrão: número de CPUs)")
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL, help="Validade das respostas em cache (s)")
+    parser.add_argument("--cache-max", type=int, default=DEFAULT_CACHE_SIZE, help="Máximo de respostas em cache")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(servir(args.porta, args.endereco, args.workers, args.ttl, args.cache_max, args.data_dir))
+    except KeyboardInterrupt:
+        print("Servidor encerrado.")
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,27 @@ import streamlit as st
 import pandas as pd
 import os
 import json
-import matplotlib.pyplot as plt
 
 # Importar módulos do projeto
 import coleta_dados
+import correlacao
 import analise_fundamentalista
 import analise_quantitativa
 import backtest_module
+import black_litterman
+import estrategias
+import estatisticas_backtest
 import otimizacao_carteira
 import recomendacoes_module
+import resultados_backtest
+import scanner_alertas
+import visualizacao_graficos
+import dados_macro
+import eventos_corporativos
+import validacao_dados
+import instrumentacao
+import liquidez
+import universo
 
 # Configuração da página
 st.set_page_config(layout="wide", page_title="Painel Quant-Fundamentalista Interativo")
@@ -23,12 +35,29 @@ analise_quantitativa.DATA_DIR = DATA_DIR
 backtest_module.DATA_DIR = DATA_DIR
 otimizacao_carteira.DATA_DIR = DATA_DIR
 recomendacoes_module.DATA_DIR = DATA_DIR
+correlacao.DATA_DIR = DATA_DIR
+scanner_alertas.DATA_DIR = DATA_DIR
+dados_macro.DATA_DIR = DATA_DIR
+validacao_dados.DATA_DIR = DATA_DIR
+eventos_corporativos.DATA_DIR = DATA_DIR
+resultados_backtest.DATA_DIR = DATA_DIR
+black_litterman.DATA_DIR = DATA_DIR
+liquidez.DATA_DIR = DATA_DIR
+universo.DATA_DIR = DATA_DIR
 
 # Inicializar st.session_state para armazenar dados coletados
 if 'dados_coletados_info' not in st.session_state:
-    st.session_state.dados_coletados_info = {} 
+    # Ativos já coletados em sessões anteriores vêm da tabela do universo
+    tabela_universo = universo.asset_table()
+    st.session_state.dados_coletados_info = {
+        stem: {'ticker': row.ticker, 'region': row.regiao, 'chart_file': row.arquivo_chart,
+               'insights_file': row.arquivo_insights, 'stem': stem}
+        for stem, row in tabela_universo[tabela_universo['tem_chart'] & tabela_universo['tem_insights']].iterrows()
+    }
 if 'ativos_analisados_quant' not in st.session_state:
-    st.session_state.ativos_analisados_quant = {} 
+    st.session_state.ativos_analisados_quant = {stem: universo.file_path(stem, 'quant')
+                                                for stem in universo.stems_with('quant')
+                                                if stem in st.session_state.dados_coletados_info}
 if 'backtests_executados' not in st.session_state:
     st.session_state.backtests_executados = {} 
 if 'otimizacoes_realizadas' not in st.session_state:
@@ -47,7 +76,7 @@ if 'macro_scenario_data' not in st.session_state:
 # Barra lateral para navegação
 st.sidebar.title("Navegação")
 app_mode = st.sidebar.selectbox("Escolha o Módulo:",
-    ["Página Inicial", "Análise de Ativos", "Backtesting", "Recomendações", "Otimização de Carteira", "Cenário Macroeconômico"])
+    ["Página Inicial", "Análise de Ativos", "Backtesting", "Recomendações", "Otimização de Carteira", "Correlações", "Cenário Macroeconômico"])
 
 # --- Módulo: Página Inicial ---
 if app_mode == "Página Inicial":
@@ -60,8 +89,8 @@ if app_mode == "Página Inicial":
     - **Análise de Ativos:** Colete dados, visualize gráficos históricos, indicadores fundamentalistas e quantitativos de empresas. Para empresas da B3, utilize o sufixo `.SA` (ex: `PETR4.SA`).
     - **Backtesting:** Teste estratégias de investimento (ex: Cruzamento de Médias Móveis) com dados históricos.
     - **Recomendações:** Receba sugestões de ativos com base em múltiplos critérios e no cenário macroeconômico.
-    - **Otimização de Carteira:** Construa e balanceie sua carteira de investimentos (ex: Max Sharpe, Mínima Volatilidade), incluindo uma projeção de ganhos/perdas em 12 meses com 95% de confiança.
-    - **Cenário Macroeconômico:** Colete e visualize dados macroeconômicos relevantes (funcionalidade placeholder).
+    - **Otimização de Carteira:** Construa e balanceie sua carteira de investimentos (ex: Max Sharpe, Mínima Volatilidade, HRP, Paridade de Risco), incluindo uma projeção de ganhos/perdas em 12 meses com 95% de confiança.
+    - **Cenário Macroeconômico:** Colete séries macroeconômicas (BCB, FRED) e acompanhe o score de regime de cada país.
     
     **Como usar:**
     1. Comece pelo módulo "Análise de Ativos" para coletar dados de um ou mais tickers. Lembre-se do sufixo `.SA` para ativos da B3.
@@ -69,7 +98,7 @@ if app_mode == "Página Inicial":
     3. Utilize o módulo "Backtesting" para testar estratégias nos ativos com análise quantitativa.
     4. Gere "Recomendações" com base nas análises e no cenário macro.
     5. Otimize uma "Carteira" com os ativos desejados e veja a projeção de risco/retorno.
-    6. Consulte o "Cenário Macroeconômico" para dados específicos (atualmente placeholder).
+    6. Consulte o "Cenário Macroeconômico" para atualizar as séries macro que alimentam as recomendações.
     """)
     st.info("Lembre-se que os dados são obtidos de fontes públicas (yfinance) e podem ter limitações. Este painel é para fins educacionais e de demonstração.")
 
@@ -96,7 +125,7 @@ elif app_mode == "Análise de Ativos":
             if region_clean == "BR" and not ticker_clean.endswith(".SA"):
                 st.warning('Para ativos da B3 (região BR), o ticker deve terminar com ".SA". Exemplo: {ticker_clean}.SA')
             else:
-                stem_key = f"{region_clean.lower()}_{ticker_clean.replace(".", "_")}"
+                stem_key = universo.stem_for(ticker_clean, region_clean)
                 coleta_dados_filename_prefix = region_clean.lower()
                 
                 with st.spinner(f"Buscando dados para {ticker_clean}..."):
@@ -105,9 +134,11 @@ elif app_mode == "Análise de Ativos":
                         success_insights = coleta_dados.fetch_and_save_stock_insights(symbol=ticker_clean, region=region_clean, filename_prefix=coleta_dados_filename_prefix)
                         
                         if success_chart and success_insights:
-                            symbol_part_for_filename = ticker_clean.replace(".", "_")
-                            chart_file_path = os.path.join(DATA_DIR, f"{coleta_dados_filename_prefix}_{symbol_part_for_filename}_chart.csv")
-                            insights_file_path = os.path.join(DATA_DIR, f"{coleta_dados_filename_prefix}_{symbol_part_for_filename}_insights.json")
+                            universo.invalidate()
+                            # Nova barra no universo: varre as regras de alerta (só transições geram alerta)
+                            scanner_alertas.scan_universe()
+                            chart_file_path = universo.file_path(stem_key, 'chart')
+                            insights_file_path = universo.file_path(stem_key, 'insights')
                             
                             st.session_state.dados_coletados_info[stem_key] = {
                                 'ticker': ticker_clean,
@@ -117,7 +148,7 @@ elif app_mode == "Análise de Ativos":
                                 'stem': stem_key 
                             }
                             st.success(f"Dados históricos e insights para {ticker_clean} coletados e salvos!")
-                            st.experimental_rerun()
+                            st.rerun()
                         else:
                             error_messages = []
                             if not success_chart: error_messages.append("Falha ao buscar/salvar dados históricos (gráfico).")
@@ -129,6 +160,57 @@ elif app_mode == "Análise de Ativos":
         else:
             st.warning("Por favor, preencha o ticker e a região do ativo.")
 
+    with st.expander("Coleta em lote (universo de ativos)"):
+        st.caption("As listas de componentes são locais e PARCIAIS (principais pesos de cada índice), não a composição oficial.")
+        indice_lote = st.selectbox("Carregar componentes de:", [""] + list(universo.INDICES.keys()),
+                                   format_func=lambda x: universo.INDICES[x]["nome"] if x else "Digitar símbolos", key="indice_lote")
+        simbolos_padrao = ", ".join(universo.load_constituents(indice_lote)["ticker"]) if indice_lote else ""
+        simbolos_lote_str = st.text_area("Símbolos (separados por vírgula)", simbolos_padrao, key=f"simbolos_lote_{indice_lote}")
+        simbolos_lote = [s for s in simbolos_lote_str.split(",") if s.strip()]
+
+        if st.button("Validar Símbolos", key="validar_lote_btn", disabled=not simbolos_lote):
+            with st.spinner(f"Validando {len(simbolos_lote)} símbolos..."):
+                st.session_state.validacao_lote = universo.validate_symbols(simbolos_lote)
+        relatorio_lote = st.session_state.get('validacao_lote')
+        if relatorio_lote is not None:
+            st.dataframe(relatorio_lote)
+            validos_lote = relatorio_lote[relatorio_lote["status"] == "ok"]
+            if st.button(f"Coletar {len(validos_lote)} ativos válidos", key="coletar_lote_btn", disabled=validos_lote.empty):
+                progresso = st.progress(0.0)
+                falhas_lote = []
+                for i, row in enumerate(validos_lote.itertuples(index=False)):
+                    ok_chart = coleta_dados.fetch_and_save_stock_chart(symbol=row.ticker, region=row.regiao, filename_prefix=row.regiao.lower())
+                    ok_insights = coleta_dados.fetch_and_save_stock_insights(symbol=row.ticker, region=row.regiao, filename_prefix=row.regiao.lower())
+                    if ok_chart and ok_insights:
+                        st.session_state.dados_coletados_info[row.stem] = {
+                            'ticker': row.ticker, 'region': row.regiao, 'stem': row.stem,
+                            'chart_file': universo.file_path(row.stem, 'chart'),
+                            'insights_file': universo.file_path(row.stem, 'insights'),
+                        }
+                    else:
+                        falhas_lote.append(row.ticker)
+                    progresso.progress((i + 1) / len(validos_lote))
+                universo.invalidate()
+                scanner_alertas.scan_universe()
+                st.session_state.validacao_lote = None
+                if falhas_lote:
+                    st.warning(f"Falha ao coletar: {', '.join(falhas_lote)}")
+                st.success(f"{len(validos_lote) - len(falhas_lote)} ativos coletados.")
+
+    with st.expander("Alertas de sinais do universo"):
+        st.caption("As regras são avaliadas na última barra de todos os ativos após cada coleta; um alerta é emitido "
+                   "quando a condição passa de falsa para verdadeira.")
+        st.table(pd.DataFrame({"Regra": list(scanner_alertas.REGRAS_PADRAO), "Expressão": list(scanner_alertas.REGRAS_PADRAO.values())}))
+        if st.button("Escanear universo agora", key="escanear_alertas_btn"):
+            with st.spinner("Avaliando regras..."):
+                novos_alertas = scanner_alertas.scan_universe()
+            st.success(f"{0 if novos_alertas is None else len(novos_alertas)} novos alertas.")
+        alertas_recentes = scanner_alertas.load_alerts(limit=100)
+        if alertas_recentes.empty:
+            st.info("Nenhum alerta emitido ainda.")
+        else:
+            st.dataframe(alertas_recentes.iloc[::-1].reset_index(drop=True))
+
     available_stems_display = {info['stem']: f"{info['ticker']} ({info['region']})" for stem, info in st.session_state.dados_coletados_info.items()}
     options_for_select_asset = {"": "Selecione um ativo"} 
     options_for_select_asset.update(available_stems_display)
@@ -151,10 +233,29 @@ elif app_mode == "Análise de Ativos":
                 df_chart = pd.read_csv(chart_file, index_col='Timestamp', parse_dates=True)
                 st.write("**Gráfico de Preço de Fechamento Ajustado (Adj Close):**")
                 if 'Adj Close' in df_chart.columns:
-                    st.line_chart(df_chart['Adj Close'])
+                    st.plotly_chart(visualizacao_graficos.build_line_figure(df_chart[['Adj Close']]), use_container_width=True)
                 else:
                     st.warning("Coluna 'Adj Close' não encontrada nos dados do gráfico.")
+
+                eventos_ativo = eventos_corporativos.load_events(ativo_info['ticker'])
+                if not eventos_ativo.empty and st.checkbox("Comparar retorno total, preço e série bruta (eventos corporativos)",
+                                                           key=f"show_eventos_{selected_stem_key_for_display}"):
+                    # Séries reconstruídas localmente a partir dos proventos e desdobramentos armazenados
+                    df_rebuilt = eventos_corporativos.rebuild_prices(df_chart, eventos_ativo)
+                    st.plotly_chart(visualizacao_graficos.build_line_figure(df_rebuilt[['Adj Close', 'Close', 'Close Bruto']].rename(columns={
+                        'Adj Close': 'Retorno total', 'Close': 'Preço (ajustado por desdobramentos)', 'Close Bruto': 'Bruto (como negociado)'})),
+                        use_container_width=True)
+                    st.dataframe(eventos_ativo)
                 
+                quality_report_app = validacao_dados.load_quality_report()
+                if quality_report_app is not None and ativo_info['ticker'] in quality_report_app.index:
+                    quality_row = quality_report_app.loc[ativo_info['ticker']]
+                    if bool(quality_row["aprovado"]):
+                        st.caption(f"Validação de qualidade: aprovado ({quality_row['pct_problemas']*100:.2f}% de observações com problema).")
+                    else:
+                        st.warning("Série reprovada na validação de qualidade (será excluída da otimização).")
+                        st.dataframe(quality_row.to_frame().T)
+
                 st.write("**Dados Históricos (Últimos 10 registros):**")
                 st.dataframe(df_chart.tail(10))
                 
@@ -226,7 +327,7 @@ elif app_mode == "Análise de Ativos":
                             df_hist.to_csv(quant_output_filepath)
                             st.session_state.ativos_analisados_quant[selected_stem_key_for_display] = quant_output_filepath
                             st.success(f"Indicadores quantitativos calculados e salvos em {quant_output_filepath}")
-                            st.experimental_rerun()
+                            st.rerun()
                     else:
                         st.error("Não foi possível carregar os dados históricos (ou estão vazios) para cálculo quantitativo.")
                 except Exception as e:
@@ -238,17 +339,16 @@ elif app_mode == "Análise de Ativos":
             quant_file_path = st.session_state.ativos_analisados_quant[selected_stem_key_for_display]
             if os.path.exists(quant_file_path):
                 df_quant_results = pd.read_csv(quant_file_path, index_col='Timestamp', parse_dates=True)
-                st.write("**Gráfico de Preços com Médias Móveis:**")
-                cols_to_plot_sma = ['Adj Close']
+                st.write("**Gráfico de Preços com Médias Móveis e RSI:**")
                 sma_short_col_name_q = f'SMA_{sma_short_window_quant}' 
                 sma_long_col_name_q = f'SMA_{sma_long_window_quant}' 
-                if sma_short_col_name_q in df_quant_results.columns: cols_to_plot_sma.append(sma_short_col_name_q)
-                if sma_long_col_name_q in df_quant_results.columns: cols_to_plot_sma.append(sma_long_col_name_q)
-                st.line_chart(df_quant_results[cols_to_plot_sma])
-
-                st.write("**Gráfico RSI:**")
-                if 'RSI' in df_quant_results.columns:
-                    st.line_chart(df_quant_results['RSI'])
+                fig_quant = visualizacao_graficos.build_price_indicators_figure(
+                    df_quant_results,
+                    price_column='Adj Close',
+                    sma_columns=[sma_short_col_name_q, sma_long_col_name_q],
+                    rsi_column='RSI'
+                )
+                st.plotly_chart(fig_quant, use_container_width=True)
                 
                 st.write("**Últimos Dados Quantitativos Calculados:**")
                 st.dataframe(df_quant_results.tail())
@@ -283,18 +383,30 @@ elif app_mode == "Backtesting":
             ativo_info_backtest = st.session_state.dados_coletados_info[selected_stem_key_for_backtest]
             st.write(f"**Backtest para: {ativo_info_backtest['ticker']} ({ativo_info_backtest['region']})**")
 
-            col_bt1, col_bt2 = st.columns(2)
-            with col_bt1:
-                bt_sma_short = st.number_input("Janela Curta SMA (Estratégia)", min_value=5, max_value=100, value=20, step=1, key=f"bt_sma_short_{selected_stem_key_for_backtest}")
-            with col_bt2:
-                bt_sma_long = st.number_input("Janela Longa SMA (Estratégia)", min_value=20, max_value=250, value=50, step=1, key=f"bt_sma_long_{selected_stem_key_for_backtest}")
+            strategy_options = list(estrategias.STRATEGIES.keys())
+            selected_strategy = st.selectbox("Estratégia:", options=strategy_options,
+                                             format_func=lambda x: f"{x} — {estrategias.STRATEGIES[x]['descricao']}",
+                                             key=f"bt_strategy_{selected_stem_key_for_backtest}")
+            # Os campos de parâmetro vêm da declaração da estratégia no registro
+            strategy_params_spec = estrategias.STRATEGIES[selected_strategy]["parametros"]
+            bt_params = {}
+            param_columns = st.columns(len(strategy_params_spec))
+            for col_param, (param_name, param_spec) in zip(param_columns, strategy_params_spec.items()):
+                with col_param:
+                    bt_params[param_name] = st.number_input(param_spec["descricao"], min_value=param_spec["min"], max_value=param_spec["max"],
+                                                            value=param_spec["padrao"], step=1,
+                                                            key=f"bt_{selected_strategy}_{param_name}_{selected_stem_key_for_backtest}")
             
             run_backtest_button_disabled = False
-            if bt_sma_short >= bt_sma_long:
-                st.warning("A janela curta da SMA deve ser menor que a janela longa.")
+            try:
+                estrategias.resolve_params(selected_strategy, **bt_params)
+            except ValueError as e:
+                st.warning(str(e))
                 run_backtest_button_disabled = True
 
-            if st.button("Executar Backtest SMA Crossover", key=f"run_bt_{selected_stem_key_for_backtest}", disabled=run_backtest_button_disabled):
+            params_label = "_".join(str(v) for v in bt_params.values())
+            strategy_name_key = f"{selected_stem_key_for_backtest}_{selected_strategy}_{params_label}"
+            if st.button("Executar Backtest", key=f"run_bt_{selected_stem_key_for_backtest}", disabled=run_backtest_button_disabled):
                 quant_analysis_file_path = st.session_state.ativos_analisados_quant.get(selected_stem_key_for_backtest)
                 if quant_analysis_file_path and os.path.exists(quant_analysis_file_path):
                     try:
@@ -302,27 +414,23 @@ elif app_mode == "Backtesting":
                             price_data, full_data_df = backtest_module.load_quant_analysis_data(selected_stem_key_for_backtest)
                             
                             if price_data is not None and not price_data.empty and full_data_df is not None and not full_data_df.empty:
-                                results = backtest_module.run_sma_crossover_backtest(price_data, full_data_df, ativo_info_backtest['ticker'], short_window=bt_sma_short, long_window=bt_sma_long)
+                                # Indicadores ausentes no arquivo de análise são calculados sob demanda (cache de sinais)
+                                results = backtest_module.run_strategy_backtest(price_data, full_data_df, price_data.columns[0],
+                                                                                strategy=selected_strategy, **bt_params)
 
                                 if results:
-                                    strategy_name_key = f"{selected_stem_key_for_backtest}_sma_{bt_sma_short}_{bt_sma_long}"
-                                    plot_filepath = os.path.join(DATA_DIR, f"{strategy_name_key}_backtest.png")
-                                    stats_filepath = os.path.join(DATA_DIR, f"{strategy_name_key}_stats.csv")
-
-                                    fig = results.plot(title=f"Desempenho Backtest SMA Crossover {ativo_info_backtest['ticker']} ({bt_sma_short}x{bt_sma_long})")
-                                    fig.savefig(plot_filepath)
-                                    plt.close(fig) 
-                                    
-                                    results.stats.to_csv(stats_filepath)
-                                    
+                                    # Patrimônio, posições e estatísticas vão para o armazenamento colunar de execuções
+                                    run_id = resultados_backtest.save_run(results, price_data.columns[0], selected_strategy,
+                                                                          bt_params, price_data,
+                                                                          custos=backtest_module.cost_model_for(full_data_df))
                                     st.session_state.backtests_executados[strategy_name_key] = {
-                                        'plot': plot_filepath,
-                                        'stats': stats_filepath
+                                        'run_id': run_id,
+                                        'title': f"Desempenho Backtest {selected_strategy} {ativo_info_backtest['ticker']} ({params_label.replace('_', 'x')})",
                                     }
                                     st.success(f"Backtest para {ativo_info_backtest['ticker']} concluído!")
-                                    st.experimental_rerun()
+                                    st.rerun()
                                 else:
-                                    st.error("Falha ao executar o backtest (run_sma_crossover_backtest não retornou resultados). Verifique os logs ou dados de entrada.")
+                                    st.error("Falha ao executar o backtest (run_strategy_backtest não retornou resultados). Verifique os logs ou dados de entrada.")
                             else:
                                 st.error("Dados de preço ou DataFrame completo não puderam ser carregados para o backtest.")
                     except Exception as e:
@@ -330,42 +438,137 @@ elif app_mode == "Backtesting":
                 else:
                     st.warning("Arquivo de análise quantitativa não encontrado. Realize a Análise Quantitativa primeiro.")
             
-            strategy_key_to_display = f"{selected_stem_key_for_backtest}_sma_{bt_sma_short}_{bt_sma_long}"
+            st.caption("As ordens pagam meio spread (Corwin-Schultz) e impacto de mercado pela raiz quadrada da participação "
+                       "no volume médio diário, estimados do histórico do próprio ativo.")
+            strategy_key_to_display = strategy_name_key
             if strategy_key_to_display in st.session_state.backtests_executados:
-                backtest_results_paths = st.session_state.backtests_executados[strategy_key_to_display]
+                backtest_executado = st.session_state.backtests_executados[strategy_key_to_display]
                 st.markdown("### Resultados do Backtest")
-                if os.path.exists(backtest_results_paths['plot']):
-                    st.image(backtest_results_paths['plot'])
+                equity_bt = resultados_backtest.load_equity([backtest_executado['run_id']])
+                if not equity_bt.empty:
+                    fig_bt = visualizacao_graficos.build_backtest_figure(equity_bt.set_axis([strategy_key_to_display], axis=1),
+                                                                         title=backtest_executado.get('title'))
+                    st.plotly_chart(fig_bt, use_container_width=True)
                 else:
-                    st.warning("Arquivo de gráfico do backtest não encontrado.")
+                    st.warning("Curva de patrimônio do backtest não disponível.")
                 
-                if os.path.exists(backtest_results_paths['stats']):
-                    df_stats = pd.read_csv(backtest_results_paths['stats'], index_col=0)
+                stats_bt = resultados_backtest.run_stats(backtest_executado['run_id'])
+                if stats_bt is not None:
                     st.write("**Estatísticas do Backtest:**")
-                    st.dataframe(df_stats)
+                    st.dataframe(stats_bt.astype(str).rename("valor"))
                 else:
-                    st.warning("Arquivo de estatísticas do backtest não encontrado.")
+                    st.warning("Estatísticas do backtest não encontradas no armazenamento de resultados.")
+
+                if not equity_bt.empty:
+                    retornos_bt = equity_bt.iloc[:, 0].pct_change().dropna()
+                    ic_bt = estatisticas_backtest.bootstrap_metrics(retornos_bt).iloc[0]
+                    st.write("**Intervalos de confiança de 95% (bootstrap em blocos):**")
+                    st.table(pd.DataFrame({
+                        "Estimativa": [ic_bt["sharpe"], ic_bt["cagr"], ic_bt["max_drawdown"]],
+                        "IC inferior": [ic_bt["sharpe_ic_inf"], ic_bt["cagr_ic_inf"], ic_bt["max_drawdown_ic_inf"]],
+                        "IC superior": [ic_bt["sharpe_ic_sup"], ic_bt["cagr_ic_sup"], ic_bt["max_drawdown_ic_sup"]],
+                    }, index=["Sharpe", "CAGR", "Drawdown máximo"]).round(4))
+
+            with st.expander("Busca em grade e significância estatística (Sharpe deflacionado, PBO)"):
+                st.caption("Cada combinação de parâmetros é avaliada de forma vetorizada (sem custos de transação). "
+                           "O Sharpe deflacionado e a PBO descontam o viés de escolher a melhor entre muitas tentativas.")
+                grade_params = {}
+                grade_columns = st.columns(len(strategy_params_spec))
+                for col_grade, (param_name, param_spec) in zip(grade_columns, strategy_params_spec.items()):
+                    valores_padrao = sorted({min(max(int(round(param_spec["padrao"] * m)), param_spec["min"]), param_spec["max"])
+                                             for m in (0.5, 0.75, 1.0, 1.5, 2.0)})
+                    with col_grade:
+                        valores_str = st.text_input(f"{param_spec['descricao']} (valores)", ", ".join(map(str, valores_padrao)),
+                                                    key=f"grade_{selected_strategy}_{param_name}_{selected_stem_key_for_backtest}")
+                    grade_params[param_name] = [int(v) for v in valores_str.split(",") if v.strip().lstrip("-").isdigit()]
+
+                if st.button("Executar Busca em Grade", key=f"run_grade_{selected_stem_key_for_backtest}"):
+                    with st.spinner("Calculando retornos da grade e estatísticas..."):
+                        price_data, full_data_df = backtest_module.load_quant_analysis_data(selected_stem_key_for_backtest)
+                        if price_data is None or price_data.empty:
+                            st.error("Dados de preço não puderam ser carregados para a busca em grade.")
+                        else:
+                            ticker_grade = price_data.columns[0]
+                            retornos_grade = estatisticas_backtest.grid_returns(selected_strategy, ticker_grade, price_data[ticker_grade],
+                                                                                grade_params, full_data_df=full_data_df)
+                            if retornos_grade.shape[1] < 2:
+                                st.warning("A grade precisa de pelo menos duas combinações válidas de parâmetros.")
+                            else:
+                                st.session_state[f"grade_{selected_stem_key_for_backtest}"] = estatisticas_backtest.analyze_grid(retornos_grade)
+
+                analise_grade = st.session_state.get(f"grade_{selected_stem_key_for_backtest}")
+                if analise_grade:
+                    st.write(f"**{len(analise_grade['resumo'])} configurações avaliadas** (ordenadas por Sharpe):")
+                    st.dataframe(analise_grade['resumo'].head(50).round(4))
+                    dsr_grade, pbo_grade = analise_grade['dsr'], analise_grade['pbo']
+                    col_dsr, col_pbo = st.columns(2)
+                    if dsr_grade:
+                        col_dsr.metric("Sharpe deflacionado (probabilidade)", f"{dsr_grade['dsr']:.1%}",
+                                       help=f"Melhor: {dsr_grade['melhor']} (Sharpe {dsr_grade['sharpe']:.2f}); Sharpe máximo esperado "
+                                            f"ao acaso em {dsr_grade['n_tentativas']} tentativas: {dsr_grade['sharpe_esperado_acaso']:.2f}")
+                    if pbo_grade:
+                        col_pbo.metric("Probabilidade de overfitting (PBO)", f"{pbo_grade['pbo']:.1%}",
+                                       help=f"CSCV com {pbo_grade['particoes']} partições ({pbo_grade['combinacoes']} combinações)")
+                    if dsr_grade and dsr_grade['dsr'] < 0.95:
+                        st.warning("O melhor Sharpe da grade não é estatisticamente significativo depois de descontar o número de tentativas.")
         elif not selected_stem_key_for_backtest:
             st.info("Selecione um ativo com análise quantitativa realizada para executar o backtest.")
 
+    with st.expander("Comparar execuções gravadas"):
+        execucoes_gravadas = resultados_backtest.load_runs()
+        if execucoes_gravadas.empty:
+            st.info("Nenhuma execução de backtest gravada ainda.")
+        else:
+            col_tk, col_est, col_met, col_top = st.columns(4)
+            tickers_gravados = sorted(execucoes_gravadas["ticker"].unique())
+            filtro_tickers = col_tk.multiselect("Tickers", tickers_gravados, key="cmp_tickers")
+            filtro_estrategia = col_est.selectbox("Estratégia", ["(todas)"] + sorted(execucoes_gravadas["estrategia"].unique()),
+                                                  key="cmp_estrategia")
+            metricas = [c for c in execucoes_gravadas.columns if c not in resultados_backtest.RUN_COLUMNS]
+            metrica = col_met.selectbox("Ordenar por", metricas,
+                                        index=metricas.index(resultados_backtest.DEFAULT_METRIC) if resultados_backtest.DEFAULT_METRIC in metricas else 0,
+                                        key="cmp_metrica")
+            top_n = col_top.number_input("Top N", min_value=1, max_value=1000, value=20, step=1, key="cmp_top")
+            params_str = st.text_input("Filtro de parâmetros (ex: short_window=20, long_window=50)", "", key="cmp_params")
+            filtro_params = {}
+            for item in params_str.split(","):
+                nome, _, valor = item.partition("=")
+                if nome.strip() and valor.strip():
+                    try:
+                        filtro_params[nome.strip()] = float(valor)
+                    except ValueError:
+                        st.warning(f"Valor inválido para {nome.strip()}: {valor.strip()}")
+            ranking = resultados_backtest.query_runs(ticker=filtro_tickers or None,
+                                                     estrategia=None if filtro_estrategia == "(todas)" else filtro_estrategia,
+                                                     params=filtro_params or None, ordenar_por=metrica, top=int(top_n))
+            st.write(f"**{len(ranking)} execuções** (de {len(execucoes_gravadas)} gravadas):")
+            colunas_ranking = [c for c in ranking.columns if c not in ("params", "criado_em", "versao_dados")]
+            st.dataframe(ranking[colunas_ranking])
+            runs_para_plotar = st.multiselect("Execuções para comparar no gráfico", ranking["run_id"].tolist(),
+                                              default=ranking["run_id"].head(5).tolist(),
+                                              format_func=lambda r: resultados_backtest.run_label(ranking.set_index("run_id").loc[r]),
+                                              key="cmp_plot")
+            if runs_para_plotar:
+                st.plotly_chart(resultados_backtest.plot_runs(runs_para_plotar), use_container_width=True)
+
 # --- Módulo: Recomendações ---
 elif app_mode == "Recomendações":
     st.title("Módulo: Recomendações de Investimento")
 
     st.subheader("1. Análise de Cenário Macroeconômico (Visualização)")
     if st.button("Analisar/Atualizar Cenário Macroeconômico", key="analisar_macro_btn"):
-        with st.spinner("Analisando cenário macroeconômico (placeholder)..."):
+        with st.spinner("Analisando cenário macroeconômico..."):
             try:
                 st.session_state.macro_scenario_data = recomendacoes_module.analyze_macro_scenario()
-                st.success("Análise de cenário macroeconômico (placeholder) concluída.")
+                st.success("Análise de cenário macroeconômico concluída.")
             except Exception as e:
                 st.error(f"Erro ao analisar cenário macroeconômico: {str(e)}")
 
     if st.session_state.macro_scenario_data:
-        st.write("**Outlook Macroeconômico Atual (Placeholder):**")
+        st.write("**Outlook Macroeconômico Atual:**")
         st.json(st.session_state.macro_scenario_data)
     else:
-        st.info("Clique no botão acima para analisar o cenário macroeconômico (atualmente é um placeholder).")
+        st.info("Clique no botão acima para analisar o cenário macroeconômico (séries atualizadas no módulo 'Cenário Macroeconômico').")
 
     st.markdown("---")
     st.subheader("2. Geração de Recomendações")
@@ -436,35 +639,113 @@ elif app_mode == "Otimização de Carteira":
         if len(selected_stems_for_opt) < 2:
             st.warning("Por favor, selecione pelo menos 2 ativos para otimização.")
         else:
-            optimization_type = st.selectbox("Método de Otimização:", ["max_sharpe", "min_volatility"], key="opt_type")
+            nomes_metodos_opt = {"max_sharpe": "Máximo Sharpe", "min_volatility": "Mínima Volatilidade",
+                                 "hrp": "Hierarchical Risk Parity (HRP)", "risk_parity": "Paridade de Risco (ERC)",
+                                 "inverse_volatility": "Inverso da Volatilidade"}
+            optimization_type = st.selectbox("Método de Otimização:", otimizacao_carteira.OPTIMIZATION_METHODS,
+                                             format_func=lambda m: nomes_metodos_opt.get(m, m), key="opt_type")
+            nomes_retornos_opt = {"historico": "Média histórica", "black_litterman": "Black-Litterman (preço-alvo dos analistas)"}
+            modelo_retornos = st.selectbox("Retornos esperados:", otimizacao_carteira.RETURN_MODELS,
+                                           format_func=lambda m: nomes_retornos_opt.get(m, m), key="opt_retornos")
+            if modelo_retornos == "black_litterman":
+                st.caption("Prior de equilíbrio pela capitalização de mercado; cada ativo com cobertura recebe a visão "
+                           "preço-alvo médio / preço atual - 1, com confiança crescente no número de analistas.")
+            chave_opt = f"{optimization_type}_{modelo_retornos}"
+
+            with st.expander("Restrições (setor, peso, giro e número de ativos)"):
+                usar_restricoes = st.checkbox("Usar otimização com restrições (modelo de risco por fatores)", key="opt_restrita")
+                col_r1, col_r2 = st.columns(2)
+                with col_r1:
+                    limite_setor_opt = st.slider("Peso máximo por setor", 0.05, 1.0, 1.0, 0.05, key="opt_limite_setor")
+                    peso_max_opt = st.slider("Peso máximo por ativo", 0.01, 1.0, 1.0, 0.01, key="opt_peso_max")
+                    peso_min_opt = st.slider("Peso mínimo por ativo mantido", 0.0, 0.2, 0.0, 0.005, key="opt_peso_min")
+                with col_r2:
+                    max_ativos_opt = st.number_input("Número máximo de ativos (0 = sem limite)", min_value=0, value=0, step=1, key="opt_max_ativos")
+                    turnover_opt = st.slider("Giro máximo (soma de |Δpeso|)", 0.0, 2.0, 2.0, 0.05, key="opt_turnover")
+                    pesos_atuais_str = st.text_input("Pesos atuais (ex: PETR4.SA=0.6, AAPL=0.4)", key="opt_pesos_atuais")
+                col_l1, col_l0, col_l2 = st.columns([2, 1, 2])
+                valor_carteira_opt = col_l1.number_input("Valor da carteira (0 = sem limite de liquidez)", min_value=0.0, value=0.0,
+                                                         step=100000.0, key="opt_valor_carteira")
+                moeda_carteira_opt = col_l0.selectbox("Moeda", ["BRL", "USD"], key="opt_moeda_carteira")
+                limite_adv_opt = col_l2.slider("Posição máxima (% do volume médio diário)", 1, 100, int(liquidez.LIMITE_ADV * 100), 1,
+                                               key="opt_limite_adv") / 100
+                st.caption("Setores vêm dos insights coletados (tabela do universo); ativos sem setor formam o grupo 'Sem setor'. "
+                           f"O volume médio diário em valor usa os últimos {liquidez.JANELA} pregões dos arquivos de histórico, "
+                           "convertido para a moeda da carteira pelo câmbio local.")
+
+            with st.expander("Reamostragem (estabilidade dos pesos)"):
+                usar_reamostragem = st.checkbox("Média dos pesos sobre reamostragens bootstrap dos retornos", key="opt_reamostrada")
+                n_amostras_opt = st.slider("Número máximo de amostras", 50, 1000, 300, 50, key="opt_n_amostras")
+                st.caption("Cada amostra é resolvida em paralelo; a execução para antes se as médias dos pesos convergirem.")
 
             if st.button("Otimizar Carteira", key="run_optimization_btn"):
                 with st.spinner("Carregando dados e otimizando carteira..."):
                     prices_df_opt = otimizacao_carteira.load_stock_prices_for_optimization(selected_stems_for_opt)
                     
                     if prices_df_opt is not None and not prices_df_opt.empty and len(prices_df_opt.columns) >= 2:
-                        optimal_weights, performance_metrics = otimizacao_carteira.optimize_portfolio(prices_df_opt, optimization_method=optimization_type)
+                        diagnostico_opt = None
+                        detalhes_reamostragem = None
+                        if usar_reamostragem and modelo_retornos != "historico":
+                            st.warning("A reamostragem usa os retornos históricos de cada amostra; o modelo Black-Litterman não se aplica a ela.")
+                        if usar_restricoes and usar_reamostragem:
+                            st.warning("Reamostragem e restrições não são combinadas; executando a otimização reamostrada sem restrições.")
+                            usar_restricoes = False
+                        if usar_restricoes and optimization_type in otimizacao_carteira.ALLOCATORS:
+                            st.warning("As restrições valem apenas para os métodos de média-variância; o alocador de risco foi executado sem elas.")
+                        if usar_restricoes and optimization_type not in otimizacao_carteira.ALLOCATORS:
+                            pesos_atuais_opt = {}
+                            for item in pesos_atuais_str.split(","):
+                                if "=" in item:
+                                    ticker_peso, valor_peso = item.split("=", 1)
+                                    try:
+                                        pesos_atuais_opt[ticker_peso.strip().upper()] = float(valor_peso)
+                                    except ValueError:
+                                        st.warning(f"Peso atual inválido ignorado: {item.strip()}")
+                            optimal_weights, performance_metrics, diagnostico_opt = otimizacao_carteira.optimize_portfolio_constrained(
+                                prices_df_opt, optimization_method=optimization_type,
+                                limites_setor=limite_setor_opt if limite_setor_opt < 1.0 else None,
+                                peso_min=peso_min_opt or None, peso_max=peso_max_opt,
+                                pesos_atuais=pesos_atuais_opt or None,
+                                turnover_max=turnover_opt if pesos_atuais_opt and turnover_opt < 2.0 else None,
+                                max_ativos=int(max_ativos_opt) or None, retornos=modelo_retornos,
+                                valor_carteira=valor_carteira_opt or None, limite_adv=limite_adv_opt,
+                                moeda=moeda_carteira_opt)
+                        elif usar_reamostragem:
+                            optimal_weights, performance_metrics, detalhes_reamostragem = otimizacao_carteira.optimize_portfolio_resampled(
+                                prices_df_opt, optimization_method=optimization_type, n_amostras=n_amostras_opt)
+                        else:
+                            optimal_weights, performance_metrics = otimizacao_carteira.optimize_portfolio(prices_df_opt, optimization_method=optimization_type,
+                                                                                                          retornos=modelo_retornos)
                         
                         if optimal_weights and performance_metrics:
                             # Calcular intervalo de confiança
                             ret_anual, vol_anual, _ = performance_metrics
                             lower_bound, upper_bound = otimizacao_carteira.calculate_return_confidence_interval(ret_anual, vol_anual)
                             
-                            st.session_state.otimizacoes_realizadas[optimization_type] = {
+                            visoes_opt = None
+                            if modelo_retornos == "black_litterman" and not usar_reamostragem:
+                                visoes_opt = black_litterman.analyst_views(black_litterman.load_analyst_data(list(prices_df_opt.columns)),
+                                                                           prices_df_opt.ffill().iloc[-1])
+                            st.session_state.otimizacoes_realizadas[chave_opt] = {
                                 'stems': selected_stems_for_opt,
+                                'visoes': visoes_opt,
                                 'weights': optimal_weights,
                                 'performance': performance_metrics,
-                                'confidence_interval': (lower_bound, upper_bound) if lower_bound is not None else None
+                                'confidence_interval': (lower_bound, upper_bound) if lower_bound is not None else None,
+                                'diagnostico': diagnostico_opt,
+                                'reamostragem': detalhes_reamostragem
                             }
                             st.success(f"Otimização ({optimization_type}) concluída!")
-                            st.experimental_rerun()
+                            st.rerun()
+                        elif diagnostico_opt is not None:
+                            st.error(f"Otimização com restrições sem solução (status: {diagnostico_opt['status']}). Relaxe os limites de setor, peso, giro ou número de ativos.")
                         else:
                             st.error("Falha ao otimizar a carteira. Verifique os logs ou os dados de entrada. Certifique-se que os arquivos CSV de análise quantitativa existem e contêm dados válidos para os ativos selecionados.")
                     else:
                         st.error("Não foi possível carregar dados de preços suficientes ou válidos para os ativos selecionados. Certifique-se de que a análise quantitativa foi feita e os arquivos CSV existem e não estão vazios.")
 
-            if optimization_type in st.session_state.otimizacoes_realizadas:
-                opt_results = st.session_state.otimizacoes_realizadas[optimization_type]
+            if chave_opt in st.session_state.otimizacoes_realizadas:
+                opt_results = st.session_state.otimizacoes_realizadas[chave_opt]
                 # Verificar se os stems da otimização atual correspondem aos selecionados
                 if set(opt_results['stems']) == set(selected_stems_for_opt):
                     st.subheader(f"Resultados da Otimização: {optimization_type.replace('_', ' ').title()}")
@@ -483,6 +764,33 @@ elif app_mode == "Otimização de Carteira":
                     }
                     st.json(perf_data)
 
+                    if opt_results.get('diagnostico'):
+                        diag = opt_results['diagnostico']
+                        st.write("**Solver:**", f"{diag['solver']} ({diag['status']}), {diag['tempo_solver_s']:.3f}s no solver, "
+                                 f"{diag['tempo_total_s']:.3f}s no total, {diag['n_fatores']} fatores de risco, {diag['n_posicoes']} posições")
+                        if diag.get('exposicao_setor'):
+                            st.table(pd.DataFrame({"Peso": diag['exposicao_setor'], "Limite": diag['setores']}))
+                        if diag.get('limites_adv'):
+                            st.write("**Peso máximo pela liquidez:**")
+                            st.table(pd.Series(diag['limites_adv'], name="Peso máximo").map(lambda x: f"{x:.2%}"))
+                        if diag.get('turnover') is not None:
+                            st.write(f"**Giro em relação à carteira atual:** {diag['turnover']:.2%}")
+
+                    if opt_results.get('visoes') is not None:
+                        if opt_results['visoes'].empty:
+                            st.info("Nenhum ativo com preço-alvo e cobertura de analistas nos insights; os retornos vieram só do prior de mercado.")
+                        else:
+                            st.write("**Visões dos analistas (Black-Litterman):**")
+                            st.dataframe(opt_results['visoes'].style.format({"retorno_visao": "{:.2%}", "confianca": "{:.0%}",
+                                                                             "preco_alvo": "{:.2f}", "preco_atual": "{:.2f}",
+                                                                             "recomendacao": "{:.2f}"}))
+
+                    if opt_results.get('reamostragem'):
+                        ream = opt_results['reamostragem']
+                        st.write(f"**Reamostragem:** {ream['amostras']} amostras ({ream['falhas']} falhas) em {ream['tempo_s']:.1f}s com "
+                                 f"{ream['workers']} processos; {'convergiu' if ream['convergiu'] else 'sem convergência dentro do limite'}.")
+                        st.dataframe(ream['dispersao'].style.format("{:.2%}"))
+
                     if opt_results.get('confidence_interval'):
                         lower_b, upper_b = opt_results['confidence_interval']
                         st.write("**Projeção de Ganhos/Perdas (Intervalo de Confiança de 95% para Retorno em 12 Meses):**")
@@ -492,20 +800,92 @@ elif app_mode == "Otimização de Carteira":
                     else:
                         st.warning("Não foi possível calcular a projeção de ganhos/perdas para esta carteira.")
 
+# --- Módulo: Correlações ---
+elif app_mode == "Correlações":
+    st.header("Correlações Móveis do Universo")
+    st.caption("Correlações dos retornos diários em janelas móveis, atualizadas incrementalmente a cada nova coleta "
+               "(apenas os pregões novos são processados).")
+    janela_corr = st.selectbox("Janela (pregões):", options=list(correlacao.JANELAS_PADRAO), index=1, key="janela_correlacao")
+    if st.button("Atualizar Correlações"):
+        with st.spinner("Atualizando correlações do universo..."):
+            st.session_state.correlacao_estados = correlacao.atualizar()
+        st.success("Correlações atualizadas.")
+
+    estados_corr = st.session_state.get('correlacao_estados')
+    if estados_corr is None:
+        estado_salvo = correlacao.load_state(janela_corr)
+        estados_corr = {janela_corr: estado_salvo} if estado_salvo is not None else {}
+    estado_corr = estados_corr.get(janela_corr)
+    if estado_corr is None:
+        st.info("Nenhuma correlação calculada ainda para esta janela. Clique em 'Atualizar Correlações'.")
+    else:
+        st.write(f"**{len(estado_corr.tickers)} ativos; último pregão: {estado_corr.ultima_data.date() if estado_corr.ultima_data is not None else '-'}**")
+        max_ativos_heatmap = st.slider("Máximo de ativos no mapa de calor:", min_value=5, max_value=300, value=60, step=5)
+        matriz_agrupada = correlacao.clustered_matrix(estado_corr, max_ativos=max_ativos_heatmap)
+        if len(matriz_agrupada) >= 2:
+            st.plotly_chart(visualizacao_graficos.build_correlation_heatmap(
+                matriz_agrupada, title=f"Correlação agrupada ({janela_corr} pregões)"), use_container_width=True)
+        else:
+            st.warning("Pares com dados suficientes na janela não bastam para o mapa de calor.")
+
+        st.subheader("Mais correlacionados a um ativo")
+        ticker_corr = st.selectbox("Ativo:", options=estado_corr.tickers, key="ticker_correlacao")
+        col_pos, col_neg = st.columns(2)
+        with col_pos:
+            st.write("**Mais correlacionados**")
+            st.dataframe(correlacao.mais_correlacionados(ticker_corr, janela=janela_corr, k=10))
+        with col_neg:
+            st.write("**Menos correlacionados**")
+            st.dataframe(correlacao.mais_correlacionados(ticker_corr, janela=janela_corr, k=10, negativos=True))
+
 # --- Módulo: Cenário Macroeconômico ---
 elif app_mode == "Cenário Macroeconômico":
     st.title("Módulo: Análise de Cenário Macroeconômico")
-    st.info("Esta seção é um placeholder. A coleta e análise detalhada de dados macroeconômicos não está implementada nesta versão.")
-    
-    if st.button("Carregar Dados Macroeconômicos (Placeholder)", key="load_macro_placeholder"):
-        with st.spinner("Carregando dados macro (placeholder)..."):
-            recomendacoes_module.fetch_and_save_macro_data("NY.GDP.MKTP.CD", "BRA", "Brasil_GDP") 
-            st.session_state.dados_macro_coletados["BRA_GDP"] = "Dados de PIB do Brasil (placeholder) carregados/verificados."
-            st.success("Operação de dados macro (placeholder) concluída.")
+    st.markdown("Séries macroeconômicas do BCB (SGS) e do FRED, mantidas em cache local e atualizadas incrementalmente a partir da última observação.")
+
+    usar_fixtures_macro = st.checkbox("Usar dados locais de exemplo (modo offline)", value=dados_macro.PROVIDER_OVERRIDE == "fixture", key="macro_usar_fixtures")
+    dados_macro.PROVIDER_OVERRIDE = "fixture" if usar_fixtures_macro else None
+
+    if st.button("Atualizar Séries Macroeconômicas", key="load_macro_series"):
+        with st.spinner("Atualizando séries macroeconômicas..."):
+            for (country_macro, indicator_macro), spec_macro in dados_macro.MACRO_INDICATORS.items():
+                series_macro = coleta_dados.fetch_and_save_macro_data(indicator_macro, country_macro, spec_macro["descricao"])
+                if series_macro is not None:
+                    st.session_state.dados_macro_coletados[f"{country_macro}_{indicator_macro}"] = {
+                        "descricao": spec_macro["descricao"],
+                        "ultima_data": series_macro.index.max().strftime("%Y-%m-%d"),
+                        "ultimo_valor": float(series_macro.iloc[-1])
+                    }
+            st.success("Séries macroeconômicas atualizadas.")
 
     if st.session_state.dados_macro_coletados:
-        st.write("**Dados Macroeconômicos Carregados (Exemplo Placeholder):**")
-        st.json(st.session_state.dados_macro_coletados)
+        st.write("**Séries Macroeconômicas em Cache:**")
+        st.dataframe(pd.DataFrame(st.session_state.dados_macro_coletados).T)
+
+    macro_panel = dados_macro.load_macro_panel()
+    if not macro_panel.empty:
+        _, country_scores_macro = dados_macro.compute_macro_regimes(macro_panel)
+        st.write("**Score de Regime Macroeconômico por País** (positivo favorece ativos de risco):")
+        st.plotly_chart(visualizacao_graficos.build_line_figure(country_scores_macro.dropna(how="all")), use_container_width=True)
+        st.json(dados_macro.latest_country_regimes())
+    else:
+        st.info("Nenhuma série macroeconômica em cache. Clique em 'Atualizar Séries Macroeconômicas'.")
+
+# Painel de performance (opcional): tempos por etapa das últimas operações desta sessão do servidor
+st.sidebar.markdown("---")
+if st.sidebar.checkbox("Mostrar painel de performance", key="mostrar_painel_performance"):
+    st.markdown("---")
+    st.subheader("Performance: Tempos por Etapa")
+    perf_summary = instrumentacao.summarize_metrics()
+    if perf_summary.empty:
+        st.info("Nenhuma operação instrumentada registrada ainda.")
+    else:
+        st.dataframe(perf_summary)
+        st.write("**Últimas operações:**")
+        st.dataframe(instrumentacao.get_recent_metrics(50).iloc[::-1])
+        if st.button("Limpar métricas", key="limpar_metricas_perf"):
+            instrumentacao.reset_metrics()
+            st.rerun()
 
 # Rodapé (opcional)
 st.sidebar.markdown("---")
@@ -0,0 +1,380 @@
+"""Motor de backtest intradiário orientado a eventos.
+
+As barras são lidas do disco em blocos (CSV ou Parquet), sem carregar todo o histórico de minutos em
+memória. O estado que atravessa os blocos (cauda de preços para as médias móveis, posição, caixa e
+ordem pendente) é carregado de um bloco para o outro.
+
+O laço de eventos só visita as barras em que o peso alvo da estratégia muda; o preenchimento das
+ordens (toque do limite/stop, participação no volume, slippage e comissões) é resolvido com
+operações vetorizadas sobre a janela de barras até o próximo evento.
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+import estrategias
+import instrumentacao
+
+DATA_DIR = "."
+CHUNK_BARS = 500_000
+BAR_COLUMNS = ["Timestamp", "Open", "High", "Low", "Close", "Volume"]
+
+# Tabelas de custos: percentual sobre o financeiro, valor por ação, fixo por execução e mínimo por execução.
+# "faixas" (opcional) substitui o percentual de acordo com o financeiro acumulado negociado no backtest.
+COMMISSION_SCHEDULES = {
+    "zero": {"percentual": 0.0, "por_acao": 0.0, "fixo": 0.0, "minimo": 0.0},
+    # Corretagem zero; emolumentos e liquidação da B3 (~0,03% do financeiro)
+    "b3": {"percentual": 0.0003, "por_acao": 0.0, "fixo": 0.0, "minimo": 0.0},
+    # B3 com desconto progressivo por volume negociado
+    "b3_faixas": {"percentual": 0.0003, "por_acao": 0.0, "fixo": 0.0, "minimo": 0.0,
+                  "faixas": [(5_000_000, 0.0003), (20_000_000, 0.00025), (float("inf"), 0.0002)]},
+    # Corretora americana típica: por ação, com mínimo por execução
+    "us_por_acao": {"percentual": 0.0, "por_acao": 0.005, "fixo": 0.0, "minimo": 1.0},
+}
+
+# Modelo de slippage por participação no volume: meio spread + impacto proporcional à fração do volume da barra
+# (com os padrões, executar 10% do volume de uma barra custa 2 + 10 bps)
+DEFAULT_SLIPPAGE = {"meio_spread_bps": 2.0, "impacto": 0.01, "participacao_max": 0.1}
+
+ORDER_TYPES = ("market", "limit", "stop")
+
+def intraday_filepath(symbol_filename_stem, interval="1m", extension="csv"):
+    """Caminho do arquivo de barras intradiárias (ex: br_PETR4_SA_intraday_1m.csv)."""
+    return os.path.join(DATA_DIR, f"{symbol_filename_stem}_intraday_{interval}.{extension}")
+
+def _parse_timestamps(values):
+    """Converte timestamps para int64 (ns) no horário local da bolsa, ignorando o offset de fuso.
+
+    O yfinance grava as barras no fuso da bolsa (ex: '2025-05-07 10:00:00-03:00'); usar os 19 primeiros
+    caracteres evita a conversão lenta de offsets mistos (horário de verão nos EUA).
+    """
+    if np.issubdtype(np.asarray(values).dtype, np.datetime64):
+        return np.asarray(values).astype("datetime64[ns]").view(np.int64)
+    text = pd.Series(values).astype(str).str.slice(0, 19)
+    return pd.to_datetime(text, format="%Y-%m-%d %H:%M:%S").to_numpy().view(np.int64)
+
+def iter_bar_chunks(filepath, chunk_bars=CHUNK_BARS):
+    """Lê barras OHLCV em blocos, retornando dicts de arrays numpy (ts, open, high, low, close, volume)."""
+    if filepath.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        batches = (batch.to_pandas() for batch in
+                   pq.ParquetFile(filepath).iter_batches(batch_size=chunk_bars, columns=BAR_COLUMNS))
+    else:
+        batches = pd.read_csv(filepath, usecols=BAR_COLUMNS, chunksize=chunk_bars,
+                              dtype={"Open": np.float64, "High": np.float64, "Low": np.float64,
+                                     "Close": np.float64, "Volume": np.float64})
+    for df in batches:
+        if df.empty:
+            continue
+        yield {
+            "ts": _parse_timestamps(df["Timestamp"].to_numpy()),
+            "open": df["Open"].to_numpy(np.float64),
+            "high": df["High"].to_numpy(np.float64),
+            "low": df["Low"].to_numpy(np.float64),
+            "close": df["Close"].to_numpy(np.float64),
+            "volume": np.nan_to_num(df["Volume"].to_numpy(np.float64)),
+        }
+
+def _rolling_mean_with_tail(values, tail, window):
+    """Média móvel de `values` continuando a série a partir da cauda do bloco anterior."""
+    extended = np.concatenate([tail, values])
+    csum = np.concatenate([[0.0], np.cumsum(extended)])
+    means = np.full(len(extended), np.nan)
+    if len(extended) >= window:
+        means[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return means[len(tail):]
+
+class SmaCrossoverSignal:
+    """Estratégia de cruzamento de médias (mesma regra de `estrategias.sma_crossover_weights`)
+    calculada em streaming: guarda os últimos `long_window - 1` fechamentos entre blocos."""
+
+    def __init__(self, short_window=50, long_window=200):
+        self.short_window = short_window
+        self.long_window = long_window
+        self._tail = np.empty(0)
+
+    def target_weights(self, close):
+        short_sma = _rolling_mean_with_tail(close, self._tail[-(self.short_window - 1):] if self.short_window > 1 else self._tail[:0], self.short_window)
+        long_sma = _rolling_mean_with_tail(close, self._tail, self.long_window)
+        keep = self.long_window - 1
+        self._tail = np.concatenate([self._tail, close])[-keep:] if keep else self._tail[:0]
+        return estrategias.sma_crossover_weights(short_sma, long_sma)
+
+def commission_for_fills(schedule, quantities, prices, traded_before=0.0):
+    """Comissão de cada execução (vetorizado) segundo a tabela `schedule`."""
+    notional = quantities * prices
+    percentual = schedule.get("percentual", 0.0)
+    if schedule.get("faixas"):
+        cumulative = traded_before + np.cumsum(notional) - notional
+        limits = np.array([limit for limit, _ in schedule["faixas"]])
+        rates = np.array([rate for _, rate in schedule["faixas"]])
+        percentual = rates[np.minimum(np.searchsorted(limits, cumulative, side="right"), len(rates) - 1)]
+    fees = notional * percentual + quantities * schedule.get("por_acao", 0.0) + schedule.get("fixo", 0.0)
+    return np.maximum(fees, schedule.get("minimo", 0.0))
+
+def volume_participation_slippage(base_prices, side, quantities, volumes, meio_spread_bps, impacto):
+    """Preço de execução com meio spread fixo + impacto proporcional à participação no volume da barra."""
+    participation = np.divide(quantities, volumes, out=np.ones_like(quantities), where=volumes > 0)
+    return base_prices * (1 + side * (meio_spread_bps / 1e4 + impacto * participation))
+
+class IntradayBacktester:
+    """Backtest de um ativo em barras intradiárias com ordens a mercado, limitadas e stop.
+
+    A cada mudança do peso alvo (avaliada no fechamento da barra i) é emitida uma ordem para levar a
+    posição ao alvo, válida a partir da barra i+1 até a próxima mudança de sinal ou `validade_barras`.
+    - market: executa a partir da abertura da barra seguinte;
+    - limit: preço = fechamento * (1 ∓ `distancia_ordem`); executa só nas barras que tocam o limite, sem slippage;
+    - stop: preço = fechamento * (1 ± `distancia_ordem`); ao ser tocado vira ordem a mercado.
+    A quantidade executada por barra é limitada a `participacao_max` do volume; o restante segue nas barras seguintes.
+    """
+
+    def __init__(self, strategy, capital_inicial=100_000.0, tipo_ordem="market", distancia_ordem=0.001,
+                 validade_barras=None, slippage=None, comissao="b3", lote=1):
+        if tipo_ordem not in ORDER_TYPES:
+            raise ValueError(f"Tipo de ordem '{tipo_ordem}' não suportado. Use um de {ORDER_TYPES}.")
+        self.strategy = strategy
+        self.tipo_ordem = tipo_ordem
+        self.distancia_ordem = distancia_ordem
+        self.validade_barras = validade_barras
+        self.slippage = {**DEFAULT_SLIPPAGE, **(slippage or {})}
+        self.comissao = COMMISSION_SCHEDULES[comissao] if isinstance(comissao, str) else comissao
+        self.lote = lote
+        self.cash = float(capital_inicial)
+        self.capital_inicial = float(capital_inicial)
+        self.position = 0.0
+        self.pending = None
+        self.prev_target = 0.0
+        self.traded_notional = 0.0
+        self.bars_processed = 0
+        self._fills = []
+        self._daily_equity = []
+
+    # --- ordens ---
+
+    def _new_order(self, target, close, equity, start):
+        desired = np.floor(target * equity / close / self.lote) * self.lote if close > 0 else 0.0
+        delta = desired - self.position
+        if delta == 0:
+            return None
+        side = 1.0 if delta > 0 else -1.0
+        price = None
+        if self.tipo_ordem == "limit":
+            price = close * (1 - side * self.distancia_ordem)
+        elif self.tipo_ordem == "stop":
+            price = close * (1 + side * self.distancia_ordem)
+        expires = start + self.validade_barras if self.validade_barras else None
+        return {"lado": side, "qtd": abs(delta), "tipo": self.tipo_ordem, "preco": price,
+                "acionada": self.tipo_ordem == "market", "inicio": start, "expira": expires}
+
+    def _fill_window(self, order, bars, offset, lo, hi):
+        """Executa a ordem nas barras [lo, hi) do bloco (índices locais). Retorna True se ficou completa."""
+        if lo >= hi:
+            return False
+        side = order["lado"]
+        high, low = bars["high"][lo:hi], bars["low"][lo:hi]
+        if order["tipo"] == "limit":
+            eligible = low <= order["preco"] if side > 0 else high >= order["preco"]
+        elif not order["acionada"]:
+            touched = high >= order["preco"] if side > 0 else low <= order["preco"]
+            if not touched.any():
+                return False
+            first = int(np.argmax(touched))
+            order["acionada"] = True
+            order["inicio_execucao"] = offset + lo + first
+            eligible = np.zeros(hi - lo, dtype=bool)
+            eligible[first:] = True
+        else:
+            eligible = np.ones(hi - lo, dtype=bool)
+        if not eligible.any():
+            return False
+
+        volume = bars["volume"][lo:hi]
+        capacity = np.where(eligible, np.floor(volume * self.slippage["participacao_max"] / self.lote) * self.lote, 0.0)
+        cumulative = np.cumsum(capacity)
+        last = int(np.searchsorted(cumulative, order["qtd"]))
+        complete = last < len(cumulative)
+        last = min(last, len(cumulative) - 1)
+        qty = capacity[:last + 1].copy()
+        if complete:
+            qty[last] -= cumulative[last] - order["qtd"]
+        mask = qty > 0
+        if not mask.any():
+            return False
+        idx = np.flatnonzero(mask)
+        qty = qty[idx]
+        global_idx = offset + lo + idx
+
+        opens = bars["open"][lo:hi][idx]
+        typical = (bars["high"][lo:hi][idx] + bars["low"][lo:hi][idx] + bars["close"][lo:hi][idx]) / 3
+        if order["tipo"] == "limit":
+            # Se a barra abrir além do limite (gap), a execução sai no preço de abertura, melhor que o limite
+            limit = order["preco"]
+            prices = np.minimum(opens, limit) if side > 0 else np.maximum(opens, limit)
+        else:
+            start_bar = order.get("inicio_execucao", order["inicio"])
+            base = np.where(global_idx == start_bar, opens, typical)
+            if order["tipo"] == "stop":
+                trigger = order["preco"]
+                base = np.where(global_idx == start_bar,
+                                np.maximum(opens, trigger) if side > 0 else np.minimum(opens, trigger), base)
+            prices = volume_participation_slippage(base, side, qty, bars["volume"][lo:hi][idx],
+                                                   self.slippage["meio_spread_bps"], self.slippage["impacto"])
+        fees = commission_for_fills(self.comissao, qty, prices, self.traded_notional)
+
+        self.traded_notional += float((qty * prices).sum())
+        self.position += side * float(qty.sum())
+        self.cash -= side * float((qty * prices).sum()) + float(fees.sum())
+        order["qtd"] -= float(qty.sum())
+        self._fills.append({"bar": global_idx, "ts": bars["ts"][lo:hi][idx], "lado": np.full(len(idx), side),
+                            "quantidade": qty, "preco": prices, "comissao": fees,
+                            "tipo": order["tipo"]})
+        return complete or order["qtd"] <= 0
+
+    def _advance_pending(self, bars, offset, lo, hi):
+        """Tenta executar a ordem pendente até a barra `hi` (exclusiva), respeitando a validade."""
+        order = self.pending
+        if order is None:
+            return
+        if order["expira"] is not None:
+            hi = min(hi, order["expira"] - offset)
+        if self._fill_window(order, bars, offset, max(lo, order["inicio"] - offset), hi):
+            self.pending = None
+        elif order["expira"] is not None and order["expira"] - offset <= hi:
+            self.pending = None
+
+    # --- laço principal ---
+
+    def process_chunk(self, bars):
+        n = len(bars["close"])
+        offset = self.bars_processed
+        targets = self.strategy.target_weights(bars["close"])
+        # Eventos: barras em que o peso alvo muda (avaliado no fechamento)
+        previous = np.concatenate([[self.prev_target], targets[:-1]])
+        events = np.flatnonzero(targets != previous)
+
+        start_position, start_cash = self.position, self.cash
+        fills_before = len(self._fills)
+
+        cursor = 0
+        for event in events:
+            # Executa o que for possível da ordem pendente até a barra do evento (inclusive); caixa e
+            # posição ficam atualizados, então o patrimônio no fechamento do evento sai direto do estado
+            self._advance_pending(bars, offset, cursor, event + 1)
+            cursor = event + 1
+            close = bars["close"][event]
+            self.pending = self._new_order(targets[event], close, self.cash + self.position * close, offset + event + 1)
+        self._advance_pending(bars, offset, cursor, n)
+
+        # Posição e caixa ao fim de cada barra (para a curva de patrimônio) a partir das execuções do bloco
+        position_delta = np.zeros(n)
+        cash_delta = np.zeros(n)
+        for fill in self._fills[fills_before:]:
+            local = fill["bar"] - offset
+            signed_qty = fill["lado"] * fill["quantidade"]
+            np.add.at(position_delta, local, signed_qty)
+            np.add.at(cash_delta, local, -(signed_qty * fill["preco"] + fill["comissao"]))
+        position = start_position + np.cumsum(position_delta)
+        cash = start_cash + np.cumsum(cash_delta)
+        equity = cash + position * bars["close"]
+        # Patrimônio no fim de cada dia (última barra do dia dentro do bloco)
+        days = bars["ts"] // 86_400_000_000_000
+        last_of_day = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        self._daily_equity.append((days[last_of_day], equity[last_of_day]))
+
+        self.prev_target = float(targets[-1])
+        self.bars_processed += n
+
+    def run(self, chunks):
+        for bars in chunks:
+            self.process_chunk(bars)
+        return self.results()
+
+    # --- resultados ---
+
+    def trades(self):
+        if not self._fills:
+            return pd.DataFrame(columns=["Timestamp", "lado", "quantidade", "preco", "comissao", "tipo"])
+        df = pd.DataFrame({
+            "Timestamp": pd.to_datetime(np.concatenate([f["ts"] for f in self._fills])),
+            "lado": np.concatenate([f["lado"] for f in self._fills]),
+            "quantidade": np.concatenate([f["quantidade"] for f in self._fills]),
+            "preco": np.concatenate([f["preco"] for f in self._fills]),
+            "comissao": np.concatenate([f["comissao"] for f in self._fills]),
+            "tipo": np.concatenate([np.full(len(f["bar"]), f["tipo"]) for f in self._fills]),
+        })
+        return df
+
+    def equity_curve(self):
+        if not self._daily_equity:
+            return pd.Series(dtype="float64", name="patrimonio")
+        days = np.concatenate([d for d, _ in self._daily_equity])
+        values = np.concatenate([v for _, v in self._daily_equity])
+        curve = pd.Series(values, index=pd.to_datetime(days * 86_400_000_000_000), name="patrimonio")
+        # Um dia pode atravessar dois blocos: fica o último valor
+        return curve[~curve.index.duplicated(keep="last")]
+
+    def results(self):
+        trades = self.trades()
+        equity = self.equity_curve()
+        final_equity = float(equity.iloc[-1]) if not equity.empty else self.capital_inicial
+        stats = {
+            "barras": self.bars_processed,
+            "execucoes": len(trades),
+            "retorno_total": final_equity / self.capital_inicial - 1,
+            "patrimonio_final": final_equity,
+            "comissoes": float(trades["comissao"].sum()) if not trades.empty else 0.0,
+            "financeiro_negociado": self.traded_notional,
+            "posicao_final": self.position,
+            "ordem_pendente": self.pending is not None,
+        }
+        return {"stats": stats, "trades": trades, "equity": equity}
+
+@instrumentacao.instrumentado("backtest.intradiario")
+def run_intraday_backtest(filepath, short_window=50, long_window=200, chunk_bars=CHUNK_BARS, **kwargs):
+    """Backtest intradiário da estratégia de cruzamento de médias lendo `filepath` em blocos.
+
+    `kwargs` são repassados ao `IntradayBacktester` (tipo_ordem, distancia_ordem, validade_barras,
+    slippage, comissao, lote, capital_inicial). Retorna dict com `stats`, `trades` e `equity` (diário).
+    """
+    if not os.path.exists(filepath):
+        print(f"Arquivo de barras intradiárias não encontrado: {filepath}")
+        return None
+    engine = IntradayBacktester(SmaCrossoverSignal(short_window, long_window), **kwargs)
+    start = time.perf_counter()
+    results = engine.run(iter_bar_chunks(filepath, chunk_bars=chunk_bars))
+    elapsed = time.perf_counter() - start
+    results["stats"]["tempo_s"] = round(elapsed, 3)
+    results["stats"]["barras_por_minuto"] = int(engine.bars_processed / max(elapsed, 1e-9) * 60)
+    instrumentacao.anotar(linhas=engine.bars_processed, execucoes=results["stats"]["execucoes"])
+    return results
+
+def generate_synthetic_bars(filepath, n_bars=2_000_000, seed=0, start="2024-01-02 10:00"):
+    """Gera barras de 1 minuto sintéticas (pregão de 10h às 17h) em CSV ou Parquet, para testes de desempenho."""
+    rng = np.random.default_rng(seed)
+    minutes_per_day = 7 * 60
+    n_days = -(-n_bars // minutes_per_day)
+    days = pd.bdate_range(start, periods=n_days).normalize()
+    ts = (days.values[:, None] + pd.Timestamp(start).hour * np.timedelta64(1, "h")
+          + np.arange(minutes_per_day) * np.timedelta64(1, "m")).ravel()[:n_bars]
+    close = 30 * np.exp(np.cumsum(rng.normal(0, 0.0008, n_bars)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.0005, n_bars)) * close
+    df = pd.DataFrame({"Timestamp": ts, "Open": open_, "High": np.maximum(open_, close) + spread,
+                       "Low": np.minimum(open_, close) - spread, "Close": close,
+                       "Volume": rng.integers(100, 50_000, n_bars).astype(np.float64)})
+    if filepath.endswith(".parquet"):
+        df.to_parquet(filepath, index=False)
+    else:
+        df.to_csv(filepath, index=False)
+    return filepath
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = generate_synthetic_bars(os.path.join(tmp, "sintetico_intraday_1m.parquet"), n_bars=5_000_000)
+        for tipo in ORDER_TYPES:
+            res = run_intraday_backtest(path, short_window=60, long_window=600, tipo_ordem=tipo,
+                                        validade_barras=30, comissao="b3_faixas", lote=100)
+            s = res["stats"]
+            print(f"{tipo:<7} barras={s['barras']:,} execuções={s['execucoes']:,} retorno={s['retorno_total']:+.2%} "
+                  f"comissões={s['comissoes']:,.0f} tempo={s['tempo_s']:.2f}s ({s['barras_por_minuto']:,} barras/min)")
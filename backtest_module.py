@@ -4,9 +4,15 @@ import os
 import matplotlib
 matplotlib.use('Agg') # Use Agg backend for non-interactive plotting
 import matplotlib.pyplot as plt
+import calendario_mercado
+import estrategias
+import instrumentacao
+import liquidez
+import universo
 
 DATA_DIR = "."
 
+@instrumentacao.instrumentado("io.analise_quantitativa")
 def load_quant_analysis_data(symbol_filename_stem):
     """Carrega os dados de análise quantitativa de uma ação."""
     filepath = os.path.join(DATA_DIR, f"{symbol_filename_stem}_quant_analysis.csv")
@@ -19,7 +25,10 @@ def load_quant_analysis_data(symbol_filename_stem):
         # Para o bt, precisamos de um DataFrame onde cada coluna é um ativo e os valores são os preços de fechamento.
         # Para uma estratégia simples com um único ativo, podemos renomear 'Adj Close' para o nome do ticker.
         df = pd.read_csv(filepath, index_col='Timestamp', parse_dates=True)
-        ticker = symbol_filename_stem.split('_')[1] # e.g., PETR4 or AAPL
+        instrumentacao.anotar_arquivo_lido(filepath)
+        # Índice por data de pregão (mesma convenção do otimizador e dos indicadores)
+        df = calendario_mercado.normalize_daily_index(df)
+        ticker = universo.ticker_of(symbol_filename_stem) # e.g., PETR4.SA or AAPL
         if 'Adj Close' not in df.columns:
             print(f"Coluna 'Adj Close' não encontrada em {filepath}")
             return None
@@ -31,55 +40,69 @@ def load_quant_analysis_data(symbol_filename_stem):
         print(f"Erro ao carregar dados de análise quantitativa de {filepath}: {e}")
         return None, None
 
-def run_sma_crossover_backtest(price_data, full_data_df, ticker_name, short_window=50, long_window=200):
-    """Executa um backtest de cruzamento de médias móveis simples."""
+class CustoLiquidez(bt.Algo):
+    """Atualiza a função de custo do bt a cada pregão com a liquidez do pregão anterior (sem look-ahead).
+
+    Custo de cada ordem = meio spread + impacto pela raiz quadrada da participação no ADV (ver `liquidez`).
+    """
+
+    def __init__(self, metricas):
+        super().__init__()
+        previous = metricas.shift(1)
+        self.por_data = dict(zip(previous.index, zip(previous["adv_valor"], previous["volatilidade"], previous["spread"])))
+
+    def __call__(self, target):
+        metricas = self.por_data.get(target.now)
+        if metricas is not None:
+            target.set_commissions(liquidez.commission_fn(*metricas))
+        return True
+
+def cost_model_for(full_data_df, custos=True):
+    """Modelo de custos (`liquidez.cost_model`) que `run_strategy_backtest` aplica a esse histórico, ou None se
+    o backtest roda sem custos (`custos=False` ou faltam as colunas de volume e máximas/mínimas)."""
+    if not custos or full_data_df is None or any(c not in full_data_df.columns for c in liquidez.COLUMNS):
+        return None
+    return liquidez.cost_model()
+
+def run_strategy_backtest(price_data, full_data_df, ticker_name, strategy="sma_crossover", custos=True, **params):
+    """Executa o backtest de uma estratégia registrada em `estrategias` (ex: sma_crossover, rsi_mean_reversion).
+    Indicadores que não estiverem no arquivo de análise quantitativa são calculados sob demanda (com cache).
+    Com `custos=True`, as ordens pagam spread e impacto de mercado estimados do volume e das máximas/mínimas
+    do próprio arquivo (se faltarem essas colunas, o backtest roda sem custos)."""
     if price_data is None or full_data_df is None:
         print(f"Dados de preço ou completos ausentes para {ticker_name}")
         return None
 
-    print(f"\n--- Backtest SMA Crossover para {ticker_name} ({short_window}x{long_window}) ---")
-
-    # Certifique-se de que as colunas SMA existem no full_data_df
-    sma_short_col = f'SMA_{short_window}'
-    sma_long_col = f'SMA_{long_window}'
-
-    if sma_short_col not in full_data_df.columns or sma_long_col not in full_data_df.columns:
-        print(f"Colunas SMA ({sma_short_col}, {sma_long_col}) não encontradas nos dados completos para {ticker_name}.")
-        print("Certifique-se de que a análise quantitativa foi executada e salvou essas colunas.")
+    try:
+        params = estrategias.resolve_params(strategy, **params)
+    except (KeyError, ValueError) as e:
+        print(f"Estratégia inválida para {ticker_name}: {e}")
         return None
+    params_label = "x".join(str(v) for v in params.values())
+    print(f"\n--- Backtest {strategy} para {ticker_name} ({params_label}) ---")
 
-    # Criar a estratégia: Comprar quando SMA curta cruza acima da SMA longa, Vender quando cruza abaixo.
-    # Usaremos os dados de preço para o backtest e os dados completos para os sinais das SMAs.
-    # O bt precisa de um DataFrame de sinais (1 para comprar, -1 para vender, 0 para manter)
-    # Alinhar os índices é crucial aqui.
-    signal_df = pd.DataFrame(index=full_data_df.index)
-    signal_df[ticker_name] = 0 # Inicializa com 0 (manter)
-
-    # Sinal de compra: SMA_short > SMA_long
-    signal_df.loc[full_data_df[sma_short_col] > full_data_df[sma_long_col], ticker_name] = 1.0
-    # Sinal de venda (short): SMA_short < SMA_long (para uma estratégia long-only, isso seria sair da posição)
-    # Para simplificar, vamos apenas definir a posição para 0 quando o sinal de compra desaparece.
-    # Uma abordagem mais robusta usaria bt.algos.SelectWhere ou similar.
-    
-    # bt.algos.WeighTarget requer um DataFrame de pesos alvo.
-    # Vamos criar uma estratégia que aloca 100% ao ativo quando o sinal é de compra.
-    target_weights = signal_df.copy()
-    # Quando o sinal é 1 (compra), o peso é 1. Caso contrário, 0.
-    target_weights[target_weights != 1] = 0 
+    # Peso alvo por data (0 a 1) calculado pela regra da estratégia
+    target_weights = estrategias.target_weights(strategy, ticker_name, price_data[ticker_name],
+                                                full_data_df=full_data_df, **params).to_frame()
 
     # Criar a estratégia de backtest com os pesos alvo
-    strategy_sma_crossover = bt.Strategy(f'{ticker_name}_SMA_Crossover',
-                                       [bt.algos.SelectAll(), # Seleciona todos os ativos (no nosso caso, apenas um)
-                                        bt.algos.WeighTarget(target_weights),
-                                        bt.algos.Rebalance()])
+    algos = [bt.algos.SelectAll(), # Seleciona todos os ativos (no nosso caso, apenas um)
+             bt.algos.WeighTarget(target_weights)]
+    if cost_model_for(full_data_df, custos) is not None:
+        algos.append(CustoLiquidez(liquidez.metrics_from_history(full_data_df)))
+    elif custos:
+        print(f"Sem volume/máximas/mínimas no arquivo de {ticker_name}; backtest sem custos de transação.")
+    algos.append(bt.algos.Rebalance())
+    strategy_bt = bt.Strategy(f'{ticker_name}_{strategy}', algos)
 
     # Criar o backtest
     # O bt espera que os dados de entrada (price_data) tenham colunas nomeadas com os tickers
-    backtest = bt.Backtest(strategy_sma_crossover, price_data)
+    backtest = bt.Backtest(strategy_bt, price_data)
     
     # Executar o backtest
     try:
-        results = bt.run(backtest)
+        with instrumentacao.medir_etapa("backtest.bt_run", ticker=ticker_name, estrategia=strategy, linhas=len(price_data)):
+            results = bt.run(backtest)
     except Exception as e:
         print(f"Erro ao executar o backtest para {ticker_name}: {e}")
         print("Verifique os dados de entrada e a configuração da estratégia.")
@@ -90,12 +113,18 @@ def run_sma_crossover_backtest(price_data, full_data_df, ticker_name, short_wind
     print(f"Backtest para {ticker_name} concluído.")
     return results
 
+def run_sma_crossover_backtest(price_data, full_data_df, ticker_name, short_window=50, long_window=200, custos=True):
+    """Executa um backtest de cruzamento de médias móveis simples.
+    As colunas SMA_{n} do arquivo de análise quantitativa são usadas quando existem; caso contrário são calculadas."""
+    return run_strategy_backtest(price_data, full_data_df, ticker_name, "sma_crossover", custos=custos,
+                                 short_window=short_window, long_window=long_window)
+
 if __name__ == "__main__":
     # Exemplo com PETR4.SA
     petr4_stem = "br_PETR4_SA"
     petr4_price_data, df_petr4_full = load_quant_analysis_data(petr4_stem)
     if petr4_price_data is not None and df_petr4_full is not None:
-        results_petr4 = run_sma_crossover_backtest(petr4_price_data, df_petr4_full, "PETR4", short_window=50, long_window=200)
+        results_petr4 = run_sma_crossover_backtest(petr4_price_data, df_petr4_full, petr4_price_data.columns[0], short_window=50, long_window=200)
         if results_petr4:
             print("\nResultados do Backtest para PETR4:")
             results_petr4.display()
@@ -114,7 +143,7 @@ if __name__ == "__main__":
     aapl_stem = "us_AAPL"
     aapl_price_data, df_aapl_full = load_quant_analysis_data(aapl_stem)
     if aapl_price_data is not None and df_aapl_full is not None:
-        results_aapl = run_sma_crossover_backtest(aapl_price_data, df_aapl_full, "AAPL", short_window=50, long_window=200)
+        results_aapl = run_sma_crossover_backtest(aapl_price_data, df_aapl_full, aapl_price_data.columns[0], short_window=50, long_window=200)
         if results_aapl:
             print("\nResultados do Backtest para AAPL:")
             results_aapl.display()
@@ -0,0 +1,263 @@
+"""Suíte de benchmarks reprodutível (sem rede) para carga, indicadores, backtest, otimização e recomendações.
+
+Uso:
+    python benchmark_suite.py                       # grade rápida (10 e 100 tickers, 5 anos)
+    python benchmark_suite.py --completo            # 10/100/1.000/5.000 tickers x 5/20 anos
+    python benchmark_suite.py --salvar-baseline     # grava o resultado atual como baseline
+Os resultados vão para benchmark_results.json e são comparados com benchmark_baseline.json (se existir).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+import analise_quantitativa
+import backtest_module
+import black_litterman
+import estrategias
+import eventos_corporativos
+import liquidez
+import otimizacao_carteira
+import recomendacoes_module
+import calendario_mercado
+import painel_compacto
+import validacao_dados
+import universo
+
+BENCH_DATA_DIR = "bench_data"
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.25  # regressão se o tempo piorar mais de 25% em relação ao baseline
+MIN_DELTA_S = 0.05        # diferenças absolutas menores que isso são ruído de medição
+
+# Limite de tickers por benchmark (as etapas por ativo com bt e o QP denso não escalam a 5.000 nomes)
+DEFAULT_MAX_TICKERS = {
+    "backtest_sma_crossover": 100,
+    "otimizacao_max_sharpe": 500,
+}
+
+def _stems_for(n_tickers):
+    """Metade B3, metade EUA, no mesmo formato de stem usado pela coleta."""
+    stems = []
+    for i in range(n_tickers):
+        if i % 2 == 0:
+            stems.append(f"br_SYN{i:05d}_SA")
+        else:
+            stems.append(f"us_SYNU{i:05d}")
+    return stems
+
+def generate_synthetic_universe(n_tickers, n_years, data_dir=BENCH_DATA_DIR, seed=42):
+    """Gera (ou reutiliza) arquivos de chart, quant_analysis e insights sintéticos para o universo.
+
+    Os preços seguem um passeio aleatório geométrico no calendário de pregões da bolsa do ativo.
+    Retorna (diretorio, lista_de_stems).
+    """
+    target_dir = os.path.join(data_dir, f"{n_tickers}x{n_years}y_seed{seed}")
+    stems = _stems_for(n_tickers)
+    marker = os.path.join(target_dir, ".completo")
+    if os.path.exists(marker):
+        return target_dir, stems
+    os.makedirs(target_dir, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp("2025-05-07")
+    start = end - pd.DateOffset(years=n_years)
+    calendars = {ex: calendario_mercado.trading_days(ex, start, end) for ex in ("B3", "NYSE")}
+    ratings = ["STRONG BUY", "BUY", "HOLD", "UNDERPERFORM", "SELL"]
+
+    for stem in stems:
+        region = calendario_mercado.stem_region(stem)
+        dates = calendars[calendario_mercado.REGION_EXCHANGE[region]]
+        n = len(dates)
+        log_ret = rng.normal(0.0003, rng.uniform(0.01, 0.03), n)
+        close = rng.uniform(5, 300) * np.exp(np.cumsum(log_ret))
+        spread = np.abs(rng.normal(0, 0.01, n))
+        df = pd.DataFrame({
+            "Open": close * (1 + rng.normal(0, 0.005, n)),
+            "High": close * (1 + spread),
+            "Low": close * (1 - spread),
+            "Close": close,
+            "Volume": rng.integers(10_000, 5_000_000, n),
+            "Adj Close": close * np.linspace(0.8, 1.0, n),
+        }, index=pd.DatetimeIndex(dates, name="Timestamp"))
+        df.to_csv(os.path.join(target_dir, f"{stem}_chart.csv"))
+
+        df["SMA_50"] = df["Adj Close"].rolling(50).mean()
+        df["SMA_200"] = df["Adj Close"].rolling(200).mean()
+        df["RSI_14"] = analise_quantitativa.calculate_rsi(df, 14)
+        df.to_csv(os.path.join(target_dir, f"{stem}_quant_analysis.csv"))
+
+        insights = {"symbol": universo.ticker_of(stem),
+                    "recommendation": {"rating": ratings[int(rng.integers(0, len(ratings)))]}}
+        with open(os.path.join(target_dir, f"{stem}_insights.json"), "w") as f:
+            json.dump(insights, f)
+
+    open(marker, "w").close()
+    return target_dir, stems
+
+def _set_data_dir(data_dir):
+    for module in (analise_quantitativa, backtest_module, otimizacao_carteira, recomendacoes_module,
+                   calendario_mercado, validacao_dados, universo, painel_compacto):
+        module.DATA_DIR = data_dir
+
+def clear_caches():
+    """Esvazia os caches em memória dos módulos (painéis alinhados, covariâncias, sinais, tabela do universo...)."""
+    calendario_mercado._ALIGNED_CACHE.clear()
+    calendario_mercado._trading_days_cached.cache_clear()
+    otimizacao_carteira._COV_CACHE.clear()
+    estrategias.SIGNAL_CACHE.clear()
+    universo.invalidate()
+    liquidez._PANEL_CACHE.clear()
+    black_litterman._INSIGHTS_CACHE.clear()
+    black_litterman._PRIOR_CACHE.clear()
+    eventos_corporativos._cache.clear()
+
+def _timed(function, repeats=1):
+    """Executa `function` silenciando os prints dos módulos e retorna o melhor tempo (s).
+
+    Os caches são esvaziados antes de cada repetição: todas medem a execução a frio, como a primeira.
+    """
+    best = None
+    for _ in range(repeats):
+        clear_caches()
+        # stderr também é silenciado: o bt.run desenha uma barra de progresso por backtest
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _bench_load(stems):
+    for stem in stems:
+        analise_quantitativa.load_stock_chart_data(stem)
+
+def _bench_indicators(frames):
+    for df in frames:
+        analise_quantitativa.calculate_moving_average(df, 50)
+        analise_quantitativa.calculate_moving_average(df, 200)
+        analise_quantitativa.calculate_rsi(df, 14)
+
+def _bench_backtest(stems):
+    for stem in stems:
+        price_data, full_df = backtest_module.load_quant_analysis_data(stem)
+        backtest_module.run_sma_crossover_backtest(price_data, full_df, price_data.columns[0], 50, 200)
+
+def _bench_optimization(stems):
+    prices = otimizacao_carteira.load_stock_prices_for_optimization(stems)
+    otimizacao_carteira.optimize_portfolio(prices, optimization_method="max_sharpe")
+
+def _bench_recommendations(stems):
+    recomendacoes_module.generate_recommendations(stems, {"BR": "Neutro", "US": "Neutro"})
+
+def run_benchmarks(ticker_counts, year_counts, max_tickers=None, repeats=1, data_dir=BENCH_DATA_DIR):
+    """Executa a grade de benchmarks e retorna a lista de resultados (um dict por medição)."""
+    max_tickers = dict(DEFAULT_MAX_TICKERS if max_tickers is None else max_tickers)
+    results = []
+    original_data_dir = analise_quantitativa.DATA_DIR
+    try:
+        for n_years in year_counts:
+            for n_tickers in ticker_counts:
+                print(f"Preparando universo sintético: {n_tickers} tickers x {n_years} anos...")
+                universe_dir, stems = generate_synthetic_universe(n_tickers, n_years, data_dir=data_dir)
+                _set_data_dir(universe_dir)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    frames = [analise_quantitativa.load_stock_chart_data(s) for s in stems]
+
+                benchmarks = {
+                    "load_stock_chart_data": lambda: _bench_load(stems),
+                    "carga_compacta_adj_close": lambda: painel_compacto.map_universe(
+                        lambda panel: panel.groupby("ticker", observed=True)["Adj Close"].last(), stems),
+                    "indicadores_sma_rsi": lambda: _bench_indicators(frames),
+                    "backtest_sma_crossover": lambda: _bench_backtest(stems[:max_tickers.get("backtest_sma_crossover", n_tickers)]),
+                    "otimizacao_max_sharpe": lambda: _bench_optimization(stems[:max_tickers.get("otimizacao_max_sharpe", n_tickers)]),
+                    "generate_recommendations": lambda: _bench_recommendations(stems),
+                }
+                for name, function in benchmarks.items():
+                    effective = min(n_tickers, max_tickers.get(name, n_tickers))
+                    elapsed = _timed(function, repeats=repeats)
+                    results.append({
+                        "benchmark": name, "tickers": n_tickers, "tickers_efetivos": effective,
+                        "anos": n_years, "tempo_s": round(elapsed, 4),
+                        "tempo_por_ticker_ms": round(1000 * elapsed / max(effective, 1), 3),
+                    })
+                    print(f"  {name:<28} {effective:>6} tickers  {elapsed:9.3f} s")
+    finally:
+        _set_data_dir(original_data_dir)
+    return results
+
+def _result_key(result):
+    return f"{result['benchmark']}|{result['tickers']}|{result['anos']}"
+
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compara tempos com o baseline; retorna a lista de regressões (tempo acima de baseline*(1+tolerância)
+    e pelo menos MIN_DELTA_S mais lento)."""
+    baseline_by_key = {_result_key(r): r for r in baseline.get("resultados", [])}
+    regressions = []
+    for result in results:
+        reference = baseline_by_key.get(_result_key(result))
+        if reference is None or reference["tempo_s"] <= 0:
+            continue
+        ratio = result["tempo_s"] / reference["tempo_s"]
+        result["razao_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance and result["tempo_s"] - reference["tempo_s"] > MIN_DELTA_S:
+            regressions.append({**result, "tempo_baseline_s": reference["tempo_s"]})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do QUANTFUND com dados sintéticos.")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--anos", type=int, nargs="+", default=[5])
+    parser.add_argument("--completo", action="store_true", help="Grade completa: 10/100/1000/5000 tickers x 5/20 anos")
+    parser.add_argument("--sem-limites", action="store_true", help="Não limita o número de tickers no backtest/otimização")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--tolerancia", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--dados", default=BENCH_DATA_DIR, help="Diretório dos universos sintéticos (reutilizados entre execuções)")
+    parser.add_argument("--saida", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--salvar-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    ticker_counts = [10, 100, 1000, 5000] if args.completo else args.tickers
+    year_counts = [5, 20] if args.completo else args.anos
+    results = run_benchmarks(ticker_counts, year_counts, max_tickers={} if args.sem_limites else None,
+                             repeats=args.repeticoes, data_dir=args.dados)
+
+    report = {
+        "gerado_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "ambiente": {"python": sys.version.split()[0], "plataforma": platform.platform(),
+                     "pandas": pd.__version__, "numpy": np.__version__},
+        "resultados": results,
+    }
+
+    exit_code = 0
+    if os.path.exists(args.baseline) and not args.salvar_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, tolerance=args.tolerancia)
+        report["regressoes"] = regressions
+        if regressions:
+            exit_code = 1
+            print(f"\n{len(regressions)} regressão(ões) acima de {args.tolerancia:.0%} em relação ao baseline:")
+            for r in regressions:
+                print(f"  {r['benchmark']} ({r['tickers']} tickers, {r['anos']} anos): {r['tempo_baseline_s']:.3f}s -> {r['tempo_s']:.3f}s")
+        else:
+            print("\nNenhuma regressão em relação ao baseline.")
+
+    with open(args.saida, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Resultados salvos em {args.saida}")
+    if args.salvar_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline salvo em {args.baseline}")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Retornos esperados de Black-Litterman com visões dos analistas (preço-alvo dos insights).
+
+- Prior de equilíbrio: π = δ Σ w_mkt + rf, com w_mkt proporcional ao `marketCap` dos insights
+  (convertido para uma moeda comum). Memorizado pela versão do painel de preços de onde Σ saiu
+  (`otimizacao_carteira.prices_version`) e pelas capitalizações.
+- Visões absolutas, uma por ticker com cobertura: Q_i = targetMeanPrice / currentPrice - 1 (horizonte
+  de 12 meses dos preços-alvo, na mesma base anual dos retornos do otimizador).
+- Confiança pela quantidade de analistas: c = n / (n + ANALISTAS_MEIA_CONFIANCA), levada à incerteza da
+  visão por Ω_ii = τ Σ_ii (1 - c) / c (c = 50% dá à visão o mesmo peso do prior).
+As visões do universo inteiro são montadas de uma vez (arrays), sem laço por ticker.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import scipy.linalg
+from pypfopt import black_litterman as pypfopt_bl
+import calendario_mercado
+import instrumentacao
+import universo
+
+DATA_DIR = "."
+RISK_AVERSION = 2.5            # aversão ao risco do mercado (δ) usual na literatura
+TAU = 0.05                     # incerteza do prior em relação a Σ
+ANALISTAS_MEIA_CONFIANCA = 10  # número de analistas com o qual a visão tem 50% de confiança
+CONFIANCA_MAXIMA = 0.95
+LIMITES_VISAO = (-0.9, 1.0)    # retornos implícitos fora disso indicam preço-alvo defasado
+MOEDA_PRIOR = "USD"
+
+INSIGHT_FIELDS = ("targetMeanPrice", "currentPrice", "regularMarketPrice", "recommendationMean",
+                  "numberOfAnalystOpinions", "marketCap")
+
+_INSIGHTS_CACHE = {}
+_INSIGHTS_CACHE_SIZE = 4096   # arquivos; cobre universos de alguns milhares de tickers
+_PRIOR_CACHE = {}
+_PRIOR_CACHE_SIZE = 8
+
+def _read_insight_fields(path):
+    """Campos de INSIGHT_FIELDS de um insights.json (memorizado pelo mtime do arquivo).
+
+    Uma entrada por arquivo (uma nova coleta substitui a anterior), no máximo _INSIGHTS_CACHE_SIZE arquivos.
+    """
+    key, mtime = os.path.abspath(path), os.path.getmtime(path)
+    cached = _INSIGHTS_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r") as f:
+        info = json.load(f)
+    instrumentacao.anotar_arquivo_lido(path)
+    fields = {name: info.get(name) for name in INSIGHT_FIELDS}
+    _INSIGHTS_CACHE.pop(key, None)
+    if len(_INSIGHTS_CACHE) >= _INSIGHTS_CACHE_SIZE:
+        _INSIGHTS_CACHE.pop(next(iter(_INSIGHTS_CACHE)))
+    _INSIGHTS_CACHE[key] = (mtime, fields)
+    return fields
+
+def load_analyst_data(tickers):
+    """Tabela (tickers x INSIGHT_FIELDS, mais 'moeda') lida dos insights coletados; campos ausentes ficam NaN."""
+    universo.DATA_DIR = DATA_DIR
+    rows = {}
+    for ticker in tickers:
+        meta = universo.asset(ticker)
+        path = universo.file_path(meta["stem"], "insights", DATA_DIR)
+        fields = _read_insight_fields(path) if os.path.exists(path) else {}
+        rows[ticker] = {**{name: fields.get(name) for name in INSIGHT_FIELDS}, "moeda": meta["moeda"]}
+    table = pd.DataFrame.from_dict(rows, orient="index", columns=[*INSIGHT_FIELDS, "moeda"])
+    table[list(INSIGHT_FIELDS)] = table[list(INSIGHT_FIELDS)].apply(pd.to_numeric, errors="coerce")
+    return table
+
+def analyst_views(analysts, last_prices=None):
+    """Visões absolutas de todo o universo a partir da tabela de `load_analyst_data`.
+
+    O preço atual é `currentPrice` (mesma data do preço-alvo), depois `regularMarketPrice` e, por fim,
+    `last_prices` (Series por ticker, ex: último fechamento). Retorna DataFrame indexado pelos tickers
+    com visão: retorno_visao, confianca, n_analistas, preco_alvo, preco_atual, recomendacao.
+    """
+    price = analysts["currentPrice"].fillna(analysts["regularMarketPrice"])
+    if last_prices is not None:
+        price = price.fillna(pd.Series(last_prices, dtype=float).reindex(analysts.index))
+    target = analysts["targetMeanPrice"].to_numpy(dtype=float)
+    n = analysts["numberOfAnalystOpinions"].fillna(0).to_numpy(dtype=float)
+    current = price.to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        implied = target / current - 1.0
+    valid = np.isfinite(implied) & (current > 0) & (target > 0) & (n > 0)
+    confidence = np.minimum(n / (n + ANALISTAS_MEIA_CONFIANCA), CONFIANCA_MAXIMA)
+    views = pd.DataFrame({
+        "retorno_visao": np.clip(implied, *LIMITES_VISAO), "confianca": confidence, "n_analistas": n.astype(int),
+        "preco_alvo": target, "preco_atual": current, "recomendacao": analysts["recommendationMean"].to_numpy(dtype=float),
+    }, index=analysts.index)
+    return views[valid]
+
+def market_caps(analysts, moeda=MOEDA_PRIOR):
+    """Capitalização de mercado em `moeda` (câmbio local mais recente; ver `calendario_mercado.load_fx_series`).
+
+    Tickers sem `marketCap` recebem a mediana dos demais (peso neutro no prior); sem nenhuma
+    capitalização, todos ficam iguais.
+    """
+    caps = analysts["marketCap"].astype(float).copy()
+    currencies = analysts["moeda"].fillna(moeda)
+    foreign = (currencies != moeda).to_numpy() & caps.notna().to_numpy()
+    if foreign.any():
+        calendario_mercado.DATA_DIR = DATA_DIR
+        base, quote = ("USD", "BRL") if moeda == "USD" else ("USD", moeda)
+        fx = calendario_mercado.load_fx_series(base, quote)
+        fx = fx.dropna() if fx is not None else None
+        if fx is None or fx.empty:
+            print(f"Câmbio {base}/{quote} não disponível localmente; capitalizações mantidas nas moedas originais.")
+        else:
+            rate = float(fx.iloc[-1])
+            caps[foreign] = caps[foreign] / rate if moeda == base else caps[foreign] * rate
+    if caps.notna().any():
+        caps = caps.fillna(caps.median())
+    else:
+        caps[:] = 1.0
+    return caps
+
+def market_prior(cov, caps, risk_aversion=RISK_AVERSION, risk_free_rate=0.0, versao=None):
+    """Retornos de equilíbrio π = δ Σ w_mkt + rf (PyPortfolioOpt).
+
+    Com `versao` (digest do painel de preços que gerou `cov`), o resultado é memorizado por versão,
+    capitalizações e δ; hashear o próprio Σ custaria tanto quanto recalcular δ Σ w.
+    """
+    caps = caps.reindex(cov.index)
+    key = None
+    if versao is not None:
+        digest = hashlib.sha1(caps.to_numpy(dtype=np.float64).tobytes())
+        digest.update(f"{versao}|{risk_aversion}|{risk_free_rate}".encode())
+        key = digest.hexdigest()
+        if key in _PRIOR_CACHE:
+            instrumentacao.anotar(prior_cache_hit=True)
+            return _PRIOR_CACHE[key]
+        instrumentacao.anotar(prior_cache_hit=False)
+    prior = pypfopt_bl.market_implied_prior_returns(caps, risk_aversion, cov, risk_free_rate=risk_free_rate)
+    if key is not None:
+        if len(_PRIOR_CACHE) >= _PRIOR_CACHE_SIZE:
+            _PRIOR_CACHE.pop(next(iter(_PRIOR_CACHE)))
+        _PRIOR_CACHE[key] = prior
+    return prior
+
+@instrumentacao.instrumentado("otimizacao.black_litterman")
+def posterior(cov, last_prices=None, analysts=None, risk_aversion=RISK_AVERSION, tau=TAU, risk_free_rate=0.0,
+              versao=None):
+    """(retornos a posteriori, covariância a posteriori, detalhes) para os tickers de `cov`.
+
+    `cov` é a covariância anualizada (DataFrame tickers x tickers). Sem nenhuma visão válida, o posterior
+    é o próprio prior de equilíbrio. `detalhes` traz o prior, as capitalizações e a tabela de visões.
+    `versao` identifica o painel de preços de `cov` (memoriza o prior; ver `market_prior`).
+    """
+    tickers = list(cov.index)
+    analysts = load_analyst_data(tickers) if analysts is None else analysts.reindex(tickers)
+    caps = market_caps(analysts)
+    prior = market_prior(cov, caps, risk_aversion, risk_free_rate, versao)
+    views = analyst_views(analysts, last_prices)
+    instrumentacao.anotar(ativos=len(tickers), visoes=len(views))
+    detalhes = {"prior": prior, "capitalizacao": caps, "visoes": views}
+    if views.empty:
+        print("Nenhuma visão de analista disponível; usando o prior de equilíbrio de mercado.")
+        return prior, cov, detalhes
+
+    # Visões absolutas (P seleciona linhas de Σ) com Ω diagonal: a fórmula do posterior
+    #   μ = π + τΣPᵀ (τPΣPᵀ + Ω)⁻¹ (Q - Pπ),  Σ_post = Σ + τΣ - τΣPᵀ (τPΣPᵀ + Ω)⁻¹ τPΣ
+    # só precisa de um sistema positivo-definido do tamanho do número de visões (sem montar P nem inverter Ω)
+    sigma = cov.to_numpy(dtype=np.float64)
+    positions = cov.index.get_indexer(views.index)
+    confidence = views["confianca"].to_numpy()
+    tau_sigma_pt = tau * sigma[:, positions]
+    system = tau_sigma_pt[positions]
+    system[np.diag_indices_from(system)] += tau * np.diag(sigma)[positions] * (1.0 - confidence) / confidence
+    pi = prior.reindex(tickers).to_numpy(dtype=np.float64)
+    rhs = np.column_stack([views["retorno_visao"].to_numpy() - pi[positions], tau_sigma_pt.T])
+    solved = scipy.linalg.solve(system, rhs, assume_a="pos")
+    mu = pi + tau_sigma_pt @ solved[:, 0]
+    cov_post = sigma + tau * sigma - tau_sigma_pt @ solved[:, 1:]
+    cov_post = (cov_post + cov_post.T) / 2.0
+    return (pd.Series(mu, index=tickers), pd.DataFrame(cov_post, index=tickers, columns=tickers), detalhes)
+
+if __name__ == "__main__":
+    import time
+    # Ativos independentes: com uma visão absoluta por ativo, o posterior anda a fração c do prior até a visão
+    rng = np.random.default_rng(3)
+    tickers = [f"T{i:04d}" for i in range(2000)]
+    cov = pd.DataFrame(np.diag(rng.uniform(0.04, 0.16, len(tickers))), index=tickers, columns=tickers)
+    analysts = pd.DataFrame({
+        "targetMeanPrice": rng.uniform(8.0, 14.0, len(tickers)), "currentPrice": 10.0, "regularMarketPrice": np.nan,
+        "recommendationMean": 2.0, "numberOfAnalystOpinions": np.tile([0, 1, 5, 10, 30], len(tickers) // 5),
+        "marketCap": rng.lognormal(22, 1.5, len(tickers)), "moeda": "USD",
+    }, index=tickers)
+    inicio = time.perf_counter()
+    mu, cov_bl, detalhes = posterior(cov, analysts=analysts)
+    print(f"{len(tickers)} ativos, {len(detalhes['visoes'])} visões: {1000 * (time.perf_counter() - inicio):.0f} ms")
+    views = detalhes["visoes"]
+    moved = (mu[views.index] - detalhes["prior"][views.index]) / (views["retorno_visao"] - detalhes["prior"][views.index])
+    print(pd.DataFrame({"confianca": views["confianca"], "fracao_movida": moved}).groupby(views["n_analistas"]).mean().round(4))
+    # Memorizado pela versão do painel de preços (aqui, um rótulo fixo), sem hashear Σ
+    caps = market_caps(analysts)
+    for rotulo in ("Prior calculado", "Prior memorizado"):
+        inicio = time.perf_counter()
+        market_prior(cov, caps, versao="demo")
+        print(f"{rotulo}: {1000 * (time.perf_counter() - inicio):.2f} ms")
@@ -0,0 +1,293 @@
+import os
+from datetime import date, timedelta
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import instrumentacao
+import painel_compacto
+import universo
+
+DATA_DIR = "."
+
+# Região (prefixo dos arquivos) -> bolsa e moeda
+REGION_EXCHANGE = {"BR": "B3", "US": "NYSE"}
+REGION_CURRENCY = {"BR": "BRL", "US": "USD"}
+
+# Fechamentos extraordinários que não seguem as regras anuais
+AD_HOC_CLOSURES = {
+    "NYSE": [
+        date(2012, 10, 29), date(2012, 10, 30),  # Furacão Sandy
+        date(2018, 12, 5),                       # Funeral de George H. W. Bush
+        date(2025, 1, 9),                        # Funeral de Jimmy Carter
+    ],
+    "B3": [],
+}
+
+# Dias que seriam feriado pelas regras, mas tiveram pregão
+AD_HOC_OPENINGS = {
+    "NYSE": [],
+    "B3": [date(2020, 7, 9)],  # Feriado municipal de SP antecipado durante a pandemia
+}
+
+def _easter(year):
+    """Domingo de Páscoa (algoritmo anônimo gregoriano)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    """n-ésima ocorrência (1 = primeira, -1 = última) de um dia da semana (0 = segunda) no mês."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    """Regra da NYSE: feriado no sábado é observado na sexta; no domingo, na segunda."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def b3_holidays(year):
+    """Dias sem pregão na B3 em um ano (feriados nacionais e datas em que a bolsa não opera)."""
+    easter = _easter(year)
+    days = [
+        date(year, 1, 1),
+        easter - timedelta(days=48),  # Carnaval (segunda)
+        easter - timedelta(days=47),  # Carnaval (terça)
+        easter - timedelta(days=2),   # Sexta-feira Santa
+        date(year, 4, 21),
+        date(year, 5, 1),
+        easter + timedelta(days=60),  # Corpus Christi
+        date(year, 9, 7),
+        date(year, 10, 12),
+        date(year, 11, 2),
+        date(year, 11, 15),
+        date(year, 12, 24),
+        date(year, 12, 25),
+    ]
+    # Sem pregão no último dia útil do ano (31/12, ou a sexta anterior se cair no fim de semana)
+    last_day = date(year, 12, 31)
+    while last_day.weekday() >= 5:
+        last_day -= timedelta(days=1)
+    days.append(last_day)
+    if year <= 2021:
+        # Até 2021 a B3 não operava nos feriados municipais de São Paulo
+        days += [date(year, 1, 25), date(year, 7, 9), date(year, 11, 20)]
+    elif year >= 2024:
+        days.append(date(year, 11, 20))  # Consciência Negra virou feriado nacional
+    return days
+
+def nyse_holidays(year):
+    """Dias sem pregão na NYSE em um ano."""
+    days = []
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:  # No sábado não há observância na sexta (31/12 do ano anterior)
+        days.append(_observed(new_year))
+    days += [
+        _nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr.
+        _nth_weekday(year, 2, 0, 3),   # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),   # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),
+    ]
+    if year >= 2022:
+        days.append(_observed(date(year, 6, 19)))  # Juneteenth
+    return days
+
+EXCHANGE_HOLIDAY_RULES = {
+    "B3": b3_holidays,
+    "NYSE": nyse_holidays,
+}
+
+@lru_cache(maxsize=64)
+def _trading_days_cached(exchange, start, end):
+    rules = EXCHANGE_HOLIDAY_RULES[exchange]
+    holidays = [d for year in range(start.year, end.year + 1) for d in rules(year)]
+    holidays += AD_HOC_CLOSURES.get(exchange, [])
+    holidays = set(holidays) - set(AD_HOC_OPENINGS.get(exchange, []))
+    return pd.bdate_range(start, end).difference(pd.DatetimeIndex(sorted(holidays)))
+
+def trading_days(exchange, start, end):
+    """Pregões de uma bolsa entre `start` e `end` (inclusive), como DatetimeIndex de datas."""
+    if exchange not in EXCHANGE_HOLIDAY_RULES:
+        raise ValueError(f"Calendário da bolsa '{exchange}' não disponível.")
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    return _trading_days_cached(exchange, start, end)
+
+def build_trading_calendar(exchanges, start, end, how="union"):
+    """Constrói o calendário comum ('union' ou 'intersection') de um conjunto de bolsas."""
+    exchanges = sorted(set(exchanges))
+    if not exchanges:
+        return pd.DatetimeIndex([], name="Timestamp")
+    calendar = trading_days(exchanges[0], start, end)
+    for exchange in exchanges[1:]:
+        other = trading_days(exchange, start, end)
+        calendar = calendar.union(other) if how == "union" else calendar.intersection(other)
+    calendar.name = "Timestamp"
+    return calendar
+
+def normalize_daily_index(df):
+    """Converte o índice para datas (sem hora/fuso) e remove duplicatas (mantendo a última barra do dia).
+
+    O yfinance grava o horário de abertura de cada bolsa (ex: 13:00 na B3, 13:30 na NYSE em UTC),
+    o que impede o alinhamento direto entre séries de bolsas diferentes.
+    """
+    if df is None or df.empty or not isinstance(df.index, pd.DatetimeIndex):
+        return df
+    index = df.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df = df.copy()
+    df.index = index.normalize()
+    df.index.name = "Timestamp"
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+def align_price_panel(series_by_ticker, exchange_by_ticker, how="union", start=None, end=None):
+    """Alinha séries de bolsas diferentes a um calendário único construído uma única vez.
+
+    - 'union': todos os pregões de qualquer bolsa. Em dias em que a bolsa do ativo está fechada,
+      o preço é repetido (a bolsa não negociou). Em pregões do próprio ativo sem dado, fica NaN.
+    - 'intersection': apenas pregões comuns a todas as bolsas (retornos entre dias consecutivos do
+      calendário cobrem os feriados de cada bolsa, sem dias artificiais de retorno zero).
+    O histórico anterior ao início de cada série é mantido como NaN (não há `dropna` global).
+    """
+    if not series_by_ticker:
+        return pd.DataFrame()
+    normalized = {t: normalize_daily_index(s.to_frame()).iloc[:, 0] for t, s in series_by_ticker.items()}
+    panel = pd.concat(normalized, axis=1)
+    start = pd.Timestamp(start) if start is not None else panel.index.min()
+    end = pd.Timestamp(end) if end is not None else panel.index.max()
+
+    tickers = list(panel.columns)
+    exchanges = [exchange_by_ticker[t] for t in tickers]
+    calendar = build_trading_calendar(exchanges, start, end, how=how)
+    panel = panel.reindex(calendar)
+
+    if how == "union":
+        unique_exchanges = sorted(set(exchanges))
+        open_by_exchange = np.column_stack([calendar.isin(trading_days(ex, start, end)) for ex in unique_exchanges])
+        column_exchange = np.array([unique_exchanges.index(ex) for ex in exchanges])
+        open_mask = open_by_exchange[:, column_exchange]
+        panel = panel.where(panel.notna().to_numpy() | open_mask, panel.ffill())
+    return panel
+
+def load_fx_series(base="USD", quote="BRL"):
+    """Carrega a cotação `quote` por unidade de `base` de um arquivo local.
+
+    Procura primeiro `fx_{BASE}{QUOTE}.csv` (Timestamp, valor) em DATA_DIR e, para USD/BRL,
+    recorre à série de câmbio mantida no cache de `dados_macro`.
+    """
+    filepath = os.path.join(DATA_DIR, f"fx_{base}{quote}.csv")
+    if os.path.exists(filepath):
+        return pd.read_csv(filepath, index_col="Timestamp", parse_dates=True)["valor"]
+    if (base, quote) == ("USD", "BRL"):
+        import dados_macro
+        dados_macro.DATA_DIR = DATA_DIR
+        return dados_macro.load_cached_series("BR", "USDBRL")
+    return None
+
+def convert_currency(panel, currency_by_ticker, target_currency, fx_series=None, base="USD", quote="BRL"):
+    """Converte as colunas do painel para `target_currency` usando uma série de câmbio local.
+
+    `fx_series` é a cotação de `quote` por `base` (ex: BRL por USD); é alinhada ao calendário do
+    painel com o último valor disponível (sem olhar para o futuro).
+    """
+    if fx_series is None:
+        fx_series = load_fx_series(base, quote)
+    if fx_series is None or fx_series.empty:
+        print(f"Série de câmbio {base}/{quote} não disponível localmente; painel mantido nas moedas originais.")
+        return panel
+    fx = normalize_daily_index(fx_series.to_frame()).iloc[:, 0]
+    fx = fx.reindex(fx.index.union(panel.index)).ffill().reindex(panel.index).to_numpy()
+
+    currencies = np.array([currency_by_ticker.get(t, target_currency) for t in panel.columns])
+    factors = np.ones((len(panel.index), len(panel.columns)))
+    if target_currency == quote:
+        factors[:, currencies == base] = fx[:, None]
+    elif target_currency == base:
+        factors[:, currencies == quote] = 1.0 / fx[:, None]
+    return panel * factors
+
+def stem_region(stem):
+    """Região do ativo a partir do prefixo do stem (ex: 'br_PETR4_SA' -> 'BR')."""
+    return universo.region_of(stem)
+
+_ALIGNED_CACHE = {}
+_ALIGNED_CACHE_SIZE = 4
+
+@instrumentacao.instrumentado("calendario.precos_alinhados")
+def load_aligned_prices(ticker_stems, column="Adj Close", how="union", target_currency=None,
+                        file_suffix="quant_analysis", compacto=False):
+    """Carrega uma coluna de preços de vários stems e a alinha ao calendário de pregões.
+
+    O resultado é memorizado por (stems, coluna, calendário, moeda, mtime dos arquivos), de modo que
+    otimizador, backtester e indicadores reutilizam o mesmo painel alinhado. Ficam no máximo _ALIGNED_CACHE_SIZE
+    painéis (o mais antigo sai primeiro), já que cada nova coleta muda os mtimes e gera outra chave.
+    Retorna DataFrame (datas x tickers), com tickers no formato do yfinance (ex: "PETR4.SA").
+    Com `compacto=True`, os preços são lidos e mantidos em float32 (`painel_compacto`).
+    """
+    paths = {stem: os.path.join(DATA_DIR, f"{stem}_{file_suffix}.csv") for stem in ticker_stems}
+    mtimes = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths.values())
+    cache_key = (tuple(ticker_stems), column, how, target_currency, file_suffix, compacto, mtimes, os.path.abspath(DATA_DIR))
+    if cache_key in _ALIGNED_CACHE:
+        instrumentacao.anotar(cache_hit=True)
+        return _ALIGNED_CACHE[cache_key].copy()
+    instrumentacao.anotar(cache_hit=False)
+
+    series_by_ticker = {}
+    exchange_by_ticker = {}
+    currency_by_ticker = {}
+    for stem, path in paths.items():
+        if not os.path.exists(path):
+            print(f"Arquivo não encontrado: {path} para o stem {stem}")
+            continue
+        try:
+            if compacto:
+                df = painel_compacto.read_compact(path, [column])
+            else:
+                df = pd.read_csv(path, index_col="Timestamp", parse_dates=True, usecols=["Timestamp", column])
+                instrumentacao.anotar_arquivo_lido(path)
+        except Exception as e:
+            print(f"Erro ao carregar {column} de {path}: {e}")
+            continue
+        meta = universo.asset(stem)
+        ticker_name = meta["ticker"]
+        series_by_ticker[ticker_name] = df[column]
+        exchange_by_ticker[ticker_name] = meta["bolsa"]
+        currency_by_ticker[ticker_name] = meta["moeda"]
+
+    panel = align_price_panel(series_by_ticker, exchange_by_ticker, how=how)
+    if target_currency and not panel.empty:
+        panel = convert_currency(panel, currency_by_ticker, target_currency)
+        if compacto:
+            panel = panel.astype(painel_compacto.PRICE_DTYPE)
+    if len(_ALIGNED_CACHE) >= _ALIGNED_CACHE_SIZE:
+        _ALIGNED_CACHE.pop(next(iter(_ALIGNED_CACHE)))
+    _ALIGNED_CACHE[cache_key] = panel
+    return panel.copy()
+
+if __name__ == "__main__":
+    print("Feriados B3 2025:", [d.isoformat() for d in sorted(b3_holidays(2025))])
+    print("Feriados NYSE 2025:", [d.isoformat() for d in sorted(nyse_holidays(2025))])
+
+    stems = ["br_PETR4_SA", "us_AAPL"]
+    for how in ("union", "intersection"):
+        panel = load_aligned_prices(stems, how=how)
+        print(f"\nPainel alinhado ({how}): {panel.shape[0]} pregões, primeira data {panel.index.min().date()}")
+        print(panel.tail(3))
@@ -1,12 +1,18 @@
-import yfinance as yf
 import pandas as pd
 import json
 import os
+import dados_macro
+import eventos_corporativos
+import fundamentos_pit
+import provedor_dados
+import validacao_dados
+import instrumentacao
 
 # Define o diretório de dados
 DATA_DIR = "."
 os.makedirs(DATA_DIR, exist_ok=True)
 
+@instrumentacao.instrumentado("coleta.historico")
 def fetch_and_save_stock_chart(symbol, region, filename_prefix):
     """Busca dados históricos de uma ação usando yfinance e salva em CSV.
     Para B3, o symbol deve ser no formato XXXXN.SA (ex: PETR4.SA).
@@ -15,16 +21,21 @@ def fetch_and_save_stock_chart(symbol, region, filename_prefix):
     try:
         ticker_complete = symbol # yfinance espera o ticker completo, ex: PETR4.SA
         print(f"Buscando dados históricos para {ticker_complete} com yfinance...")
-        ticker_obj = yf.Ticker(ticker_complete)
         # Para B3, o período de 5 anos é um bom padrão.
-        # auto_adjust=False para obter 'Adj Close' separadamente.
-        hist_data = ticker_obj.history(period="5y", interval="1d", auto_adjust=False, actions=False)
+        # auto_adjust=False para obter 'Adj Close' separadamente; actions=True traz proventos e desdobramentos.
+        # O provedor reutiliza a sessão/Ticker e o cache em disco (atualização incremental após o TTL)
+        hist_data = provedor_dados.fetch_history(ticker_complete, period="5y", interval="1d", auto_adjust=False, actions=True)
         
         if hist_data.empty:
             print(f"Não foi possível obter dados históricos para {ticker_complete} com yfinance. Verifique o ticker e a disponibilidade de dados.")
             return False # Indica falha
 
         hist_data.index.name = "Timestamp"
+
+        # Eventos vão para o armazenamento de eventos corporativos; o _chart.csv mantém só as cotações
+        eventos_corporativos.DATA_DIR = DATA_DIR
+        n_events = eventos_corporativos.save_events(ticker_complete, eventos_corporativos.extract_events(hist_data))
+        hist_data = hist_data.drop(columns=[c for c in eventos_corporativos.ACTION_COLUMNS if c in hist_data.columns])
         
         if 'Adj Close' not in hist_data.columns and 'Close' in hist_data.columns:
              print(f"Coluna 'Adj Close' não encontrada para {ticker_complete}. Usando 'Close' como fallback para 'Adj Close'.")
@@ -33,11 +44,20 @@ def fetch_and_save_stock_chart(symbol, region, filename_prefix):
             print(f"Colunas 'Adj Close' e 'Close' não encontradas para {ticker_complete}. Não é possível salvar os dados do gráfico.")
             return False # Indica falha
 
+        # Validação de qualidade: remove timestamps duplicados e registra o relatório do ticker
+        _, _, quality_report = validacao_dados.validate_price_series(hist_data['Adj Close'], ticker_complete)
+        hist_data = hist_data[~hist_data.index.duplicated(keep="last")].sort_index()
+        validacao_dados.DATA_DIR = DATA_DIR
+        validacao_dados.save_quality_report(quality_report)
+        if not quality_report.loc[ticker_complete, "aprovado"]:
+            print(f"AVISO: {ticker_complete} reprovado na validação de qualidade: {quality_report.loc[ticker_complete].to_dict()}")
+
         # Usar o filename_prefix (que é a região) e o símbolo para o nome do arquivo
         # Isso mantém a estrutura de nome de arquivo anterior: ex, br_PETR4_SA_chart.csv
         symbol_part_for_filename = ticker_complete.upper().replace(".", "_")
         filepath = os.path.join(DATA_DIR, f"{filename_prefix.lower()}_{symbol_part_for_filename}_chart.csv")
         hist_data.to_csv(filepath)
+        instrumentacao.anotar(ticker=ticker_complete, linhas=len(hist_data), bytes_gravados=os.path.getsize(filepath), eventos_novos=n_events)
         print(f"Dados de {ticker_complete} salvos em {filepath}")
         return True # Indica sucesso
         
@@ -45,6 +65,43 @@ def fetch_and_save_stock_chart(symbol, region, filename_prefix):
         print(f"Erro ao buscar dados históricos para {symbol} com yfinance: {e}")
         return False # Indica falha
 
+@instrumentacao.instrumentado("coleta.intradiario")
+def fetch_and_save_intraday_chart(symbol, region, filename_prefix, interval="1m", period="7d"):
+    """Busca barras intradiárias com yfinance e as acrescenta ao arquivo local do ativo.
+    O yfinance só disponibiliza poucos dias de barras de 1 minuto; acumular a cada coleta permite
+    montar um histórico longo para o backtest intradiário (`backtest_intraday`).
+    """
+    try:
+        ticker_complete = symbol
+        print(f"Buscando barras intradiárias ({interval}) para {ticker_complete} com yfinance...")
+        bars = provedor_dados.fetch_history(ticker_complete, period=period, interval=interval, auto_adjust=False, actions=False)
+        if bars.empty:
+            print(f"Não foi possível obter barras intradiárias para {ticker_complete}.")
+            return False
+        bars.index.name = "Timestamp"
+        bars = bars[["Open", "High", "Low", "Close", "Volume"]]
+
+        symbol_part_for_filename = ticker_complete.upper().replace(".", "_")
+        filepath = os.path.join(DATA_DIR, f"{filename_prefix.lower()}_{symbol_part_for_filename}_intraday_{interval}.csv")
+        if os.path.exists(filepath):
+            # Só as barras posteriores à última gravada são acrescentadas (o arquivo pode ser grande)
+            with open(filepath, "rb") as f:
+                f.seek(max(os.path.getsize(filepath) - 512, 0))
+                last_line = f.read().decode("utf-8").strip().splitlines()[-1]
+            last_timestamp = pd.Timestamp(last_line.split(",")[0])
+            bars = bars[bars.index > last_timestamp]
+            bars.to_csv(filepath, mode="a", header=False)
+        else:
+            bars.to_csv(filepath)
+        instrumentacao.anotar(ticker=ticker_complete, linhas=len(bars))
+        print(f"{len(bars)} novas barras de {ticker_complete} salvas em {filepath}")
+        return True
+
+    except Exception as e:
+        print(f"Erro ao buscar barras intradiárias para {symbol} com yfinance: {e}")
+        return False
+
+@instrumentacao.instrumentado("coleta.insights")
 def fetch_and_save_stock_insights(symbol, region, filename_prefix):
     """Busca informações/insights de uma ação usando yfinance e salva em JSON.
     Para B3, o symbol deve ser no formato XXXXN.SA (ex: PETR4.SA).
@@ -52,14 +109,12 @@ def fetch_and_save_stock_insights(symbol, region, filename_prefix):
     try:
         ticker_complete = symbol
         print(f"Buscando insights para {ticker_complete} com yfinance...")
-        ticker_obj = yf.Ticker(ticker_complete)
-        insights_data = ticker_obj.info
+        insights_data = provedor_dados.fetch_info(ticker_complete)
         
         if not insights_data:
             print(f"Não foi possível obter insights para {ticker_complete} com yfinance (ticker.info retornou vazio).")
-            # Tentar buscar um pouco de histórico para ver se o ticker é válido
-            hist_check = ticker_obj.history(period="1d")
-            if hist_check.empty:
+            # Verifica se o ticker é válido (usa o histórico em cache, se houver, antes de ir à rede)
+            if not provedor_dados.symbol_has_data(ticker_complete):
                 print(f"Ticker {ticker_complete} parece inválido ou não há dados disponíveis no yfinance.")
             return False # Indica falha
 
@@ -68,18 +123,30 @@ def fetch_and_save_stock_insights(symbol, region, filename_prefix):
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(insights_data, f, indent=4, ensure_ascii=False)
         print(f"Insights de {ticker_complete} salvos em {filepath}")
+        # Histórico point-in-time: o JSON acima é sobrescrito, o histórico guarda só os campos que mudaram
+        fundamentos_pit.DATA_DIR = DATA_DIR
+        n_changed = fundamentos_pit.append_snapshot(ticker_complete, insights_data)
+        print(f"Histórico de fundamentos de {ticker_complete}: {n_changed} campos novos ou alterados")
         return True # Indica sucesso
         
     except Exception as e:
         print(f"Erro ao buscar insights para {symbol} com yfinance: {e}")
         return False # Indica falha
 
+@instrumentacao.instrumentado("coleta.macro")
 def fetch_and_save_macro_data(indicator_code, country_code, country_name_display):
-    """Placeholder para coleta de dados macroeconômicos. Requer uma fonte de dados pública e biblioteca apropriada."""
+    """Coleta (incrementalmente) uma série macroeconômica do catálogo de `dados_macro` e a salva no cache local.
+    `indicator_code` é a chave do catálogo (ex: "SELIC", "IPCA", "FEDFUNDS") e `country_code` o país ("BR", "US").
+    Retorna a série completa (pd.Series) ou None em caso de falha.
+    """
     print(f"\n--- Coleta de Dados Macroeconômicos para {country_name_display} ({indicator_code}) ---")
-    print("AVISO: A coleta de dados macroeconômicos não está implementada nesta versão.")
-    print("Para implementar, seria necessário integrar uma biblioteca como 'wbdata' para o World Bank ou similar.")
-    return None
+    dados_macro.DATA_DIR = DATA_DIR
+    series, n_new = dados_macro.update_macro_series(country_code, indicator_code)
+    if series is None or series.empty:
+        print(f"Não foi possível obter a série {indicator_code} para {country_name_display}.")
+        return None
+    print(f"Série {indicator_code} ({country_name_display}): {n_new} novas observações, última em {series.index.max().date()}.")
+    return series
 
 if __name__ == "__main__":
     # Teste para Ação Brasileira (B3)
@@ -106,8 +173,9 @@ if __name__ == "__main__":
     success_insights_invalid = fetch_and_save_stock_insights(symbol="XYZW.SA", region="BR", filename_prefix="br")
     print(f"Coleta XYZW.SA: Gráfico {'Sucesso' if success_chart_invalid else 'Falha'}, Insights {'Sucesso' if success_insights_invalid else 'Falha'}\n")
 
-    # Dados Macroeconômicos (Chamada de exemplo, mas a função é placeholder)
-    fetch_and_save_macro_data(indicator_code="NY.GDP.MKTP.CD", country_code="BRA", country_name_display="Brazil_GDP")
+    # Dados Macroeconômicos (BCB SGS / FRED; defina QUANTFUND_MACRO_PROVIDER=fixture para rodar offline)
+    fetch_and_save_macro_data(indicator_code="SELIC", country_code="BR", country_name_display="Brasil_Selic")
+    fetch_and_save_macro_data(indicator_code="FEDFUNDS", country_code="US", country_name_display="EUA_FedFunds")
 
-    print("\nColeta de dados (com yfinance e placeholder para macro) concluída.")
+    print("\nColeta de dados (yfinance e macro) concluída.")
 
@@ -0,0 +1,273 @@
+"""Correlações móveis do universo, atualizadas de forma incremental, e consultas sobre elas.
+
+Para cada janela (ex: 21, 63 e 252 pregões) é mantido o estado das somas da janela sobre os pares com
+dados nos dois ativos (contagem, Σx, Σx² e Σxy, matrizes N x N). Uma barra nova soma o produto externo
+do seu retorno e subtrai o da barra que sai da janela: O(N²) por pregão em vez de O(W·N²) recalculando
+a janela inteira. A cada `RECALCULO_A_CADA` barras as somas são refeitas do zero (sem deriva numérica).
+
+O estado fica em `correlacao_cache/` e guarda também um índice com os k ativos mais (e menos)
+correlacionados a cada ticker, usado pelas consultas "mais correlacionados a X" sem recalcular nada.
+"""
+import os
+import numpy as np
+import pandas as pd
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import squareform
+import calendario_mercado
+import instrumentacao
+import universo
+
+DATA_DIR = "."
+CACHE_SUBDIR = "correlacao_cache"
+JANELAS_PADRAO = (21, 63, 252)
+MIN_OBSERVACOES = 0.8  # fração mínima da janela com dados nos dois ativos
+RECALCULO_A_CADA = 252
+TOP_K = 20
+
+# --- Agrupamento ---
+
+def correlation_distance(corr):
+    """Distância de correlação sqrt((1 - ρ) / 2); pares sem correlação definida ficam com ρ = 0."""
+    corr = np.nan_to_num(np.clip(np.asarray(corr, dtype=np.float64), -1.0, 1.0), nan=0.0)
+    dist = np.sqrt(np.clip((1.0 - corr) / 2.0, 0.0, None))
+    np.fill_diagonal(dist, 0.0)
+    return dist
+
+def cluster_order(corr, method="average"):
+    """Ordem das folhas do agrupamento hierárquico pela distância de correlação (ordem quase-diagonal)."""
+    if len(corr) < 3:
+        return np.arange(len(corr))
+    dist = correlation_distance(corr)
+    link = hierarchy.linkage(squareform((dist + dist.T) / 2.0, checks=False), method=method)
+    return hierarchy.leaves_list(link)
+
+# --- Estado incremental ---
+
+class CorrelacaoMovel:
+    """Correlação de Pearson numa janela móvel de `janela` barras, com pares de dados completos.
+
+    `buffer` guarda os retornos da janela em ordem cronológica (NaN onde não há dado); as somas
+    são atualizadas a cada barra nova.
+    """
+
+    def __init__(self, tickers, janela):
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.janela = janela
+        self.buffer = np.full((0, n), np.nan)
+        self.ultima_data = None
+        self.barras_desde_recalculo = 0
+        self.cnt = np.zeros((n, n))
+        self.sx = np.zeros((n, n))   # sx[i, j] = Σ x_i nas barras com dados em i e j
+        self.sxx = np.zeros((n, n))
+        self.sxy = np.zeros((n, n))
+
+    def _recalcular(self):
+        """Somas exatas a partir do buffer (produtos matriciais sobre a janela inteira)."""
+        mask = np.isfinite(self.buffer).astype(np.float64)
+        x = np.where(mask > 0, self.buffer, 0.0)
+        self.cnt = mask.T @ mask
+        self.sx = x.T @ mask
+        self.sxx = (x * x).T @ mask
+        self.sxy = x.T @ x
+        self.barras_desde_recalculo = 0
+
+    def _acumular(self, row, sinal):
+        mask = np.isfinite(row).astype(np.float64)
+        x = np.where(mask > 0, row, 0.0)
+        self.cnt += sinal * np.outer(mask, mask)
+        self.sx += sinal * np.outer(x, mask)
+        self.sxx += sinal * np.outer(x * x, mask)
+        self.sxy += sinal * np.outer(x, x)
+
+    def adicionar(self, retornos):
+        """Incorpora as barras de `retornos` (DataFrame datas x tickers) posteriores à última já vista."""
+        retornos = retornos.reindex(columns=self.tickers)
+        if self.ultima_data is not None:
+            retornos = retornos[retornos.index > self.ultima_data]
+        if retornos.empty:
+            return 0
+        novas = retornos.to_numpy(dtype=np.float64)
+        if len(novas) >= self.janela or self.barras_desde_recalculo + len(novas) >= RECALCULO_A_CADA:
+            # Muitas barras de uma vez (ou hora de limpar a deriva): refaz a janela inteira
+            self.buffer = np.vstack([self.buffer, novas])[-self.janela:]
+            self._recalcular()
+        else:
+            for row in novas:
+                if len(self.buffer) == self.janela:
+                    self._acumular(self.buffer[0], -1.0)
+                    self.buffer = self.buffer[1:]
+                self._acumular(row, 1.0)
+                self.buffer = np.vstack([self.buffer, row[None, :]])
+            self.barras_desde_recalculo += len(novas)
+        self.ultima_data = retornos.index[-1]
+        return len(novas)
+
+    def matriz(self, min_observacoes=MIN_OBSERVACOES):
+        """Matriz de correlação atual (NaN para pares com menos de `min_observacoes` x janela barras em comum)."""
+        cnt = self.cnt
+        cov = cnt * self.sxy - self.sx * self.sx.T
+        var_i = cnt * self.sxx - self.sx ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.sqrt(var_i * var_i.T)
+        corr[(cnt < max(min_observacoes * self.janela, 3)) | ~np.isfinite(corr)] = np.nan
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, np.where(np.diag(cnt) >= max(min_observacoes * self.janela, 3), 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.tickers, columns=self.tickers)
+
+    # Persistência
+
+    def salvar(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, tickers=np.array(self.tickers), janela=self.janela, buffer=self.buffer,
+                 ultima_data=np.datetime64(self.ultima_data) if self.ultima_data is not None else np.datetime64("NaT"),
+                 barras_desde_recalculo=self.barras_desde_recalculo,
+                 cnt=self.cnt, sx=self.sx, sxx=self.sxx, sxy=self.sxy)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def carregar(cls, path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            estado = cls(data["tickers"].tolist(), int(data["janela"]))
+            estado.buffer = data["buffer"]
+            ultima = data["ultima_data"][()]
+            estado.ultima_data = None if np.isnat(ultima) else pd.Timestamp(ultima)
+            estado.barras_desde_recalculo = int(data["barras_desde_recalculo"])
+            estado.cnt, estado.sx, estado.sxx, estado.sxy = data["cnt"], data["sx"], data["sxx"], data["sxy"]
+        return estado
+
+# --- Índice de vizinhos ---
+
+def top_k_index(corr, k=TOP_K):
+    """Para cada ticker, os k mais e os k menos correlacionados (formato longo).
+
+    Colunas: ticker, vizinho, correlacao, posicao (1 = mais correlacionado; -1 = menos correlacionado).
+    """
+    values = corr.to_numpy(dtype=np.float64, copy=True)
+    n = len(values)
+    if n < 2:
+        return pd.DataFrame(columns=["ticker", "vizinho", "correlacao", "posicao"])
+    np.fill_diagonal(values, np.nan)
+    k = min(k, n - 1)
+    tickers = np.asarray(corr.index)
+    frames = []
+    for sinal in (1, -1):
+        ranked = np.where(np.isnan(values), -np.inf, sinal * values)
+        top = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+        top_values = np.take_along_axis(ranked, top, axis=1)
+        order = np.argsort(-top_values, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        rows = np.repeat(np.arange(n), k)
+        frames.append(pd.DataFrame({
+            "ticker": tickers[rows], "vizinho": tickers[top.ravel()],
+            "correlacao": values[rows, top.ravel()], "posicao": sinal * np.tile(np.arange(1, k + 1), n),
+        }))
+    index = pd.concat(frames, ignore_index=True)
+    return index[index["correlacao"].notna()].reset_index(drop=True)
+
+# --- Universo ---
+
+def _state_path(janela):
+    return os.path.join(DATA_DIR, CACHE_SUBDIR, f"correlacao_{janela}.npz")
+
+def _index_path(janela):
+    return os.path.join(DATA_DIR, CACHE_SUBDIR, f"vizinhos_{janela}.parquet")
+
+def returns_panel(ticker_stems):
+    """Retornos diários (calendário comum às bolsas) dos arquivos _chart; NaN antes do início de cada série."""
+    calendario_mercado.DATA_DIR = DATA_DIR
+    prices = calendario_mercado.load_aligned_prices(ticker_stems, column="Adj Close", how="intersection",
+                                                    file_suffix="chart")
+    return prices.pct_change(fill_method=None).iloc[1:]
+
+@instrumentacao.instrumentado("correlacao.atualizar")
+def atualizar(ticker_stems=None, janelas=JANELAS_PADRAO, k=TOP_K):
+    """Atualiza o estado de cada janela com as barras novas e regrava o índice de vizinhos.
+
+    O estado é reaproveitado quando o conjunto de tickers é o mesmo; caso contrário (ativo novo ou
+    removido), a janela é reconstruída. Retorna {janela: CorrelacaoMovel}.
+    """
+    if ticker_stems is None:
+        universo.DATA_DIR = DATA_DIR
+        ticker_stems = universo.stems_with("chart")
+    returns = returns_panel(ticker_stems)
+    tickers = list(returns.columns)
+    estados = {}
+    for janela in janelas:
+        estado = CorrelacaoMovel.carregar(_state_path(janela))
+        reaproveitado = estado is not None and estado.tickers == tickers
+        if not reaproveitado:
+            estado = CorrelacaoMovel(tickers, janela)
+        novas = estado.adicionar(returns)
+        instrumentacao.anotar(**{f"barras_novas_{janela}": novas, f"reaproveitado_{janela}": reaproveitado})
+        if novas or not os.path.exists(_index_path(janela)):
+            estado.salvar(_state_path(janela))
+            top_k_index(estado.matriz(), k).to_parquet(_index_path(janela), index=False)
+        estados[janela] = estado
+    return estados
+
+def load_state(janela):
+    """Estado salvo da janela (None se `atualizar` ainda não rodou)."""
+    return CorrelacaoMovel.carregar(_state_path(janela))
+
+def load_index(janela):
+    """Índice de vizinhos pré-calculado da janela (None se `atualizar` ainda não rodou)."""
+    path = _index_path(janela)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+def mais_correlacionados(ticker, janela=63, k=10, negativos=False):
+    """Os k ativos mais (ou, com `negativos=True`, menos) correlacionados a `ticker`, a partir do índice."""
+    index = load_index(janela)
+    if index is None:
+        print(f"Índice de correlação da janela {janela} não encontrado. Rode `atualizar` primeiro.")
+        return None
+    selected = index[(index["ticker"] == ticker) & ((index["posicao"] < 0) if negativos else (index["posicao"] > 0))]
+    return selected.sort_values("posicao", key=np.abs).head(k)[["vizinho", "correlacao"]].reset_index(drop=True)
+
+def clustered_matrix(estado, max_ativos=None):
+    """Matriz de correlação atual reordenada pelo agrupamento hierárquico (para o mapa de calor).
+
+    Com `max_ativos`, mantém os ativos com mais pares válidos (a matriz inteira não cabe na tela).
+    """
+    corr = estado.matriz()
+    valid = corr.notna().sum(axis=1)
+    corr = corr.loc[valid > 1, valid > 1]
+    if max_ativos is not None and len(corr) > max_ativos:
+        keep = corr.notna().sum(axis=1).sort_values(ascending=False, kind="stable").index[:max_ativos]
+        corr = corr.loc[keep, keep]
+    order = cluster_order(corr.to_numpy())
+    return corr.iloc[order, order]
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    rng = np.random.default_rng(0)
+    n_ativos, n_barras, janela = 300, 1500, 63
+    fatores = rng.normal(0, 0.01, (n_barras, 5))
+    cargas = rng.normal(0, 1, (5, n_ativos))
+    dados = pd.DataFrame(fatores @ cargas + rng.normal(0, 0.01, (n_barras, n_ativos)),
+                         index=pd.bdate_range("2019-01-01", periods=n_barras), columns=[f"A{i}" for i in range(n_ativos)])
+    dados.iloc[rng.random(dados.shape) < 0.02] = np.nan
+
+    estado = CorrelacaoMovel(list(dados.columns), janela)
+    estado.adicionar(dados.iloc[:-20])
+    inicio = time.perf_counter()
+    for i in range(20, 0, -1):
+        estado.adicionar(dados.iloc[:len(dados) - i + 1])
+    incremental = (time.perf_counter() - inicio) / 20
+    inicio = time.perf_counter()
+    exata = dados.iloc[-janela:].corr(min_periods=int(MIN_OBSERVACOES * janela))
+    completa = time.perf_counter() - inicio
+    erro = np.nanmax(np.abs(estado.matriz().to_numpy() - exata.to_numpy()))
+    print(f"{n_ativos} ativos, janela {janela}: {1000 * incremental:.2f} ms por barra incremental; "
+          f"recalcular a janela: {1000 * completa:.2f} ms; erro máximo vs pandas: {erro:.2e}")
+
+    path = os.path.join(tempfile.mkdtemp(), "estado.npz")
+    estado.salvar(path)
+    print(f"Estado recarregado igual: {np.allclose(CorrelacaoMovel.carregar(path).sxy, estado.sxy)}")
+    indice = top_k_index(estado.matriz(), k=5)
+    print(indice[indice["ticker"] == "A0"])
+    print(f"Ordem agrupada (10 primeiros): {list(clustered_matrix(estado, max_ativos=50).index[:10])}")
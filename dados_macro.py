@@ -0,0 +1,285 @@
+import os
+import numpy as np
+import pandas as pd
+import provedor_dados
+import instrumentacao
+
+# Define o diretório de dados (o app sobrescreve, como nos demais módulos)
+DATA_DIR = "."
+MACRO_CACHE_SUBDIR = "macro_cache"
+# Fixtures locais (dados aproximados, apenas para uso offline/testes) no mesmo formato do cache
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures_macro")
+
+# Quando definido (ex: "fixture"), força todas as séries a usarem este provedor.
+# Útil para rodar o app e os scripts sem rede.
+PROVIDER_OVERRIDE = os.environ.get("QUANTFUND_MACRO_PROVIDER") or None
+
+FRED_API_KEY = os.environ.get("FRED_API_KEY")
+HTTP_TIMEOUT = 30
+
+# Catálogo de indicadores por (país, indicador).
+# direcao: +1 se alta do indicador é positiva para ativos de risco do país, -1 se negativa.
+# transformacao: como a série bruta vira o sinal analisado ("nivel", "var_12m" ou "acum_12m").
+MACRO_INDICATORS = {
+    ("BR", "SELIC"): {"provider": "bcb_sgs", "code": "432", "direcao": -1, "transformacao": "nivel",
+                      "descricao": "Meta Selic (% a.a.)"},
+    ("BR", "IPCA"): {"provider": "bcb_sgs", "code": "433", "direcao": -1, "transformacao": "acum_12m",
+                     "descricao": "IPCA (variação mensal %), acumulado em 12 meses"},
+    ("BR", "IBC_BR"): {"provider": "bcb_sgs", "code": "24363", "direcao": 1, "transformacao": "var_12m",
+                       "descricao": "IBC-Br (proxy mensal do PIB)"},
+    ("BR", "USDBRL"): {"provider": "bcb_sgs", "code": "1", "direcao": -1, "transformacao": "var_12m",
+                       "descricao": "Dólar comercial (venda, R$/US$)"},
+    ("US", "FEDFUNDS"): {"provider": "fred", "code": "FEDFUNDS", "direcao": -1, "transformacao": "nivel",
+                         "descricao": "Federal Funds Effective Rate (%)"},
+    ("US", "CPI"): {"provider": "fred", "code": "CPIAUCSL", "direcao": -1, "transformacao": "var_12m",
+                    "descricao": "CPI All Urban Consumers"},
+    ("US", "UNRATE"): {"provider": "fred", "code": "UNRATE", "direcao": -1, "transformacao": "nivel",
+                       "descricao": "Taxa de desemprego (%)"},
+    ("US", "INDPRO"): {"provider": "fred", "code": "INDPRO", "direcao": 1, "transformacao": "var_12m",
+                       "descricao": "Produção industrial"},
+}
+
+# Parâmetros do cálculo de regime (em meses)
+REGIME_MOMENTUM_WINDOW = 6
+REGIME_VOL_WINDOW = 36
+REGIME_THRESHOLD = 0.25
+
+def _get_http_session():
+    """Sessão HTTP usada pelos provedores remotos (pool de conexões, cache com revalidação e record/replay)."""
+    return provedor_dados.get_http_session()
+
+def fetch_bcb_sgs(code, start_date=None, country=None, indicator=None):
+    """Busca uma série do Sistema Gerenciador de Séries Temporais (SGS) do Banco Central do Brasil."""
+    end_date = pd.Timestamp.today().normalize()
+    # O SGS limita consultas de séries diárias a janelas de 10 anos
+    if start_date is None:
+        start_date = end_date - pd.DateOffset(years=10) + pd.Timedelta(days=1)
+    url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{code}/dados"
+    params = {
+        "formato": "json",
+        "dataInicial": pd.Timestamp(start_date).strftime("%d/%m/%Y"),
+        "dataFinal": end_date.strftime("%d/%m/%Y"),
+    }
+    response = _get_http_session().get(url, params=params, timeout=HTTP_TIMEOUT)
+    if response.status_code == 404:
+        return pd.Series(dtype="float64")  # Sem observações no intervalo
+    response.raise_for_status()
+    data = response.json()
+    if not data:
+        return pd.Series(dtype="float64")
+    df = pd.DataFrame(data)
+    index = pd.to_datetime(df["data"], format="%d/%m/%Y")
+    values = pd.to_numeric(df["valor"], errors="coerce")
+    return pd.Series(values.to_numpy(), index=pd.DatetimeIndex(index, name="Timestamp"), name="valor").dropna()
+
+def fetch_fred(code, start_date=None, country=None, indicator=None):
+    """Busca uma série do FRED (St. Louis Fed).
+
+    Usa a API oficial quando FRED_API_KEY está definida; caso contrário, o CSV público do fredgraph.
+    """
+    start = pd.Timestamp(start_date).strftime("%Y-%m-%d") if start_date is not None else "1990-01-01"
+    session = _get_http_session()
+    if FRED_API_KEY:
+        params = {"series_id": code, "api_key": FRED_API_KEY, "file_type": "json", "observation_start": start}
+        response = session.get("https://api.stlouisfed.org/fred/series/observations", params=params, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        observations = response.json().get("observations", [])
+        if not observations:
+            return pd.Series(dtype="float64")
+        df = pd.DataFrame(observations)
+        index = pd.to_datetime(df["date"])
+        values = pd.to_numeric(df["value"], errors="coerce")  # FRED usa "." para ausente
+    else:
+        response = session.get("https://fred.stlouisfed.org/graph/fredgraph.csv",
+                               params={"id": code, "cosd": start}, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        from io import StringIO
+        df = pd.read_csv(StringIO(response.text))
+        if df.empty:
+            return pd.Series(dtype="float64")
+        index = pd.to_datetime(df.iloc[:, 0])
+        values = pd.to_numeric(df.iloc[:, 1], errors="coerce")
+    series = pd.Series(values.to_numpy(), index=pd.DatetimeIndex(index, name="Timestamp"), name="valor").dropna()
+    return series[series.index >= pd.Timestamp(start)]
+
+def fetch_fixture(code, start_date=None, country=None, indicator=None):
+    """Provedor offline: lê a série de um arquivo local em FIXTURES_DIR ({PAIS}_{INDICADOR}.csv)."""
+    filepath = os.path.join(FIXTURES_DIR, f"{country}_{indicator}.csv")
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"Fixture macro não encontrada: {filepath}")
+    series = pd.read_csv(filepath, index_col="Timestamp", parse_dates=True)["valor"]
+    if start_date is not None:
+        series = series[series.index >= pd.Timestamp(start_date)]
+    return series
+
+# Registro de provedores: nome -> função(code, start_date, country, indicator) -> pd.Series
+MACRO_PROVIDERS = {
+    "bcb_sgs": fetch_bcb_sgs,
+    "fred": fetch_fred,
+    "fixture": fetch_fixture,
+}
+
+def register_macro_provider(name, fetch_function):
+    """Registra (ou substitui) um provedor de séries macroeconômicas."""
+    MACRO_PROVIDERS[name] = fetch_function
+
+def _cache_filepath(country, indicator):
+    cache_dir = os.path.join(DATA_DIR, MACRO_CACHE_SUBDIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{country.upper()}_{indicator.upper()}.csv")
+
+def load_cached_series(country, indicator):
+    """Carrega a série do cache local (ou None se ainda não foi coletada)."""
+    filepath = _cache_filepath(country, indicator)
+    if not os.path.exists(filepath):
+        return None
+    try:
+        return pd.read_csv(filepath, index_col="Timestamp", parse_dates=True)["valor"]
+    except Exception as e:
+        print(f"Erro ao carregar série macro do cache {filepath}: {e}")
+        return None
+
+@instrumentacao.instrumentado("macro.atualizar_serie")
+def update_macro_series(country, indicator, provider=None):
+    """Atualiza incrementalmente a série no cache local a partir da última observação.
+
+    Retorna (serie_completa, n_novas_observacoes) ou (None, 0) em caso de falha.
+    """
+    country = country.upper()
+    indicator = indicator.upper()
+    spec = MACRO_INDICATORS.get((country, indicator))
+    if spec is None:
+        print(f"Indicador macro '{indicator}' para o país '{country}' não está no catálogo.")
+        return None, 0
+
+    provider_name = provider or PROVIDER_OVERRIDE or spec["provider"]
+    fetch_function = MACRO_PROVIDERS.get(provider_name)
+    if fetch_function is None:
+        print(f"Provedor macro '{provider_name}' não registrado.")
+        return None, 0
+
+    cached = load_cached_series(country, indicator)
+    start_date = None
+    if cached is not None and not cached.empty:
+        start_date = cached.index.max() + pd.Timedelta(days=1)
+        if start_date > pd.Timestamp.today().normalize():
+            instrumentacao.anotar(cache_hit=True, linhas_novas=0)
+            return cached, 0
+    instrumentacao.anotar(indicador=f"{country}/{indicator}", provedor=provider_name, cache_hit=False)
+
+    try:
+        new_data = fetch_function(spec["code"], start_date, country=country, indicator=indicator)
+    except Exception as e:
+        print(f"Erro ao buscar {country}/{indicator} via '{provider_name}': {e}")
+        return cached, 0
+
+    if new_data is None or new_data.empty:
+        return cached, 0
+
+    new_data = new_data.astype("float64")
+    if cached is not None and not cached.empty:
+        new_data = new_data[new_data.index > cached.index.max()]
+        combined = pd.concat([cached, new_data])
+    else:
+        combined = new_data
+    combined = combined[~combined.index.duplicated(keep="last")].sort_index()
+    combined.index.name = "Timestamp"
+    combined.name = "valor"
+    combined.to_frame().to_csv(_cache_filepath(country, indicator))
+    instrumentacao.anotar(linhas_novas=len(new_data))
+    print(f"Série macro {country}/{indicator}: {len(new_data)} novas observações (total {len(combined)}).")
+    return combined, len(new_data)
+
+def update_all_macro_series(countries=None, provider=None):
+    """Atualiza todas as séries do catálogo (opcionalmente filtradas por país). Retorna {(pais, ind): n_novas}."""
+    summary = {}
+    for (country, indicator) in MACRO_INDICATORS:
+        if countries and country not in countries:
+            continue
+        _, n_new = update_macro_series(country, indicator, provider=provider)
+        summary[(country, indicator)] = n_new
+    return summary
+
+def load_macro_panel(keys=None):
+    """Monta um painel mensal (fim de mês) com colunas MultiIndex (país, indicador) a partir do cache."""
+    keys = keys or list(MACRO_INDICATORS.keys())
+    columns = {}
+    for key in keys:
+        series = load_cached_series(*key)
+        if series is not None and not series.empty:
+            # Séries diárias (ex: câmbio) viram a última observação de cada mês
+            columns[key] = series.resample("ME").last()
+    if not columns:
+        return pd.DataFrame()
+    panel = pd.DataFrame(columns)
+    panel.columns = pd.MultiIndex.from_tuples(panel.columns, names=["pais", "indicador"])
+    return panel.ffill(limit=2)
+
+def _apply_transformations(panel):
+    """Aplica a transformação do catálogo a cada coluna, em bloco por tipo de transformação."""
+    transformed = pd.DataFrame(index=panel.index, columns=panel.columns, dtype="float64")
+    transforms = pd.Series({col: MACRO_INDICATORS[col]["transformacao"] for col in panel.columns})
+    for transform, cols in transforms.groupby(transforms).groups.items():
+        block = panel[list(cols)]
+        if transform == "var_12m":
+            block = block.pct_change(12, fill_method=None) * 100
+        elif transform == "acum_12m":
+            block = ((1 + block / 100).rolling(12).apply(np.prod, raw=True) - 1) * 100
+        transformed[list(cols)] = block
+    return transformed
+
+def compute_macro_regimes(panel, momentum_window=REGIME_MOMENTUM_WINDOW, vol_window=REGIME_VOL_WINDOW):
+    """Calcula os scores de regime macro para todas as séries e datas de uma vez.
+
+    Para cada indicador: variação do sinal transformado em `momentum_window` meses, normalizada pela
+    volatilidade histórica dessa variação e multiplicada pela direção do catálogo (tanh para limitar em [-1, 1]).
+    O score do país é a média dos scores de seus indicadores.
+    Retorna (scores_por_indicador, scores_por_pais), ambos DataFrames indexados por data.
+    """
+    if panel is None or panel.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    transformed = _apply_transformations(panel)
+    change = transformed.diff(momentum_window)
+    scale = change.rolling(vol_window, min_periods=12).std()
+    direction = np.array([MACRO_INDICATORS[col]["direcao"] for col in panel.columns], dtype="float64")
+    indicator_scores = np.tanh(change / scale.replace(0, np.nan)) * direction
+    country_scores = indicator_scores.T.groupby(level="pais").mean().T
+    return indicator_scores, country_scores
+
+def classify_regime(score, threshold=REGIME_THRESHOLD):
+    """Converte o score numérico no rótulo usado pelo módulo de recomendações."""
+    if score is None or pd.isna(score):
+        return "Neutro"
+    if score >= threshold:
+        return "Positivo"
+    if score <= -threshold:
+        return "Negativo"
+    return "Neutro"
+
+def latest_country_regimes(atualizar=False, provider=None):
+    """Retorna {pais: {"score": float, "regime": str, "data": str}} com base no cache (atualizando se pedido)."""
+    if atualizar:
+        update_all_macro_series(provider=provider)
+    _, country_scores = compute_macro_regimes(load_macro_panel())
+    regimes = {}
+    for country in country_scores.columns:
+        series = country_scores[country].dropna()
+        if series.empty:
+            continue
+        score = float(series.iloc[-1])
+        regimes[country] = {"score": round(score, 4), "regime": classify_regime(score), "data": series.index[-1].strftime("%Y-%m-%d")}
+    return regimes
+
+if __name__ == "__main__":
+    # Execução offline com as fixtures locais
+    PROVIDER_OVERRIDE = "fixture"
+    print("--- Atualizando séries macro (fixtures locais) ---")
+    print(update_all_macro_series())
+    print("\n--- Segunda atualização (incremental, sem novas observações esperadas) ---")
+    print(update_all_macro_series())
+
+    indicator_scores, country_scores = compute_macro_regimes(load_macro_panel())
+    print("\nScores por país (últimos 6 meses):")
+    print(country_scores.tail(6).round(3))
+    print("\nRegimes atuais:")
+    print(latest_country_regimes())
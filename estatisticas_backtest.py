@@ -0,0 +1,242 @@
+"""Significância estatística de backtests: intervalos de confiança por bootstrap, Sharpe deflacionado e PBO.
+
+Todas as funções recebem um DataFrame de retornos por período (datas x configurações) e são vetorizadas
+sobre as configurações, de modo que uma busca em grade inteira é avaliada de uma vez:
+
+- `bootstrap_metrics`: IC de Sharpe, CAGR e drawdown máximo por bootstrap em blocos. Sharpe e CAGR
+  dependem só das contagens de cada dia na reamostragem, então saem de produtos de matrizes
+  (reamostragens x dias) @ (dias x configurações), sem materializar as séries reamostradas;
+- `deflated_sharpe_ratio`: Sharpe da melhor configuração descontado pelo número de tentativas
+  (Bailey & López de Prado, 2014);
+- `pbo_cscv`: probabilidade de overfitting do backtest por validação cruzada combinatória simétrica.
+"""
+import itertools
+import math
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+import estrategias
+import instrumentacao
+
+PERIODS_PER_YEAR = 252
+EULER_GAMMA = 0.5772156649015329
+DRAWDOWN_MEMORY_BUDGET = 256 * 1024 ** 2   # bytes por lote de séries reamostradas no cálculo do drawdown
+
+def _as_frame(returns):
+    if isinstance(returns, pd.Series):
+        return returns.to_frame(returns.name or "estrategia")
+    return returns
+
+def strategy_returns(weights, prices):
+    """Retornos diários de uma estratégia: o peso decidido no fechamento de t vale para o retorno de t a t+1
+    (mesma convenção do rebalanceamento do bt)."""
+    asset_returns = prices.pct_change(fill_method=None)
+    return (weights.shift(1) * asset_returns).fillna(0.0)
+
+@instrumentacao.instrumentado("estatisticas.grade")
+def grid_returns(strategy, ticker, prices, param_grid, full_data_df=None):
+    """Retornos diários de todas as combinações válidas de parâmetros (datas x configurações).
+
+    `param_grid` = {parametro: [valores]}; parâmetros omitidos usam o padrão da estratégia e combinações
+    inválidas (ex: janela curta >= longa) são descartadas. As colunas são rótulos "param=valor,...";
+    o dict de parâmetros de cada coluna fica em `df.attrs["parametros"]`. Os indicadores vêm do cache de sinais.
+    """
+    names = list(param_grid)
+    columns = {}
+    parametros = {}
+    for values in itertools.product(*(param_grid[n] for n in names)):
+        try:
+            params = estrategias.resolve_params(strategy, **dict(zip(names, values)))
+        except ValueError:
+            continue
+        label = ",".join(f"{n}={v}" for n, v in params.items())
+        weights = estrategias.target_weights(strategy, ticker, prices, full_data_df=full_data_df, **params)
+        columns[label] = strategy_returns(weights, prices)
+        parametros[label] = params
+    returns = pd.DataFrame(columns, index=prices.index).iloc[1:]
+    returns.attrs["parametros"] = parametros
+    instrumentacao.anotar(configuracoes=len(columns))
+    return returns
+
+def sharpe_ratio(returns, periods=PERIODS_PER_YEAR):
+    """Sharpe anualizado de cada coluna (taxa livre de risco zero, como no bt)."""
+    values = _as_frame(returns).to_numpy(dtype=np.float64)
+    std = values.std(axis=0, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(std > 0, values.mean(axis=0) / std * np.sqrt(periods), np.nan)
+
+def _max_drawdown(log_returns, axis=0):
+    """Drawdown máximo (negativo) ao longo de `axis`, a partir dos log-retornos (patrimônio inicial = 1)."""
+    growth = np.cumsum(log_returns, axis=axis)
+    peak = np.maximum.accumulate(np.maximum(growth, 0.0), axis=axis)
+    return np.expm1((growth - peak).min(axis=axis))
+
+def _bootstrap_indices(n_obs, n_boot, block_size, rng):
+    """Índices (n_boot x n_obs) do bootstrap por blocos móveis."""
+    n_blocks = -(-n_obs // block_size)
+    starts = rng.integers(0, n_obs - block_size + 1, size=(n_boot, n_blocks))
+    return (starts[:, :, None] + np.arange(block_size)).reshape(n_boot, -1)[:, :n_obs]
+
+@instrumentacao.instrumentado("estatisticas.bootstrap")
+def bootstrap_metrics(returns, n_boot=1000, tamanho_bloco=5, nivel=0.95, seed=0, periods=PERIODS_PER_YEAR,
+                      drawdown=True, n_boot_drawdown=200, drawdown_top=25):
+    """Estimativas pontuais e intervalos de confiança (bootstrap por blocos) de Sharpe, CAGR e drawdown máximo.
+
+    Retorna DataFrame (configurações x métricas) com as colunas sharpe, cagr, max_drawdown e, para cada uma,
+    `_ic_inf`/`_ic_sup`. O drawdown depende da ordem dos dias (não sai das contagens), então seu IC usa
+    `n_boot_drawdown` reamostragens em lotes limitados por DRAWDOWN_MEMORY_BUDGET e só é calculado para as
+    `drawdown_top` configurações de maior Sharpe (None = todas); as demais ficam com NaN.
+    """
+    frame = _as_frame(returns)
+    values = np.nan_to_num(frame.to_numpy(dtype=np.float64))
+    n_obs, n_series = values.shape
+    rng = np.random.default_rng(seed)
+    block_size = max(1, min(int(tamanho_bloco), n_obs))
+    alpha = (1.0 - nivel) / 2.0
+    log_values = np.log1p(values)
+
+    indices = _bootstrap_indices(n_obs, n_boot, block_size, rng)
+    # Contagem de cada dia em cada reamostragem: Sharpe e CAGR saem de produtos de matrizes
+    counts = np.bincount((indices + np.arange(n_boot)[:, None] * n_obs).ravel(), minlength=n_boot * n_obs)
+    counts = counts.reshape(n_boot, n_obs).astype(np.float64)
+    mean = counts @ values / n_obs
+    second = counts @ (values * values) / n_obs
+    std = np.sqrt(np.maximum(second - mean * mean, 0.0) * n_obs / (n_obs - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        boot_sharpe = np.where(std > 0, mean / std * np.sqrt(periods), np.nan)
+    boot_cagr = np.expm1(counts @ log_values * periods / n_obs)
+
+    result = pd.DataFrame(index=frame.columns)
+    result["sharpe"] = sharpe_ratio(frame, periods)
+    result["sharpe_ic_inf"], result["sharpe_ic_sup"] = np.nanquantile(boot_sharpe, [alpha, 1 - alpha], axis=0)
+    result["cagr"] = np.expm1(log_values.sum(axis=0) * periods / n_obs)
+    result["cagr_ic_inf"], result["cagr_ic_sup"] = np.quantile(boot_cagr, [alpha, 1 - alpha], axis=0)
+
+    if drawdown:
+        result["max_drawdown"] = _max_drawdown(log_values, axis=0)
+        columns = np.arange(n_series)
+        if drawdown_top is not None and drawdown_top < n_series:
+            columns = np.sort(np.argsort(-np.nan_to_num(result["sharpe"].to_numpy(), nan=-np.inf))[:drawdown_top])
+        selected = log_values[:, columns]
+        n_dd = min(n_boot_drawdown, n_boot)
+        per_sample = max(1, DRAWDOWN_MEMORY_BUDGET // (n_obs * max(len(columns), 1) * 8))
+        boot_dd = np.empty((n_dd, len(columns)))
+        for start in range(0, n_dd, per_sample):
+            stop = min(start + per_sample, n_dd)
+            # (lote, dias, configurações): a ordem dos dias reamostrados importa para o drawdown
+            boot_dd[start:stop] = _max_drawdown(selected[indices[start:stop]], axis=1)
+        for column, q in (("max_drawdown_ic_inf", alpha), ("max_drawdown_ic_sup", 1 - alpha)):
+            result[column] = np.nan
+            result.iloc[columns, result.columns.get_loc(column)] = np.quantile(boot_dd, q, axis=0)
+    instrumentacao.anotar(series=n_series, reamostragens=n_boot)
+    return result
+
+def probabilistic_sharpe_ratio(sharpe, sharpe_ref, n_obs, skew=0.0, kurtosis=3.0):
+    """Probabilidade de o Sharpe verdadeiro superar `sharpe_ref` (Sharpes por período, não anualizados)."""
+    denom = np.sqrt(np.maximum(1.0 - skew * sharpe + (kurtosis - 1.0) / 4.0 * sharpe ** 2, 1e-12))
+    return norm.cdf((sharpe - sharpe_ref) * np.sqrt(n_obs - 1) / denom)
+
+def expected_max_sharpe(n_trials, sharpe_variance):
+    """Sharpe máximo esperado entre `n_trials` tentativas sem habilidade (Sharpe verdadeiro zero)."""
+    if n_trials < 2:
+        return 0.0
+    return math.sqrt(sharpe_variance) * ((1 - EULER_GAMMA) * norm.ppf(1 - 1.0 / n_trials)
+                                         + EULER_GAMMA * norm.ppf(1 - 1.0 / (n_trials * math.e)))
+
+def deflated_sharpe_ratio(returns, n_trials=None, periods=PERIODS_PER_YEAR):
+    """Sharpe deflacionado da melhor configuração, considerando todas as testadas.
+
+    `n_trials` padrão = número de colunas; com configurações muito correlacionadas o número efetivo de
+    tentativas é menor e o teste fica conservador.
+    Retorna dict com a melhor configuração, seu Sharpe anualizado, o Sharpe máximo esperado ao acaso
+    (anualizado) e a probabilidade (DSR) de o Sharpe da melhor ser genuinamente positivo.
+    """
+    frame = _as_frame(returns)
+    values = np.nan_to_num(frame.to_numpy(dtype=np.float64))
+    n_obs = len(values)
+    std = values.std(axis=0, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_period = np.where(std > 0, values.mean(axis=0) / std, np.nan)
+    if np.isnan(per_period).all():
+        return None
+    best = int(np.nanargmax(per_period))
+    n_trials = n_trials or frame.shape[1]
+    sr0 = expected_max_sharpe(n_trials, float(np.nanvar(per_period, ddof=1)) if n_trials > 1 else 0.0)
+    series = pd.Series(values[:, best])
+    dsr = probabilistic_sharpe_ratio(per_period[best], sr0, n_obs, skew=float(series.skew()),
+                                     kurtosis=float(series.kurt()) + 3.0)
+    return {"melhor": frame.columns[best], "sharpe": float(per_period[best] * np.sqrt(periods)),
+            "sharpe_esperado_acaso": float(sr0 * np.sqrt(periods)), "n_tentativas": int(n_trials),
+            "dsr": float(dsr)}
+
+@instrumentacao.instrumentado("estatisticas.pbo")
+def pbo_cscv(returns, n_particoes=16, periods=PERIODS_PER_YEAR):
+    """Probabilidade de overfitting do backtest (CSCV, Bailey et al. 2015).
+
+    Divide as datas em `n_particoes` blocos; para cada combinação de metade dos blocos como amostra de
+    treino (C(16, 8) = 12.870 combinações), escolhe a configuração de maior Sharpe no treino e mede seu
+    posto relativo no teste. PBO = fração das combinações em que a escolhida fica abaixo da mediana.
+    As somas por bloco são pré-calculadas e cada combinação vira uma linha de um produto de matrizes.
+    """
+    frame = _as_frame(returns)
+    values = np.nan_to_num(frame.to_numpy(dtype=np.float64))
+    n_obs, n_series = values.shape
+    if n_series < 2:
+        return None
+    n_particoes = int(n_particoes) - int(n_particoes) % 2
+    if n_particoes < 2 or n_obs < 2 * n_particoes:
+        print("Histórico curto demais para o CSCV com esse número de partições.")
+        return None
+    bounds = np.linspace(0, n_obs, n_particoes + 1).astype(int)
+    sums = np.add.reduceat(values, bounds[:-1], axis=0)
+    squares = np.add.reduceat(values * values, bounds[:-1], axis=0)
+    sizes = np.diff(bounds).astype(np.float64)
+
+    combos = np.array(list(itertools.combinations(range(n_particoes), n_particoes // 2)))
+    train = np.zeros((len(combos), n_particoes))
+    train[np.arange(len(combos))[:, None], combos] = 1.0
+    test = 1.0 - train
+
+    def _sharpe(mask):
+        n = mask @ sizes
+        mean = (mask @ sums) / n[:, None]
+        var = ((mask @ squares) - n[:, None] * mean * mean) / (n[:, None] - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(var > 0, mean / np.sqrt(np.maximum(var, 0.0)), -np.inf)
+
+    sharpe_train = _sharpe(train)
+    sharpe_test = _sharpe(test)
+    chosen = np.argmax(sharpe_train, axis=1)
+    chosen_test = sharpe_test[np.arange(len(combos)), chosen]
+    # Posto relativo (0, 1) da configuração escolhida no teste; logit <= 0 = abaixo da mediana
+    rank = ((sharpe_test < chosen_test[:, None]).sum(axis=1) + 0.5 * ((sharpe_test == chosen_test[:, None]).sum(axis=1) - 1) + 1)
+    relative = rank / (n_series + 1)
+    logits = np.log(relative / (1 - relative))
+    return {"pbo": float((logits <= 0).mean()), "combinacoes": len(combos), "particoes": n_particoes,
+            "logit_mediano": float(np.median(logits)),
+            "degradacao": float(np.corrcoef(sharpe_train[np.arange(len(combos)), chosen], chosen_test)[0, 1])
+            if len(combos) > 2 and np.isfinite(chosen_test).all() else None}
+
+def analyze_grid(returns, n_boot=1000, tamanho_bloco=5, nivel=0.95, n_particoes=16, seed=0):
+    """Resumo estatístico de uma busca em grade: métricas com IC por configuração, DSR e PBO."""
+    with instrumentacao.medir_etapa("estatisticas.analise_grade", configuracoes=_as_frame(returns).shape[1]):
+        resumo = bootstrap_metrics(returns, n_boot=n_boot, tamanho_bloco=tamanho_bloco, nivel=nivel, seed=seed)
+        return {"resumo": resumo.sort_values("sharpe", ascending=False),
+                "dsr": deflated_sharpe_ratio(returns),
+                "pbo": pbo_cscv(returns, n_particoes=n_particoes)}
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range("2012-01-01", periods=3000)
+    prices = pd.Series(40 * np.exp(np.cumsum(rng.normal(0.0002, 0.018, len(dates)))), index=dates)
+    start = time.perf_counter()
+    grid = grid_returns("sma_crossover", "SINTETICO", prices,
+                        {"short_window": range(5, 105, 5), "long_window": range(20, 420, 20)})
+    print(f"{grid.shape[1]} configurações em {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    analysis = analyze_grid(grid)
+    print(f"Análise (bootstrap + DSR + PBO) em {time.perf_counter() - start:.2f}s")
+    print(analysis["resumo"].head(5).round(3))
+    print("DSR:", analysis["dsr"])
+    print("PBO:", analysis["pbo"])
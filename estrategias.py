@@ -0,0 +1,195 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import analise_quantitativa
+import instrumentacao
+
+# --- Indicadores disponíveis para as estratégias ---
+# Cada indicador recebe a série de preços e seus parâmetros; `coluna` dá o nome usado nos arquivos
+# quant_analysis (ex: SMA_50), para reaproveitar colunas já calculadas pela análise quantitativa.
+
+def _sma(prices, window):
+    return analise_quantitativa.calculate_moving_average(prices.to_frame("Adj Close"), window)
+
+def _rsi(prices, window):
+    return analise_quantitativa.calculate_rsi(prices.to_frame("Adj Close"), window)
+
+INDICATORS = {
+    "SMA": {"funcao": _sma, "coluna": lambda p: f"SMA_{p['window']}"},
+    "RSI": {"funcao": _rsi, "coluna": lambda p: f"RSI_{p['window']}"},
+}
+
+def register_indicator(name, function, column_name=None):
+    """Registra um indicador `function(prices, **params) -> pd.Series`."""
+    INDICATORS[name] = {"funcao": function, "coluna": column_name}
+
+# --- Cache de sinais ---
+
+class SignalCache:
+    """Cache LRU de indicadores calculados, chaveado por (ticker, indicador, parâmetros, versão dos dados).
+
+    Estratégias que compartilham indicadores (ex: RSI_14 na reversão à média e no filtro SMA+RSI)
+    reutilizam o mesmo array em vez de recalculá-lo a cada execução.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(ticker, indicator, params, data_version):
+        return (ticker, indicator, tuple(sorted(params.items())), data_version)
+
+    def get_or_compute(self, ticker, indicator, params, data_version, compute):
+        key = self.key(ticker, indicator, params, data_version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+SIGNAL_CACHE = SignalCache()
+
+def data_version(prices):
+    """Versão (barata) de uma série de preços: tamanho, datas extremas e hash dos valores."""
+    if prices is None or prices.empty:
+        return None
+    return (len(prices), prices.index[0], prices.index[-1],
+            int(pd.util.hash_array(prices.to_numpy(dtype=np.float64)).sum(dtype=np.uint64)))
+
+def compute_indicator(ticker, prices, indicator, params, version=None, cache=SIGNAL_CACHE):
+    """Calcula (ou recupera do cache) um indicador para a série de preços de um ticker."""
+    if indicator not in INDICATORS:
+        raise KeyError(f"Indicador '{indicator}' não registrado. Disponíveis: {list(INDICATORS)}")
+    version = data_version(prices) if version is None else version
+    function = INDICATORS[indicator]["funcao"]
+    return cache.get_or_compute(ticker, indicator, params, version, lambda: function(prices, **params))
+
+# --- Regras das estratégias (peso alvo entre 0 e 1 em cada data) ---
+
+def sma_crossover_weights(short_sma, long_sma):
+    """Regra da estratégia de cruzamento de médias: peso alvo 1 quando a SMA curta está acima da longa, 0 caso contrário.
+    Aceita Series/DataFrames ou arrays numpy (usada pelo backtest diário e pelo motor intradiário)."""
+    return (short_sma > long_sma).astype(np.float64)
+
+def _rsi_mean_reversion(ind, params):
+    # Entra quando o RSI cai abaixo de `entrada` e sai quando sobe acima de `saida` (histerese)
+    rsi = ind["rsi"]
+    state = pd.Series(np.nan, index=rsi.index)
+    state[rsi < params["entrada"]] = 1.0
+    state[rsi > params["saida"]] = 0.0
+    return state.ffill().fillna(0.0)
+
+def _sma_rsi_filter(ind, params):
+    # Cruzamento de médias, mas só fica posicionado enquanto o RSI não indicar sobrecompra
+    return sma_crossover_weights(ind["curta"], ind["longa"]) * (ind["rsi"] < params["rsi_max"]).astype(np.float64)
+
+STRATEGIES = {}
+
+def register_strategy(name, indicators, weights, parameters, description="", validate=None):
+    """Registra uma estratégia.
+
+    - indicators(params) -> {apelido: (indicador, {parametros})}: indicadores de que a estratégia precisa;
+    - weights(indicadores, params) -> pd.Series de pesos alvo (0 a 1), com `indicadores` = {apelido: pd.Series};
+    - parameters: {nome: {"padrao", "min", "max", "descricao"}};
+    - validate(params) -> mensagem de erro ou None.
+    """
+    STRATEGIES[name] = {"indicadores": indicators, "pesos": weights, "parametros": parameters,
+                        "descricao": description, "validar": validate}
+
+register_strategy(
+    "sma_crossover",
+    indicators=lambda p: {"curta": ("SMA", {"window": p["short_window"]}), "longa": ("SMA", {"window": p["long_window"]})},
+    weights=lambda ind, p: sma_crossover_weights(ind["curta"], ind["longa"]),
+    parameters={"short_window": {"padrao": 50, "min": 2, "max": 250, "descricao": "Janela Curta SMA"},
+                "long_window": {"padrao": 200, "min": 5, "max": 400, "descricao": "Janela Longa SMA"}},
+    description="Comprado enquanto a SMA curta estiver acima da SMA longa.",
+    validate=lambda p: "A janela curta da SMA deve ser menor que a janela longa." if p["short_window"] >= p["long_window"] else None,
+)
+register_strategy(
+    "rsi_mean_reversion",
+    indicators=lambda p: {"rsi": ("RSI", {"window": p["rsi_window"]})},
+    weights=_rsi_mean_reversion,
+    parameters={"rsi_window": {"padrao": 14, "min": 2, "max": 100, "descricao": "Janela RSI"},
+                "entrada": {"padrao": 30, "min": 1, "max": 99, "descricao": "RSI de entrada (abaixo de)"},
+                "saida": {"padrao": 70, "min": 1, "max": 99, "descricao": "RSI de saída (acima de)"}},
+    description="Reversão à média: compra com RSI baixo e zera com RSI alto.",
+    validate=lambda p: "O RSI de entrada deve ser menor que o de saída." if p["entrada"] >= p["saida"] else None,
+)
+register_strategy(
+    "sma_rsi_filter",
+    indicators=lambda p: {"curta": ("SMA", {"window": p["short_window"]}), "longa": ("SMA", {"window": p["long_window"]}),
+                          "rsi": ("RSI", {"window": p["rsi_window"]})},
+    weights=_sma_rsi_filter,
+    parameters={"short_window": {"padrao": 50, "min": 2, "max": 250, "descricao": "Janela Curta SMA"},
+                "long_window": {"padrao": 200, "min": 5, "max": 400, "descricao": "Janela Longa SMA"},
+                "rsi_window": {"padrao": 14, "min": 2, "max": 100, "descricao": "Janela RSI"},
+                "rsi_max": {"padrao": 70, "min": 1, "max": 100, "descricao": "RSI máximo para ficar comprado"}},
+    description="Cruzamento de médias filtrado: fica fora do ativo quando o RSI indica sobrecompra.",
+    validate=lambda p: "A janela curta da SMA deve ser menor que a janela longa." if p["short_window"] >= p["long_window"] else None,
+)
+
+def resolve_params(strategy, **params):
+    """Completa os parâmetros com os padrões declarados e valida; levanta ValueError se inválidos."""
+    if strategy not in STRATEGIES:
+        raise KeyError(f"Estratégia '{strategy}' não registrada. Disponíveis: {list(STRATEGIES)}")
+    spec = STRATEGIES[strategy]
+    unknown = set(params) - set(spec["parametros"])
+    if unknown:
+        raise ValueError(f"Parâmetros desconhecidos para '{strategy}': {sorted(unknown)}")
+    resolved = {name: params.get(name, p["padrao"]) for name, p in spec["parametros"].items()}
+    error = spec["validar"](resolved) if spec["validar"] else None
+    if error:
+        raise ValueError(error)
+    return resolved
+
+@instrumentacao.instrumentado("estrategias.pesos_alvo")
+def target_weights(strategy, ticker, prices, full_data_df=None, cache=SIGNAL_CACHE, **params):
+    """Pesos alvo de uma estratégia registrada para um ticker.
+
+    Indicadores já presentes em `full_data_df` (colunas do arquivo quant_analysis, ex: SMA_50) são usados
+    diretamente; os que faltarem são calculados sob demanda a partir de `prices` pelo cache de sinais.
+    """
+    params = resolve_params(strategy, **params)
+    spec = STRATEGIES[strategy]
+    version = data_version(prices)
+    hits_before = cache.hits
+    indicators = {}
+    for alias, (indicator, ind_params) in spec["indicadores"](params).items():
+        column_name = INDICATORS[indicator]["coluna"]
+        column = column_name(ind_params) if column_name else None
+        if full_data_df is not None and column in full_data_df.columns:
+            indicators[alias] = full_data_df[column].reindex(prices.index)
+        else:
+            indicators[alias] = compute_indicator(ticker, prices, indicator, ind_params, version=version, cache=cache)
+    instrumentacao.anotar(estrategia=strategy, ticker=ticker, cache_hit=cache.hits > hits_before)
+    weights = spec["pesos"](indicators, params)
+    return pd.Series(np.asarray(weights, dtype=np.float64), index=prices.index, name=ticker)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    dates = pd.bdate_range("2015-01-01", periods=2500)
+    prices = pd.Series(50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates)))), index=dates)
+    for name in STRATEGIES:
+        w = target_weights(name, "SINTETICO", prices)
+        print(f"{name:<20} exposição média {w.mean():.1%}, trocas de posição {int(w.diff().abs().sum())}")
+    print(f"Cache de sinais: {len(SIGNAL_CACHE)} indicadores, {SIGNAL_CACHE.hits} hits, {SIGNAL_CACHE.misses} misses")
@@ -0,0 +1,206 @@
+"""Eventos corporativos (proventos e desdobramentos) e reajuste local do histórico de preços.
+
+Os eventos de todos os tickers ficam num único Parquet compacto (ticker, data, tipo, valor). Com eles,
+as séries bruta (como negociada), ajustada só por desdobramentos (o 'Close' do yfinance) e de retorno
+total (o 'Adj Close') são reconstruídas localmente com um produto acumulado dos fatores, sem rede.
+
+Convenções (as mesmas do Yahoo):
+- 'Close' já vem ajustado por desdobramentos; proventos vêm na mesma base.
+- Desdobramento de razão r na data t: preços anteriores a t são divididos por r na série ajustada.
+- Provento D na data ex t: preços anteriores a t são multiplicados por 1 - D / Close(t-1).
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import universo
+
+DATA_DIR = "."
+EVENTS_FILE = "eventos_corporativos.parquet"
+
+TIPOS = ("dividendo", "desdobramento")
+# Colunas de eventos devolvidas por `Ticker.history(actions=True)`
+ACTION_COLUMNS = {"Dividends": "dividendo", "Stock Splits": "desdobramento"}
+
+SCHEMA = pa.schema([
+    ("ticker", pa.string()),
+    ("data", pa.timestamp("ns")),
+    ("tipo", pa.string()),
+    ("valor", pa.float64()),
+])
+
+_lock = threading.Lock()
+_cache = {}
+
+def _store_path():
+    return os.path.join(DATA_DIR, EVENTS_FILE)
+
+def _empty():
+    return pd.DataFrame({"ticker": pd.Series(dtype=str), "data": pd.Series(dtype="datetime64[ns]"),
+                         "tipo": pd.Series(dtype=str), "valor": pd.Series(dtype=float)})
+
+def _naive_dates(index):
+    """Datas sem fuso e normalizadas para o dia (o yfinance devolve timestamps com fuso da bolsa)."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+def extract_events(hist_data):
+    """Eventos (data, tipo, valor) presentes nas colunas 'Dividends'/'Stock Splits' de um histórico."""
+    frames = []
+    for column, tipo in ACTION_COLUMNS.items():
+        if column not in hist_data.columns:
+            continue
+        values = pd.to_numeric(hist_data[column], errors="coerce")
+        mask = (values.fillna(0) != 0).to_numpy()
+        if mask.any():
+            frames.append(pd.DataFrame({"data": _naive_dates(hist_data.index[mask]), "tipo": tipo,
+                                        "valor": values.to_numpy()[mask].astype(float)}))
+    if not frames:
+        return _empty().drop(columns="ticker")
+    return pd.concat(frames, ignore_index=True).sort_values(["data", "tipo"], ignore_index=True)
+
+def load_all():
+    """Tabela completa de eventos (cacheada pelo mtime do arquivo)."""
+    path = _store_path()
+    if not os.path.exists(path):
+        return _empty()
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    table = _cache.get(key)
+    if table is None:
+        table = pq.read_table(path, schema=SCHEMA).to_pandas()
+        _cache.clear()
+        _cache[key] = table
+    return table
+
+def load_events(ticker):
+    """Eventos de um ticker, ordenados por data."""
+    table = load_all()
+    return table.loc[table["ticker"] == ticker, ["data", "tipo", "valor"]].reset_index(drop=True)
+
+def save_events(ticker, events):
+    """Acrescenta/atualiza os eventos do ticker (chave: data + tipo). Retorna quantos eram novos ou diferentes."""
+    events = events[["data", "tipo", "valor"]].copy()
+    events["data"] = _naive_dates(events["data"])
+    with _lock:
+        table = load_all()
+        current = table[table["ticker"] == ticker]
+        merged = current.merge(events, on=["data", "tipo"], how="right", suffixes=("_antigo", ""))
+        n_changed = int((~np.isclose(merged["valor_antigo"], merged["valor"], rtol=1e-9, equal_nan=False)).sum())
+        if n_changed == 0:
+            return 0
+        updated = pd.concat([current[["data", "tipo", "valor"]], events])
+        updated = updated.drop_duplicates(["data", "tipo"], keep="last").assign(ticker=ticker)
+        table = pd.concat([table[table["ticker"] != ticker], updated[SCHEMA.names]], ignore_index=True)
+        table = table.sort_values(["ticker", "data", "tipo"], ignore_index=True)
+        path = _store_path()
+        tmp_path = f"{path}.tmp"
+        pq.write_table(pa.Table.from_pandas(table, schema=SCHEMA, preserve_index=False), tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    return n_changed
+
+def _event_multipliers(index, events, tipo, close=None):
+    """Vetor m (len(index) + 1) com o fator de cada evento na posição do primeiro pregão a partir da data ex.
+
+    O fator acumulado de cada pregão i é o produto de m[j] para j > i, calculado de trás para frente
+    com um único `cumprod`; eventos anteriores ao primeiro pregão não afetam a série.
+    """
+    m = np.ones(len(index) + 1)
+    selected = events[events["tipo"] == tipo]
+    if selected.empty:
+        return m
+    positions = _naive_dates(index).searchsorted(_naive_dates(selected["data"]), side="left")
+    values = selected["valor"].to_numpy(dtype=float)
+    valid = positions > 0
+    positions, values = positions[valid], values[valid]
+    if tipo == "desdobramento":
+        factors = 1.0 / values
+    else:
+        previous_close = np.asarray(close, dtype=float)[positions - 1]
+        factors = 1.0 - values / previous_close
+        factors = np.where(np.isfinite(factors) & (factors > 0), factors, 1.0)
+    np.multiply.at(m, positions, factors)
+    return m
+
+def cumulative_factor(index, events, tipo, close=None):
+    """Fator acumulado por pregão para um tipo de evento (1 no último pregão e após o último evento)."""
+    m = _event_multipliers(index, events, tipo, close)
+    return pd.Series(np.cumprod(m[::-1])[::-1][1:], index=index)
+
+def adjustment_factors(close, events):
+    """DataFrame com 'fator_desdobramento' e 'fator_provento' por pregão.
+
+    `close` é o fechamento ajustado por desdobramentos (o 'Close' do yfinance). Série bruta =
+    close / fator_desdobramento; retorno total = close * fator_provento.
+    """
+    close = close.astype(float)
+    return pd.DataFrame({
+        "fator_desdobramento": cumulative_factor(close.index, events, "desdobramento"),
+        "fator_provento": cumulative_factor(close.index, events, "dividendo", close=close.to_numpy()),
+    })
+
+def rebuild_prices(hist_data, events):
+    """Histórico com 'Adj Close' recalculado localmente e o fechamento bruto ('Close Bruto', como negociado)."""
+    factors = adjustment_factors(hist_data["Close"], events)
+    rebuilt = hist_data.copy()
+    rebuilt["Adj Close"] = hist_data["Close"] * factors["fator_provento"]
+    rebuilt["Close Bruto"] = hist_data["Close"] / factors["fator_desdobramento"]
+    return rebuilt
+
+def apply_new_splits(hist_data, new_splits):
+    """Reajusta um histórico em cache por desdobramentos que ocorreram depois dele ter sido baixado.
+
+    Preços anteriores à data ex são divididos pela razão e o volume multiplicado, como o Yahoo faz.
+    """
+    if new_splits.empty:
+        return hist_data
+    factor = cumulative_factor(hist_data.index, new_splits.assign(tipo="desdobramento"), "desdobramento").to_numpy()
+    adjusted = hist_data.copy()
+    for column in ("Open", "High", "Low", "Close", "Adj Close"):
+        if column in adjusted.columns:
+            adjusted[column] = adjusted[column] * factor
+    if "Volume" in adjusted.columns:
+        adjusted["Volume"] = adjusted["Volume"] / factor
+    if "Dividends" in adjusted.columns:
+        adjusted["Dividends"] = adjusted["Dividends"] * factor
+    return adjusted
+
+def price_series(stem, base="retorno_total", data_dir=None):
+    """Série de fechamento de um ativo reconstruída a partir do arquivo _chart e do armazenamento de eventos.
+
+    `base`: "retorno_total" (ajustado por proventos e desdobramentos), "preco" (só desdobramentos) ou
+    "bruto" (como negociado). Retorna None se o arquivo não existir.
+    """
+    path = universo.file_path(stem, "chart", data_dir)
+    if not os.path.exists(path):
+        print(f"Arquivo de histórico não encontrado para {stem}: {path}")
+        return None
+    hist_data = pd.read_csv(path, index_col="Timestamp", parse_dates=True)
+    rebuilt = rebuild_prices(hist_data, load_events(universo.ticker_of(stem)))
+    column = {"retorno_total": "Adj Close", "preco": "Close", "bruto": "Close Bruto"}.get(base)
+    if column is None:
+        raise ValueError(f"Base '{base}' inválida. Use 'retorno_total', 'preco' ou 'bruto'.")
+    return rebuilt[column].rename(universo.ticker_of(stem))
+
+if __name__ == "__main__":
+    import tempfile
+    DATA_DIR = tempfile.mkdtemp()
+    dates = pd.bdate_range("2024-01-01", periods=10)
+    # Fechamentos como negociados, com desdobramento 2:1 no 5º pregão; o 'Close' do histórico vem
+    # ajustado pelo desdobramento (como no yfinance), então o trecho anterior é dividido pela razão
+    raw_close = pd.Series([10.0, 10.2, 10.1, 10.3, 5.2, 5.3, 5.25, 5.1, 5.2, 5.3], index=dates)
+    split = pd.DataFrame({"data": [dates[4]], "tipo": ["desdobramento"], "valor": [2.0]})
+    split_factor = cumulative_factor(dates, split, "desdobramento")
+    close = raw_close * split_factor
+    hist = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000.0 / split_factor,
+                         "Dividends": 0.0, "Stock Splits": 0.0})
+    hist.loc[dates[4], "Stock Splits"] = 2.0
+    hist.loc[dates[7], "Dividends"] = 0.15
+    print(f"Eventos novos gravados: {save_events('TESTE3.SA', extract_events(hist))}")
+    print(f"Regravação idempotente: {save_events('TESTE3.SA', extract_events(hist))}")
+    rebuilt = rebuild_prices(hist, load_events("TESTE3.SA"))
+    print(rebuilt[["Close", "Adj Close", "Close Bruto"]])
+    print(f"'Close Bruto' reconstrói os fechamentos negociados: {np.allclose(rebuilt['Close Bruto'], raw_close)}")
@@ -0,0 +1,215 @@
+"""Histórico point-in-time dos fundamentos (snapshots de `ticker.info`).
+
+Cada coleta grava um novo arquivo Parquet (append-only) no formato longo
+(ticker, campo, data_captura, valor_num, valor_txt, removido), apenas com os campos que mudaram em
+relação ao último estado conhecido do ticker. A consulta `as_of(data)` reconstrói a tabela de
+fundamentos de todos os tickers como ela era conhecida naquela data, sem viés de look-ahead.
+"""
+import glob
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import instrumentacao
+import universo
+
+DATA_DIR = "."
+PIT_SUBDIR = "fundamentos_pit"
+
+SCHEMA = pa.schema([
+    ("ticker", pa.string()),
+    ("campo", pa.string()),
+    ("data_captura", pa.timestamp("ns")),
+    ("valor_num", pa.float64()),
+    ("valor_txt", pa.string()),
+    ("removido", pa.bool_()),
+])
+
+_TABLE_CACHE = {}
+
+def _store_dir():
+    return os.path.join(DATA_DIR, PIT_SUBDIR)
+
+def _part_files():
+    return sorted(glob.glob(os.path.join(_store_dir(), "part-*.parquet")))
+
+def flatten_snapshot(info, prefix=""):
+    """Achata o dict do yfinance em {campo: valor escalar}; dicts aninhados viram 'pai.filho' e listas são ignoradas."""
+    flat = {}
+    for key, value in (info or {}).items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_snapshot(value, prefix=f"{name}."))
+        elif isinstance(value, (list, tuple)) or value is None:
+            continue
+        else:
+            flat[name] = value
+    return flat
+
+def _split_value(value):
+    """(valor_num, valor_txt) de um valor escalar; booleanos são guardados como 0/1."""
+    if isinstance(value, (bool, np.bool_)):
+        return float(value), None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value), None
+    return np.nan, str(value)
+
+def load_history(tickers=None, campos=None, ate=None):
+    """Histórico completo no formato longo (opcionalmente filtrado), ordenado por data de captura."""
+    parts = _part_files()
+    if not parts:
+        return pd.DataFrame(columns=SCHEMA.names)
+    cache_key = (os.path.abspath(_store_dir()), tuple((p, os.path.getmtime(p)) for p in parts))
+    history = _TABLE_CACHE.get(cache_key)
+    if history is None:
+        history = pq.ParquetDataset(parts, schema=SCHEMA).read().to_pandas()
+        history = history.sort_values("data_captura", kind="stable").reset_index(drop=True)
+        _TABLE_CACHE.clear()
+        _TABLE_CACHE[cache_key] = history
+    mask = np.ones(len(history), dtype=bool)
+    if tickers is not None:
+        mask &= history["ticker"].isin(list(tickers)).to_numpy()
+    if campos is not None:
+        mask &= history["campo"].isin(list(campos)).to_numpy()
+    if ate is not None:
+        mask &= (history["data_captura"] <= pd.Timestamp(ate)).to_numpy()
+    return history[mask]
+
+def _latest_state(history):
+    """Último registro de cada (ticker, campo) no histórico (inclusive remoções)."""
+    return history.drop_duplicates(subset=["ticker", "campo"], keep="last")
+
+@instrumentacao.instrumentado("fundamentos.append")
+def append_snapshots(snapshots, data_captura=None):
+    """Acrescenta snapshots {ticker: info} ao histórico, gravando só os campos novos, alterados ou removidos.
+
+    Retorna o número de linhas gravadas (0 se nada mudou).
+    """
+    data_captura = pd.Timestamp(data_captura) if data_captura is not None else pd.Timestamp.now().floor("s")
+    records = [(ticker, campo, *_split_value(value))
+               for ticker, info in snapshots.items() for campo, value in flatten_snapshot(info).items()]
+    incoming = pd.DataFrame(records, columns=["ticker", "campo", "valor_num", "valor_txt"])
+    known = _latest_state(load_history(tickers=list(snapshots)))
+    known = known[~known["removido"].to_numpy(dtype=bool)][["ticker", "campo", "valor_num", "valor_txt"]]
+
+    # Diferença vetorizada entre o snapshot recebido e o último estado conhecido
+    merged = incoming.merge(known, on=["ticker", "campo"], how="outer", suffixes=("", "_anterior"), indicator=True)
+    same_num = (merged["valor_num"] == merged["valor_num_anterior"]) | (merged["valor_num"].isna() & merged["valor_num_anterior"].isna())
+    same_txt = (merged["valor_txt"] == merged["valor_txt_anterior"]) | (merged["valor_txt"].isna() & merged["valor_txt_anterior"].isna())
+    changed = (merged["_merge"] == "left_only") | ((merged["_merge"] == "both") & ~(same_num & same_txt))
+    # Campos que existiam e sumiram do snapshot recebem uma marca de remoção
+    removed = merged["_merge"] == "right_only"
+
+    rows = merged.loc[changed | removed, ["ticker", "campo", "valor_num", "valor_txt"]].copy()
+    rows["removido"] = removed[changed | removed].to_numpy()
+    rows.loc[rows["removido"], ["valor_num", "valor_txt"]] = [np.nan, None]
+    rows.insert(2, "data_captura", data_captura)
+
+    instrumentacao.anotar(linhas=len(rows), tickers=len(snapshots))
+    if rows.empty:
+        return 0
+    df = rows[SCHEMA.names]
+    os.makedirs(_store_dir(), exist_ok=True)
+    filepath = os.path.join(_store_dir(), f"part-{data_captura.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+    pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), filepath)
+    return len(rows)
+
+def append_snapshot(ticker, info, data_captura=None):
+    """Atalho para um único ticker (usado pela coleta de insights)."""
+    return append_snapshots({ticker: info}, data_captura=data_captura)
+
+@instrumentacao.instrumentado("fundamentos.as_of")
+def as_of(data, tickers=None, campos=None):
+    """Tabela de fundamentos (tickers x campos) como conhecida em `data` (capturas até essa data, inclusive).
+
+    Campos numéricos vêm como float; campos de texto como object.
+    """
+    data = pd.Timestamp(data)
+    if data == data.normalize():
+        # Só a data: vale tudo o que foi capturado até o fim do dia
+        data = data + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+    history = load_history(tickers=tickers, campos=campos, ate=data)
+    if history.empty:
+        return pd.DataFrame()
+    state = _latest_state(history)
+    state = state[~state["removido"].to_numpy(dtype=bool)]
+    numeric = state.dropna(subset=["valor_num"]).pivot(index="ticker", columns="campo", values="valor_num")
+    text = state.dropna(subset=["valor_txt"]).pivot(index="ticker", columns="campo", values="valor_txt")
+    table = numeric.combine_first(text) if not text.empty else numeric
+    table.columns.name = None
+    return table
+
+def field_panel(campo, index, tickers=None, texto=False):
+    """Painel (datas x tickers) de um campo, com o valor conhecido em cada data (última captura até o fim do dia).
+    Antes da primeira captura, ou depois de o campo ser removido, o valor é NaN."""
+    history = load_history(tickers=tickers, campos=[campo])
+    columns = list(tickers) if tickers is not None else sorted(history["ticker"].unique())
+    dtype = object if texto else np.float64
+    if history.empty:
+        return pd.DataFrame(np.full((len(index), len(columns)), np.nan, dtype=dtype), index=index, columns=columns)
+    # Várias capturas no mesmo instante: vale a última
+    history = history.drop_duplicates(subset=["data_captura", "ticker"], keep="last")
+    value_column = "valor_txt" if texto else "valor_num"
+    history = history.assign(valor=history[value_column].where(~history["removido"].to_numpy(dtype=bool)), presente=1.0)
+    wide = history.pivot(index="data_captura", columns="ticker", values=["valor", "presente"])
+    values = wide["valor"].reindex(columns=columns).to_numpy(dtype=dtype)
+    present = wide["presente"].reindex(columns=columns).notna().to_numpy()
+
+    # Linha da última captura de cada ticker até cada instante (remoções contam como captura com NaN)
+    rows = np.arange(len(values))[:, None]
+    last_capture = np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+    positions = wide.index.searchsorted(pd.DatetimeIndex(index).normalize() + pd.Timedelta(days=1), side="left") - 1
+    panel = np.full((len(index), len(columns)), np.nan, dtype=dtype)
+    known_dates = positions >= 0
+    source = last_capture[positions[known_dates]]
+    picked = np.take_along_axis(values, np.maximum(source, 0), axis=0)
+    panel[known_dates] = np.where(source >= 0, picked, np.nan)
+    return pd.DataFrame(panel, index=index, columns=columns)
+
+def compactar():
+    """Reúne os arquivos de captura em um único Parquet (o conteúdo do histórico não muda)."""
+    parts = _part_files()
+    if len(parts) <= 1:
+        return len(parts)
+    history = load_history()
+    filepath = os.path.join(_store_dir(), f"part-{history['data_captura'].max().strftime('%Y%m%dT%H%M%S')}-compactado-{uuid.uuid4().hex[:8]}.parquet")
+    pq.write_table(pa.Table.from_pandas(history, schema=SCHEMA, preserve_index=False), filepath)
+    for part in parts:
+        os.remove(part)
+    return 1
+
+def importar_insights_existentes(ticker_stems):
+    """Semeia o histórico com os arquivos *_insights.json atuais, usando a data de modificação do arquivo."""
+    total = 0
+    for stem in ticker_stems:
+        filepath = os.path.join(DATA_DIR, f"{stem}_insights.json")
+        if not os.path.exists(filepath):
+            continue
+        with open(filepath, "r") as f:
+            info = json.load(f)
+        ticker = info.get("symbol") or universo.ticker_of(stem)
+        total += append_snapshot(ticker, info, data_captura=pd.Timestamp(os.path.getmtime(filepath), unit="s").floor("s"))
+    return total
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        DATA_DIR = tmp
+        rng = np.random.default_rng(3)
+        tickers = [f"SYN{i:03d}" for i in range(500)]
+        ratings = ["BUY", "HOLD", "SELL"]
+        for day in pd.date_range("2024-01-01", periods=24, freq="MS"):
+            snapshots = {}
+            for t in tickers:
+                snapshots[t] = {"symbol": t, "trailingPE": round(float(rng.uniform(5, 30)), 1) if rng.random() < 0.3 else 12.0,
+                                "sector": "Energia", "recommendation": {"rating": ratings[int(rng.integers(0, 3))] if rng.random() < 0.1 else "HOLD"}}
+            append_snapshots(snapshots, data_captura=day)
+        history = load_history()
+        print(f"{len(history):,} linhas armazenadas para {24 * len(tickers) * 4:,} valores capturados")
+        print(as_of("2024-06-15", tickers=tickers[:3]))
+        panel = field_panel("trailingPE", pd.bdate_range("2024-01-01", "2025-12-31"), tickers=tickers)
+        print(f"Painel trailingPE: {panel.shape}, NaN antes da primeira captura: {int(panel.iloc[0].isna().sum())}")
+        print(f"Arquivos antes/depois da compactação: {len(_part_files())} -> {compactar()}")
@@ -0,0 +1,133 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+
+# Logger estruturado (uma linha JSON por etapa). Defina QUANTFUND_PERF_LOG=arquivo.jsonl para gravar em disco.
+logger = logging.getLogger("quantfund.perf")
+logger.addHandler(logging.NullHandler())
+if os.environ.get("QUANTFUND_PERF_LOG"):
+    _file_handler = logging.FileHandler(os.environ["QUANTFUND_PERF_LOG"], encoding="utf-8")
+    _file_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_file_handler)
+    logger.setLevel(logging.INFO)
+
+MAX_RECORDS = 2000
+
+_records = deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+_current = contextvars.ContextVar("instrumentacao_etapa_atual", default=None)
+
+def _count_rows(result):
+    """Número de linhas do resultado, quando for um DataFrame/Series (ou tupla que comece com um)."""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return int(len(result))
+    return None
+
+def _register(record):
+    with _lock:
+        _records.append(record)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+@contextmanager
+def medir_etapa(etapa, **campos):
+    """Context manager que mede a duração de uma etapa e registra métricas adicionais.
+
+    Campos extras (linhas, bytes_lidos, cache_hit, ticker...) podem ser passados na abertura ou
+    adicionados durante a execução com `anotar(...)`.
+    """
+    record = {"etapa": etapa, "inicio": pd.Timestamp.now().isoformat(timespec="milliseconds"), **campos}
+    token = _current.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+        record.setdefault("status", "ok")
+    except Exception as e:
+        record["status"] = "erro"
+        record["erro"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duracao_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _current.reset(token)
+        _register(record)
+
+def anotar(**campos):
+    """Adiciona campos à etapa em execução (sem efeito fora de uma etapa instrumentada)."""
+    record = _current.get()
+    if record is not None:
+        record.update(campos)
+
+def anotar_arquivo_lido(filepath):
+    """Soma o tamanho de um arquivo lido ao campo `bytes_lidos` da etapa atual."""
+    record = _current.get()
+    if record is not None and filepath and os.path.exists(filepath):
+        record["bytes_lidos"] = record.get("bytes_lidos", 0) + os.path.getsize(filepath)
+
+def instrumentado(etapa):
+    """Decorator que mede a função como uma etapa e registra o número de linhas do resultado."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with medir_etapa(etapa, funcao=function.__qualname__) as record:
+                result = function(*args, **kwargs)
+                if "linhas" not in record:
+                    rows = _count_rows(result)
+                    if rows is not None:
+                        record["linhas"] = rows
+                return result
+        return wrapper
+    return decorator
+
+def get_recent_metrics(n=200):
+    """Últimos `n` registros como DataFrame (mais recentes por último)."""
+    with _lock:
+        records = list(_records)[-n:]
+    return pd.DataFrame(records)
+
+def summarize_metrics():
+    """Resumo por etapa: execuções, tempo total/médio/p95, linhas, bytes lidos e cache hits."""
+    df = get_recent_metrics(MAX_RECORDS)
+    if df.empty:
+        return df
+    for col in ("linhas", "bytes_lidos", "cache_hit"):
+        if col not in df.columns:
+            df[col] = None
+    df["cache_hit"] = df["cache_hit"].astype("float64")
+    grouped = df.groupby("etapa")
+    summary = pd.DataFrame({
+        "execucoes": grouped.size(),
+        "tempo_total_ms": grouped["duracao_ms"].sum().round(1),
+        "tempo_medio_ms": grouped["duracao_ms"].mean().round(1),
+        "tempo_p95_ms": grouped["duracao_ms"].quantile(0.95).round(1),
+        "linhas": grouped["linhas"].sum(min_count=1),
+        "bytes_lidos": grouped["bytes_lidos"].sum(min_count=1),
+        "cache_hits": grouped["cache_hit"].sum(min_count=1),
+    })
+    return summary.sort_values("tempo_total_ms", ascending=False)
+
+def reset_metrics():
+    """Limpa o registro em memória."""
+    with _lock:
+        _records.clear()
+
+if __name__ == "__main__":
+    @instrumentado("exemplo.soma")
+    def soma_lenta(n):
+        time.sleep(0.01)
+        return pd.Series(range(n))
+
+    for n in (10, 100, 1000):
+        soma_lenta(n)
+    with medir_etapa("exemplo.bloco", ticker="PETR4.SA"):
+        anotar(cache_hit=True)
+    print(get_recent_metrics())
+    print(summarize_metrics())
@@ -0,0 +1,218 @@
+"""Liquidez e custos de transação a partir do volume e das máximas/mínimas dos arquivos _chart.
+
+Métricas por pregão (painel datas x tickers), calculadas para o universo inteiro de uma vez:
+- adv / adv_valor: volume médio diário (ações e valor financeiro = Close x Volume) em JANELA pregões;
+- volatilidade: desvio padrão diário dos retornos logarítmicos de fechamento na mesma janela;
+- spread: estimador de Corwin-Schultz (máxima/mínima de dois pregões consecutivos, com o ajuste de
+  gaps noturnos), média móvel da janela. As estimativas de cada par entram com sinal na média e só a
+  média negativa vira zero: zerar cada par antes da média superestima muito o spread de ativos líquidos.
+
+Custo de negociar um valor V (fração de V), modelo de impacto pela raiz quadrada:
+    custo = max(spread, SPREAD_MINIMO) / 2 + COEFICIENTE_IMPACTO * volatilidade * sqrt(V / adv_valor)
+Valores financeiros ficam na moeda de cada ativo; os limites de posição/compra aceitam uma `moeda` comum
+(conversão pelo câmbio local de cada pregão, `calendario_mercado.convert_currency`).
+"""
+import os
+import numpy as np
+import pandas as pd
+import calendario_mercado
+import instrumentacao
+import painel_compacto
+import universo
+
+DATA_DIR = "."
+JANELA = 20
+MIN_PREGOES = 10
+COEFICIENTE_IMPACTO = 1.0
+SPREAD_MINIMO = 0.0005   # abaixo disso o estimador diário não distingue o spread de zero
+LIMITE_ADV = 0.1   # fração do ADV em valor que uma posição/compra pode ocupar
+VERSAO_MODELO = 1   # incrementar ao mudar as fórmulas de custo (entra na identidade das execuções gravadas)
+COLUMNS = ("High", "Low", "Close", "Volume")
+METRICS = ("adv", "adv_valor", "volatilidade", "spread")
+
+_PANEL_CACHE = {}
+
+def corwin_schultz_spread(high, low, close=None):
+    """Spread relativo de Corwin-Schultz de cada par de pregões (t-1, t), sem média móvel (pode ser negativo).
+
+    Com `close`, máxima e mínima de t são deslocadas pelo gap em relação ao fechamento de t-1
+    (o preço não negociado durante a noite não conta como spread).
+    """
+    high, low = high.astype(np.float64), low.astype(np.float64)
+    if close is not None:
+        previous_close = close.astype(np.float64).shift(1)
+        gap_up = (low - previous_close).clip(lower=0).fillna(0.0)
+        gap_down = (previous_close - high).clip(lower=0).fillna(0.0)
+        high, low = high - gap_up + gap_down, low - gap_up + gap_down
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_range = np.log(high / low) ** 2
+        beta = log_range + log_range.shift(1)
+        gamma = np.log(np.maximum(high, high.shift(1)) / np.minimum(low, low.shift(1))) ** 2
+        k = 3.0 - 2.0 * np.sqrt(2.0)
+        alpha = (np.sqrt(2.0 * beta) - np.sqrt(beta)) / k - np.sqrt(gamma / k)
+        return 2.0 * (np.exp(alpha) - 1.0) / (1.0 + np.exp(alpha))
+
+def liquidity_metrics(high, low, close, volume, janela=JANELA, min_pregoes=MIN_PREGOES):
+    """{métrica: painel datas x tickers} com adv, adv_valor, volatilidade e spread (ver docstring do módulo).
+
+    As entradas são painéis alinhados (mesmo índice e colunas); dias sem negociação ficam NaN e não
+    entram nas médias. O valor de cada data usa dados até ela, inclusive.
+    """
+    close = close.astype(np.float64)
+    volume = volume.astype(np.float64)
+    rolling = dict(window=janela, min_periods=min(min_pregoes, janela))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_returns = np.log(close / close.shift(1))
+    return {
+        "adv": volume.rolling(**rolling).mean(),
+        "adv_valor": (close * volume).rolling(**rolling).mean(),
+        "volatilidade": log_returns.rolling(**rolling).std(),
+        "spread": corwin_schultz_spread(high, low, close).rolling(**rolling).mean().clip(lower=0.0),
+    }
+
+def transaction_cost(valor, adv_valor, volatilidade, spread, coeficiente=COEFICIENTE_IMPACTO):
+    """Custo como fração do valor negociado (aceita escalares ou arrays); sem ADV válido, só o meio spread."""
+    spread = np.maximum(np.nan_to_num(spread), SPREAD_MINIMO)
+    valor = np.abs(np.asarray(valor, dtype=np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        participation = np.where(np.asarray(adv_valor) > 0, valor / adv_valor, 0.0)
+    impact = coeficiente * np.nan_to_num(volatilidade) * np.sqrt(np.nan_to_num(participation))
+    return spread / 2.0 + impact
+
+def cost_model(janela=JANELA):
+    """Versão e parâmetros do modelo de custos, gravados com as execuções de backtest que o usam."""
+    return {"modelo": "liquidez", "versao": VERSAO_MODELO, "janela": janela, "min_pregoes": MIN_PREGOES,
+            "coeficiente_impacto": COEFICIENTE_IMPACTO, "spread_minimo": SPREAD_MINIMO}
+
+def commission_fn(adv_valor, volatilidade, spread, coeficiente=COEFICIENTE_IMPACTO):
+    """Função (quantidade, preço) -> custo em dinheiro, no formato de `set_commissions` do bt."""
+    def commission(quantity, price):
+        valor = abs(quantity * price)
+        return float(valor * transaction_cost(valor, adv_valor, volatilidade, spread, coeficiente))
+    return commission
+
+def metrics_from_history(df, janela=JANELA):
+    """Métricas de um único ativo a partir de um histórico com High/Low/Close/Volume (ex: arquivo de análise).
+
+    Retorna DataFrame (datas x métricas) ou None se faltar alguma coluna.
+    """
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        print(f"Colunas ausentes para as métricas de liquidez: {missing}")
+        return None
+    # Mesmo nome de coluna nos quatro painéis (as operações do pandas alinham pelas colunas)
+    metrics = liquidity_metrics(*(df[[c]].set_axis(["ativo"], axis=1) for c in COLUMNS), janela=janela)
+    return pd.DataFrame({name: panel.iloc[:, 0] for name, panel in metrics.items()})
+
+@instrumentacao.instrumentado("liquidez.painel")
+def load_liquidity_panel(ticker_stems=None, janela=JANELA):
+    """{métrica: painel datas x tickers} do universo, numa única passada sobre o painel compacto.
+
+    Sem `ticker_stems`, usa todos os stems com arquivo _chart. Memorizado pelos mtimes dos arquivos.
+    """
+    if ticker_stems is None:
+        universo.DATA_DIR = DATA_DIR
+        ticker_stems = universo.stems_with("chart")
+    ticker_stems = list(dict.fromkeys(ticker_stems))
+    paths = [universo.file_path(stem, "chart", DATA_DIR) for stem in ticker_stems]
+    key = (tuple(paths), tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths), janela)
+    if key in _PANEL_CACHE:
+        instrumentacao.anotar(cache_hit=True)
+        return _PANEL_CACHE[key]
+    instrumentacao.anotar(cache_hit=False)
+    long_panel = painel_compacto.load_compact_panel(ticker_stems, COLUMNS, tipo="chart", data_dir=DATA_DIR)
+    if long_panel.empty:
+        return {name: pd.DataFrame() for name in METRICS}
+    wide = {c: painel_compacto.to_wide(long_panel, c).astype(np.float64) for c in COLUMNS}
+    for panel in wide.values():
+        panel.columns = panel.columns.astype(str)
+    metrics = liquidity_metrics(*(wide[c] for c in COLUMNS), janela=janela)
+    _PANEL_CACHE.clear()
+    _PANEL_CACHE[key] = metrics
+    instrumentacao.anotar(tickers=len(wide["Close"].columns), pregoes=len(wide["Close"]))
+    return metrics
+
+def snapshot(ticker_stems=None, janela=JANELA):
+    """Última métrica válida de cada ticker (DataFrame tickers x METRICS)."""
+    metrics = load_liquidity_panel(ticker_stems, janela)
+    if metrics["adv"].empty:
+        return pd.DataFrame(columns=METRICS)
+    return pd.DataFrame({name: panel.ffill().iloc[-1] for name, panel in metrics.items()})
+
+def adv_value(tickers, janela=JANELA, moeda=None):
+    """ADV em valor mais recente de cada ticker (Series na ordem de `tickers`, NaN sem histórico).
+
+    Sem `moeda`, cada valor fica na moeda do ativo; com `moeda`, o painel de ADV é convertido pelo câmbio
+    de cada pregão. Sem câmbio local, os tickers em outra moeda ficam NaN (em vez de um valor errado pelo câmbio).
+    """
+    tickers = list(tickers)
+    adv = load_liquidity_panel([universo.asset(t)["stem"] for t in tickers], janela)["adv_valor"]
+    if adv.empty:
+        return pd.Series(np.nan, index=tickers)
+    if moeda:
+        currencies = {t: universo.asset(t)["moeda"] for t in adv.columns}
+        foreign = [t for t, currency in currencies.items() if currency != moeda]
+        if foreign:
+            calendario_mercado.DATA_DIR = DATA_DIR
+            fx = calendario_mercado.load_fx_series()
+            if fx is None or fx.dropna().empty:
+                print(f"Câmbio não disponível localmente; sem ADV em {moeda} para {foreign}.")
+                adv = adv.drop(columns=foreign)
+            else:
+                adv = calendario_mercado.convert_currency(adv, currencies, moeda, fx_series=fx.dropna())
+    return adv.ffill().iloc[-1].reindex(tickers)
+
+def position_caps(tickers, valor_carteira, limite_adv=LIMITE_ADV, janela=JANELA, moeda=None):
+    """Peso máximo por ticker para que a posição não passe de `limite_adv` x ADV em valor.
+
+    `valor_carteira` está em `moeda` (ex: "BRL"); sem `moeda`, na moeda de cada ativo (só faz sentido se
+    forem todos da mesma moeda). Tickers sem ADV conhecido não recebem limite.
+    """
+    if not valor_carteira or valor_carteira <= 0:
+        return {}
+    adv = adv_value(tickers, janela, moeda)
+    return {t: float(min(1.0, limite_adv * v / valor_carteira)) for t, v in adv.items() if np.isfinite(v)}
+
+def purchase_caps(tickers, limite_adv=LIMITE_ADV, janela=JANELA, moeda=None):
+    """Valor máximo de compra por ticker num pregão: `limite_adv` x ADV em valor, em `moeda` (ver `position_caps`)."""
+    values = limite_adv * adv_value(tickers, janela, moeda)
+    return {t: float(v) for t, v in values.items() if np.isfinite(v)}
+
+if __name__ == "__main__":
+    import time
+    stems = ["br_PETR4_SA", "us_AAPL"]
+    print(snapshot(stems))
+    for ticker, cap in position_caps(["PETR4.SA", "AAPL"], valor_carteira=5e9, limite_adv=0.1, moeda="BRL").items():
+        print(f"Peso máximo de {ticker} numa carteira de R$ 5 bi (10% do ADV): {cap:.2%}")
+    liquidity = snapshot(stems).loc["PETR4.SA"]
+    for valor in (1e5, 1e7, 1e8):
+        custo = transaction_cost(valor, liquidity["adv_valor"], liquidity["volatilidade"], liquidity["spread"])
+        print(f"Custo estimado para negociar {valor:,.0f} de PETR4.SA: {float(custo) * 1e4:.1f} bps")
+
+    # Painel sintético grande: todas as métricas numa passada (máximas/mínimas arbitrárias, só tempo)
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2015-01-01", periods=2500)
+    tickers = [f"T{i:04d}" for i in range(1000)]
+    close = pd.DataFrame(50 * np.exp(np.cumsum(rng.normal(0, 0.02, (len(dates), len(tickers))), axis=0)), index=dates, columns=tickers)
+    high = close * (1 + np.abs(rng.normal(0, 0.01, close.shape)))
+    low = close * (1 - np.abs(rng.normal(0, 0.01, close.shape)))
+    volume = pd.DataFrame(rng.lognormal(13, 1, close.shape), index=dates, columns=tickers)
+    inicio = time.perf_counter()
+    liquidity_metrics(high, low, close, volume)
+    print(f"{len(tickers)} tickers x {len(dates)} pregões: {time.perf_counter() - inicio:.2f} s")
+
+    # Recuperação do spread nas hipóteses de Corwin-Schultz: preço contínuo (390 passos por pregão,
+    # volatilidade diária de 2%) e máxima/mínima negociadas no ask/bid, meio spread acima/abaixo do preço.
+    # O estimador tem viés positivo de ~0,1 p.p. nessa volatilidade (ver o caso de spread zero).
+    dias, ativos, passos, vol = 1000, 20, 390, 0.02
+    paths = np.cumsum(rng.normal(0, vol / np.sqrt(passos), (dias, passos, ativos)), axis=1)
+    log_close = np.log(50) + np.cumsum(paths[:, -1], axis=0)
+    log_open = log_close - paths[:, -1]
+    dates = pd.bdate_range("2015-01-01", periods=dias)
+    close = pd.DataFrame(np.exp(log_close), index=dates)
+    volume = pd.DataFrame(1e6, index=dates, columns=close.columns)
+    for spread_true in (0.0, 0.004, 0.01):
+        high = pd.DataFrame(np.exp(log_open + np.maximum(paths.max(axis=1), 0)) * (1 + spread_true / 2), index=dates)
+        low = pd.DataFrame(np.exp(log_open + np.minimum(paths.min(axis=1), 0)) * (1 - spread_true / 2), index=dates)
+        estimado = np.nanmedian(liquidity_metrics(high, low, close, volume)["spread"].to_numpy())
+        print(f"Spread verdadeiro {spread_true:.4f}: mediana estimada {estimado:.4f}")
@@ -1,61 +1,219 @@
 import pandas as pd
 import numpy as np
+import hashlib
 import json
 import os
+import time
+import warnings
+import cvxpy as cp
+from scipy import sparse
+import scipy.linalg
 from pypfopt import EfficientFrontier, risk_models, expected_returns, objective_functions
 from scipy.stats import norm # Para o intervalo de confiança
+import validacao_dados
+import black_litterman
+import calendario_mercado
+import correlacao
+import instrumentacao
+import liquidez
+import painel_compartilhado
+import universo
 
 DATA_DIR = "."
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.02      # mesma taxa livre de risco padrão do PyPortfolioOpt
+N_FATORES = 15             # componentes principais do modelo de risco por fatores
+SEM_SETOR = "Sem setor"
+WEIGHT_TOLERANCE = 1e-6    # pesos abaixo disso são considerados zerados
+# Pontos interiores: mais preciso que o OSQP (padrão do cvxpy para QPs), que deixa resíduos ~1e-5 nos pesos
+SOLVER = "CLARABEL" if "CLARABEL" in cp.installed_solvers() else None
+
+@instrumentacao.instrumentado("otimizacao.carga_precos")
+def load_stock_prices_for_optimization(ticker_stems, validar=True, reparar=True, calendario="intersection", moeda=None,
+                                       compacto=False):
+    """Carrega os preços de fechamento ajustados para uma lista de tickers.
+    As séries são alinhadas pelo calendário de pregões das bolsas (`calendario_mercado`): por padrão
+    apenas os pregões comuns ('intersection'); use 'union' para todos os pregões de qualquer bolsa.
+    `moeda` (ex: "BRL") converte todas as séries com a série de câmbio local.
+    Com `validar=True`, o painel passa pela validação de qualidade e as séries reprovadas são excluídas.
+    `compacto=True` mantém o painel em float32 (metade da memória; ver `painel_compacto`).
+    """
+    calendario_mercado.DATA_DIR = DATA_DIR
+    # O nome do arquivo quant_analysis é gerado no módulo analise_quantitativa (ex: br_PETR4_SA_quant_analysis.csv)
+    # e as colunas do painel são os tickers no formato do yfinance (ex: "PETR4.SA", "AAPL")
+    all_prices = calendario_mercado.load_aligned_prices(ticker_stems, column="Adj Close", how=calendario, target_currency=moeda,
+                                                        compacto=compacto)
+
+    if not all_prices.empty and validar:
+        all_prices, _, quality_report = validacao_dados.validate_price_panel(all_prices, repair=reparar)
+        validacao_dados.DATA_DIR = DATA_DIR
+        validacao_dados.save_quality_report(quality_report)
+        reprovados = validacao_dados.failing_tickers(quality_report)
+        if reprovados:
+            print(f"Séries excluídas da otimização por falha na validação de qualidade: {reprovados}")
+            all_prices = all_prices.drop(columns=reprovados)
 
-def load_stock_prices_for_optimization(ticker_stems):
-    """Carrega os preços de fechamento ajustados para uma lista de tickers."""
-    all_prices = pd.DataFrame()
-    for stem in ticker_stems:
-        # O nome do arquivo quant_analysis é gerado no módulo analise_quantitativa
-        # Ex: br_PETR4_SA_quant_analysis.csv
-        quant_file = os.path.join(DATA_DIR, f"{stem}_quant_analysis.csv")
-        if os.path.exists(quant_file):
-            try:
-                df_quant = pd.read_csv(quant_file, index_col='Timestamp', parse_dates=True)
-                # O ticker real para PyPortfolioOpt é a parte do stem após o prefixo da região
-                # Ex: br_PETR4_SA -> PETR4_SA. Precisamos remover o prefixo e o underline.
-                # No entanto, PyPortfolioOpt espera os nomes das colunas como os tickers (ex: "PETR4.SA", "AAPL")
-                # O stem já é algo como "br_PETR4_SA", então o ticker é "PETR4.SA"
-                # A função split("_")[1] pegaria "PETR4_SA". Precisamos garantir que o nome da coluna seja o ticker correto.
-                # O ideal é que o nome da coluna no CSV já seja o ticker correto.
-                # Vamos assumir que o stem é prefixo_TICKER e o nome da coluna será TICKER
-                # ticker_name = stem.split("_", 1)[1] # Ex: "PETR4_SA" ou "AAPL"
-                # Se o stem for "br_PETR4_SA", o ticker é "PETR4.SA". Se for "us_AAPL", é "AAPL".
-                parts = stem.split("_", 1)
-                ticker_name = parts[1].replace("_", ".") if len(parts) > 1 else parts[0]
-
-                if 'Adj Close' in df_quant.columns:
-                    current_prices = df_quant[["Adj Close"]].rename(columns={"Adj Close": ticker_name})
-                    if all_prices.empty:
-                        all_prices = current_prices
-                    else:
-                        all_prices = all_prices.join(current_prices, how='outer')
-            except Exception as e:
-                print(f"Erro ao carregar dados quantitativos de {quant_file}: {e}")
-        else:
-            print(f"Arquivo não encontrado: {quant_file} para o stem {stem}")
-    
     if not all_prices.empty:
-        all_prices.fillna(method='ffill', inplace=True)
-        all_prices.dropna(inplace=True) 
+        # Preenche apenas lacunas dentro de cada série; o período antes do início de uma série
+        # continua NaN (o histórico das demais não é descartado)
+        all_prices = all_prices.ffill().dropna(how="all")
     return all_prices
 
-def optimize_portfolio(prices_df, optimization_method="max_sharpe"):
-    """Otimiza a carteira usando o método especificado."""
+_COV_CACHE = {}
+_COV_CACHE_SIZE = 8
+
+def prices_version(prices_df):
+    """Digest do conteúdo do painel de preços (datas, tickers e valores), chave das estimativas memorizadas."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(prices_df, index=True).to_numpy().tobytes())
+    digest.update("|".join(map(str, prices_df.columns)).encode())
+    return digest.hexdigest()
+
+def estimate_inputs(prices_df, versao=None):
+    """(retornos esperados, covariância amostral) anualizados, memorizados pelo conteúdo do painel de preços.
+
+    Compartilhado pelos métodos de média-variância e pelos alocadores baseados em risco, de modo que trocar
+    de método (ou repetir a otimização) sobre os mesmos preços não recalcula a covariância. `versao` é o
+    `prices_version` do painel, quando o chamador já o calculou.
+    """
+    key = prices_version(prices_df) if versao is None else versao
+    if key in _COV_CACHE:
+        instrumentacao.anotar(cache_hit=True)
+        return _COV_CACHE[key]
+    instrumentacao.anotar(cache_hit=False)
+    with instrumentacao.medir_etapa("otimizacao.covariancia", ativos=len(prices_df.columns)):
+        inputs = (expected_returns.mean_historical_return(prices_df), risk_models.sample_cov(prices_df))
+    if len(_COV_CACHE) >= _COV_CACHE_SIZE:
+        _COV_CACHE.pop(next(iter(_COV_CACHE)))
+    _COV_CACHE[key] = inputs
+    return inputs
+
+# Modelos de retorno esperado: média histórica ou Black-Litterman (prior de mercado + preço-alvo dos analistas)
+RETURN_MODELS = ("historico", "black_litterman")
+
+def expected_inputs(prices_df, retornos="historico"):
+    """(retornos esperados, covariância) do modelo de retorno escolhido.
+
+    "black_litterman" parte da covariância amostral memorizada e usa o posterior de `black_litterman`
+    (visões dos insights coletados; o preço atual de reserva é o último fechamento do painel).
+    """
+    if retornos not in RETURN_MODELS:
+        raise ValueError(f"Modelo de retornos '{retornos}' inválido. Use um de {list(RETURN_MODELS)}.")
+    versao = prices_version(prices_df)
+    mu, S = estimate_inputs(prices_df, versao)
+    if retornos == "black_litterman":
+        black_litterman.DATA_DIR = DATA_DIR
+        mu, S, _ = black_litterman.posterior(S, last_prices=prices_df.ffill().iloc[-1], risk_free_rate=RISK_FREE_RATE,
+                                             versao=versao)
+    return mu, S
+
+# --- Alocadores baseados em risco (sem solver de QP) ---
+
+def inverse_volatility_weights(cov):
+    """Pesos proporcionais ao inverso da volatilidade de cada ativo."""
+    inv_vol = 1.0 / np.sqrt(np.diag(cov))
+    return inv_vol / inv_vol.sum()
+
+def hrp_weights(cov):
+    """Hierarchical Risk Parity (López de Prado): agrupamento hierárquico pela distância de correlação,
+    ordenação quase-diagonal e bissecção recursiva com alocação pelo inverso da variância de cada cluster."""
+    std = np.sqrt(np.diag(cov))
+    order = correlacao.cluster_order(cov / np.outer(std, std), method="single")
+
+    weights = np.ones(len(cov))
+    inv_var = 1.0 / np.diag(cov)
+    # Bissecção iterativa (pilha explícita; a recursão estoura com milhares de ativos)
+    stack = [order]
+    while stack:
+        cluster = stack.pop()
+        if len(cluster) < 2:
+            continue
+        half = len(cluster) // 2
+        left, right = cluster[:half], cluster[half:]
+        variances = []
+        for items in (left, right):
+            w = inv_var[items] / inv_var[items].sum()
+            variances.append(w @ cov[np.ix_(items, items)] @ w)
+        alpha = 1.0 - variances[0] / (variances[0] + variances[1])
+        weights[left] *= alpha
+        weights[right] *= 1.0 - alpha
+        stack.extend((left, right))
+    return weights / weights.sum()
+
+def equal_risk_contribution_weights(cov, budgets=None, max_iter=100, tol=1e-8):
+    """Paridade de risco (contribuições iguais, ou proporcionais a `budgets`) pelo método de Newton amortecido.
+
+    Resolve min ½xᵀΣx - Σ b_i log x_i (Spinu), estritamente convexo e auto-concordante: cada passo atualiza
+    o vetor inteiro com uma fatoração de Cholesky de Σ + diag(b/x²), e o amortecimento 1/(1+λ) mantém x > 0.
+    Converge quando toda contribuição de risco está a `tol` (relativo) do seu orçamento; se `max_iter`
+    acabar antes, avisa e devolve os pesos da última iteração.
+    """
+    n = len(cov)
+    budgets = np.full(n, 1.0 / n) if budgets is None else np.asarray(budgets, dtype=np.float64) / np.sum(budgets)
+    x = inverse_volatility_weights(cov)
+    x /= np.sqrt(x @ cov @ x)
+    converged = False
+    for iteration in range(1, max_iter + 1):
+        sigma_x = cov @ x
+        # No ótimo x_i (Σx)_i = b_i, com xᵀΣx = 1: as contribuições de risco já estão normalizadas
+        if np.max(np.abs(x * sigma_x / budgets - 1.0)) <= tol:
+            converged = True
+            break
+        gradient = sigma_x - budgets / x
+        hessian = cov + np.diag(budgets / (x * x))
+        step = scipy.linalg.cho_solve(scipy.linalg.cho_factor(hessian, check_finite=False), gradient, check_finite=False)
+        decrement = np.sqrt(max(float(gradient @ step), 0.0))
+        x = x - (step / (1.0 + decrement) if decrement > 0.25 else step)
+    instrumentacao.anotar(iteracoes_erc=iteration, convergiu=converged)
+    if not converged:
+        deviation = np.max(np.abs(risk_contributions(x, cov) / budgets - 1.0))
+        print(f"AVISO: paridade de risco não convergiu em {max_iter} iterações "
+              f"(desvio máximo das contribuições de risco: {deviation:.2%}).")
+    return x / x.sum()
+
+ALLOCATORS = {
+    "hrp": hrp_weights,
+    "risk_parity": equal_risk_contribution_weights,
+    "inverse_volatility": inverse_volatility_weights,
+}
+OPTIMIZATION_METHODS = ["max_sharpe", "min_volatility", *ALLOCATORS]
+
+def risk_contributions(weights, cov):
+    """Fração do risco total da carteira atribuída a cada ativo."""
+    marginal = cov @ weights
+    total = weights @ marginal
+    return weights * marginal / total
+
+def _allocate(prices_df, optimization_method, retornos="historico"):
+    """Otimização pelos alocadores de risco (HRP, paridade de risco, inverso da volatilidade).
+    Os pesos só dependem do risco; o modelo de retornos entra apenas no retorno esperado informado."""
+    try:
+        mu, S = expected_inputs(prices_df, retornos)
+    except Exception as e:
+        print(f"Erro ao calcular retornos esperados ou covariância: {e}")
+        return None, None
+    cov = S.to_numpy(dtype=np.float64)
+    with instrumentacao.medir_etapa("otimizacao.alocador", metodo=optimization_method, ativos=len(mu)):
+        weights = ALLOCATORS[optimization_method](cov)
+    ret = float(mu.to_numpy() @ weights)
+    vol = float(np.sqrt(weights @ cov @ weights))
+    cleaned_weights = {t: round(float(w), 5) for t, w in zip(S.columns, weights)}
+    return cleaned_weights, (ret, vol, (ret - RISK_FREE_RATE) / vol if vol > 0 else None)
+
+def optimize_portfolio(prices_df, optimization_method="max_sharpe", retornos="historico"):
+    """Otimiza a carteira usando o método especificado.
+    Métodos: "max_sharpe", "min_volatility" (média-variância, PyPortfolioOpt) e os alocadores de risco
+    "hrp", "risk_parity" e "inverse_volatility", que dispensam o solver e escalam para milhares de ativos.
+    `retornos`: "historico" (média histórica) ou "black_litterman" (ver `expected_inputs`)."""
     if prices_df.empty or len(prices_df.columns) < 2:
         print("Dados de preços insuficientes para otimização (necessário pelo menos 2 ativos).")
         return None, None
 
     print(f"\n--- Otimização de Carteira ({optimization_method}) ---")
-    
+    if optimization_method in ALLOCATORS:
+        return _allocate(prices_df, optimization_method, retornos)
+
     try:
-        mu = expected_returns.mean_historical_return(prices_df)
-        S = risk_models.sample_cov(prices_df)
+        mu, S = expected_inputs(prices_df, retornos)
     except Exception as e:
         print(f"Erro ao calcular retornos esperados ou covariância: {e}")
         print(f"Verifique se há dados suficientes e se os preços são válidos. DataFrame de preços:\n{prices_df.info()}")
@@ -66,13 +224,15 @@ def optimize_portfolio(prices_df, optimization_method="max_sharpe"):
     if optimization_method == "max_sharpe":
         ef.add_objective(objective_functions.L2_reg, gamma=0.1) 
         try:
-            weights = ef.max_sharpe()
+            with instrumentacao.medir_etapa("otimizacao.pypfopt_solve", metodo=optimization_method, ativos=len(mu)):
+                weights = ef.max_sharpe()
         except Exception as e:
             print(f"Erro ao otimizar para max_sharpe: {e}")
             return None, None
     elif optimization_method == "min_volatility":
         try:
-            weights = ef.min_volatility()
+            with instrumentacao.medir_etapa("otimizacao.pypfopt_solve", metodo=optimization_method, ativos=len(mu)):
+                weights = ef.min_volatility()
         except Exception as e:
             print(f"Erro ao otimizar para min_volatility: {e}")
             return None, None
@@ -89,6 +249,330 @@ def optimize_portfolio(prices_df, optimization_method="max_sharpe"):
     
     return cleaned_weights, performance
 
+# --- Fronteira reamostrada (bootstrap dos retornos em pool de processos) ---
+
+def _solve_sample(returns, optimization_method, gamma):
+    """Pesos do método escolhido para uma amostra de retornos diários (mesmas estimativas do PyPortfolioOpt)."""
+    mu = np.expm1(np.log1p(returns).mean(axis=0) * TRADING_DAYS)
+    cov = np.cov(returns, rowvar=False) * TRADING_DAYS
+    if optimization_method in ALLOCATORS:
+        return ALLOCATORS[optimization_method](cov)
+    ef = EfficientFrontier(mu, cov)
+    with warnings.catch_warnings():
+        # O aviso do PyPortfolioOpt sobre objetivos extras no max_sharpe se repetiria a cada amostra
+        warnings.simplefilter("ignore", UserWarning)
+        if optimization_method == "max_sharpe":
+            ef.add_objective(objective_functions.L2_reg, gamma=gamma)
+            ef.max_sharpe()
+        else:
+            ef.min_volatility()
+    return np.array(list(ef.clean_weights().values()), dtype=np.float64)
+
+def _resampled_task(painel, task):
+    """Tarefa do pool: resolve um lote de amostras bootstrap lendo os retornos da memória compartilhada."""
+    optimization_method, seeds, block_size, gamma = task
+    returns = painel.valores("retornos")
+    n_obs = len(returns)
+    results = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        # Bootstrap por blocos móveis (block_size=1 é o bootstrap simples de dias)
+        starts = rng.integers(0, n_obs - block_size + 1, size=-(-n_obs // block_size))
+        rows = (starts[:, None] + np.arange(block_size)).ravel()[:n_obs]
+        try:
+            results.append(_solve_sample(returns[rows], optimization_method, gamma))
+        except Exception:
+            results.append(None)
+    return results
+
+@instrumentacao.instrumentado("otimizacao.reamostrada")
+def optimize_portfolio_resampled(prices_df, optimization_method="max_sharpe", n_amostras=300, min_amostras=50,
+                                 lote=None, tolerancia=0.002, tamanho_bloco=1, max_workers=None, seed=42, gamma=0.1):
+    """Otimização reamostrada (Michaud): média dos pesos ótimos de `n_amostras` reamostragens dos retornos.
+
+    Os retornos diários são publicados uma única vez em memória compartilhada; cada worker do pool
+    resolve lotes de amostras. Entre um lote e outro a média é comparada com a anterior e, a partir de
+    `min_amostras`, a execução para quando nenhum peso médio varia mais que `tolerancia`.
+    `max_workers=1` resolve no próprio processo (sem pool).
+
+    Retorna (pesos médios, performance com as estimativas da amostra completa, detalhes), onde detalhes
+    traz a dispersão de cada peso (desvio, percentis 5/95, fração de amostras com peso > 0) e o histórico
+    de convergência.
+    """
+    if prices_df.empty or len(prices_df.columns) < 2:
+        print("Dados de preços insuficientes para otimização (necessário pelo menos 2 ativos).")
+        return None, None, None
+    if optimization_method not in OPTIMIZATION_METHODS:
+        print(f"Método de otimização '{optimization_method}' não suportado.")
+        return None, None, None
+
+    returns = prices_df.pct_change(fill_method=None).iloc[1:]
+    complete = returns.dropna(how="any")
+    if len(complete) < len(returns):
+        print(f"Reamostragem usa apenas os {len(complete)} dias com retorno de todos os ativos (de {len(returns)}).")
+    if len(complete) < 2 * len(prices_df.columns) or len(complete) < 30:
+        print("Histórico comum insuficiente para reamostrar os retornos.")
+        return None, None, None
+
+    print(f"\n--- Otimização Reamostrada ({optimization_method}, até {n_amostras} amostras) ---")
+    start = time.perf_counter()
+    workers = max_workers or os.cpu_count() or 1
+    lote = lote or max(workers * 4, 16)
+    seeds = np.random.SeedSequence(seed).generate_state(n_amostras).tolist()
+    # Cada tarefa leva algumas sementes (menos ida e volta entre processos); um lote do pool = `lote` amostras
+    per_task = max(1, -(-lote // workers))
+    tasks = [(optimization_method, seeds[i:i + per_task], tamanho_bloco, gamma) for i in range(0, n_amostras, per_task)]
+    samples = []
+    history = []
+    state = {"falhas": 0, "media": None, "convergiu": False}
+
+    def parar(outcomes):
+        """Acumula as amostras do lote e compara a média com a do lote anterior."""
+        for result in (w for chunk in outcomes for w in chunk):
+            if result is None:
+                state["falhas"] += 1
+            else:
+                samples.append(result)
+        if not samples:
+            return False
+        mean = np.mean(samples, axis=0)
+        change = None if state["media"] is None else float(np.max(np.abs(mean - state["media"])))
+        history.append({"amostras": len(samples), "variacao_max": change})
+        state["media"] = mean
+        state["convergiu"] = change is not None and len(samples) >= min_amostras and change <= tolerancia
+        return state["convergiu"]
+
+    with painel_compartilhado.PainelCompartilhado.publicar({"retornos": complete}) as painel:
+        painel_compartilhado.map_em_paralelo(_resampled_task, tasks, painel, max_workers=workers,
+                                             lote=min(workers, len(tasks)), parar=parar)
+    failures, converged = state["falhas"], state["convergiu"]
+
+    elapsed = time.perf_counter() - start
+    instrumentacao.anotar(amostras=len(samples), falhas=failures, convergiu=converged)
+    if not samples:
+        print(f"Nenhuma amostra resolvida ({failures} falhas).")
+        return None, None, None
+
+    tickers = list(prices_df.columns)
+    weights_matrix = np.vstack(samples)
+    mean_weights = weights_matrix.mean(axis=0)
+    mean_weights = mean_weights / mean_weights.sum()
+    dispersao = pd.DataFrame({
+        "peso_medio": mean_weights,
+        "desvio": weights_matrix.std(axis=0, ddof=1) if len(samples) > 1 else np.nan,
+        "p05": np.percentile(weights_matrix, 5, axis=0),
+        "p95": np.percentile(weights_matrix, 95, axis=0),
+        "frac_investido": (weights_matrix > WEIGHT_TOLERANCE).mean(axis=0),
+    }, index=pd.Index(tickers, name="ticker"))
+
+    mu, S = estimate_inputs(prices_df)
+    ret = float(mu.reindex(tickers).to_numpy() @ mean_weights)
+    vol = float(np.sqrt(mean_weights @ S.reindex(index=tickers, columns=tickers).to_numpy() @ mean_weights))
+    performance = (ret, vol, (ret - RISK_FREE_RATE) / vol if vol > 0 else None)
+    detalhes = {"dispersao": dispersao, "amostras": len(samples), "falhas": failures, "convergiu": converged,
+                "historico": history, "tempo_s": elapsed, "workers": workers}
+    print(f"{len(samples)} amostras ({failures} falhas) em {elapsed:.2f}s com {workers} processos; "
+          f"{'convergiu' if converged else 'sem convergência dentro do limite'}")
+    cleaned_weights = {t: round(float(w), 5) for t, w in zip(tickers, mean_weights)}
+    return cleaned_weights, performance, detalhes
+
+def sector_map(tickers):
+    """Setor de cada ticker segundo a tabela do universo (campo de setor dos insights)."""
+    return {t: universo.asset(t)["setor"] or SEM_SETOR for t in tickers}
+
+def factor_risk_model(prices_df, n_fatores=N_FATORES):
+    """Modelo de risco estatístico (PCA dos retornos diários): Σ ≈ GᵀG + diag(d), anualizado.
+
+    Retorna (G, d): G é (k x N) com as exposições já escaladas pela volatilidade de cada fator e d é a
+    variância específica de cada ativo. Com k << N o risco da carteira vira ||G w||² + Σ d_i w_i²,
+    formulação esparsa que o solver resolve em segundos para milhares de ativos.
+    """
+    returns = prices_df.pct_change(fill_method=None).iloc[1:].to_numpy(dtype=np.float64)
+    observed = ~np.isnan(returns)
+    counts = np.maximum(observed.sum(axis=0), 2)
+    demeaned = np.where(observed, returns - np.nanmean(np.where(observed, returns, np.nan), axis=0), 0.0)
+    variances = (demeaned ** 2).sum(axis=0) / (counts - 1) * TRADING_DAYS
+    k = max(1, min(n_fatores, demeaned.shape[0] - 1, demeaned.shape[1] - 1))
+    _, singular, vt = np.linalg.svd(demeaned, full_matrices=False)
+    factor_var = singular[:k] ** 2 / (demeaned.shape[0] - 1) * TRADING_DAYS
+    exposures = vt[:k] * np.sqrt(factor_var)[:, None]
+    specific = np.maximum(variances - (exposures ** 2).sum(axis=0), 1e-6 * np.maximum(variances, 1e-12))
+    return exposures, specific
+
+def _weight_bounds(value, tickers, default):
+    """Limite por ativo a partir de um número (igual para todos) ou dict {ticker: limite}."""
+    if value is None:
+        return np.full(len(tickers), default, dtype=np.float64)
+    if isinstance(value, dict):
+        return np.array([value.get(t, default) for t in tickers], dtype=np.float64)
+    return np.full(len(tickers), float(value), dtype=np.float64)
+
+def _solve_constrained(mu, exposures, specific, metodo, lower, upper, selected, sector_matrix, sector_caps,
+                       w0, turnover_max, turnover_outside, gamma, risk_free_rate):
+    """Monta e resolve o problema convexo só com os ativos `selected`; retorna (pesos, status, solver, tempo do solver).
+
+    Os ativos fora da seleção ficam com peso zero (e, se havia posição atual neles, contam no giro)."""
+    idx = np.flatnonzero(selected)
+    mu, exposures, specific, lower, upper = mu[idx], exposures[:, idx], specific[idx], lower[idx], upper[idx]
+    turnover_outside = turnover_outside + float(np.delete(w0, idx).sum())
+    w0 = w0[idx]
+    if sector_matrix is not None:
+        sector_matrix = sector_matrix[:, idx]
+    w = cp.Variable(len(idx))
+    # Max Sharpe é resolvido na forma homogênea (w = y / kappa), em que todas as restrições ficam lineares
+    kappa = cp.Variable(nonneg=True) if metodo == "max_sharpe" else 1.0
+    risk = cp.sum_squares(exposures @ w) + cp.sum_squares(cp.multiply(np.sqrt(specific), w))
+    if gamma:
+        risk = risk + gamma * cp.sum_squares(w)
+
+    constraints = [cp.sum(w) == kappa, w >= kappa * lower, w <= kappa * upper]
+    if sector_matrix is not None:
+        constraints.append(sector_matrix @ w <= kappa * sector_caps)
+    if turnover_max is not None:
+        constraints.append(cp.norm1(w - kappa * w0) + kappa * turnover_outside <= kappa * turnover_max)
+    if metodo == "max_sharpe":
+        constraints.append((mu - risk_free_rate) @ w == 1)
+
+    problem = cp.Problem(cp.Minimize(risk), constraints)
+    try:
+        problem.solve(solver=SOLVER)
+    except cp.error.SolverError as e:
+        return None, f"erro: {e}", None, None
+    stats = problem.solver_stats
+    if problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE) or w.value is None:
+        return None, problem.status, stats.solver_name, stats.solve_time
+    weights = np.zeros(len(selected))
+    weights[idx] = w.value / (kappa.value if metodo == "max_sharpe" else 1.0)
+    weights = np.where(weights > WEIGHT_TOLERANCE, weights, 0.0)
+    return weights / weights.sum(), problem.status, stats.solver_name, stats.solve_time
+
+@instrumentacao.instrumentado("otimizacao.restrita")
+def optimize_portfolio_constrained(prices_df, optimization_method="max_sharpe", setores=None, limites_setor=None,
+                                   peso_min=None, peso_max=None, pesos_atuais=None, turnover_max=None, max_ativos=None,
+                                   n_fatores=N_FATORES, gamma=0.1, risk_free_rate=RISK_FREE_RATE, retornos="historico",
+                                   valor_carteira=None, limite_adv=None, moeda="BRL"):
+    """Otimização com restrições de setor, peso, giro e cardinalidade sobre um modelo de risco por fatores.
+
+    - `setores`: {ticker: setor}; por padrão vem do universo (campo de setor dos insights).
+    - `limites_setor`: teto de peso por setor, número (todos os setores) ou {setor: teto}.
+    - `peso_min`/`peso_max`: limites por ativo (número ou {ticker: limite}); o mínimo vale só para os
+      ativos mantidos na carteira.
+    - `turnover_max`: soma de |w - w_atual| permitida em relação a `pesos_atuais` ({ticker: peso});
+      posições atuais fora do universo contam como venda integral.
+    - `max_ativos`: limite de cardinalidade, tratado por heurística em duas passadas (solução relaxada,
+      seleção dos maiores pesos e nova otimização restrita a eles).
+    - `valor_carteira` (em `moeda`) + `limite_adv`: nenhuma posição passa de `limite_adv` x volume médio diário
+      em valor convertido para `moeda` (`liquidez.position_caps`); o teto vale junto com `peso_max`.
+
+    Métodos: "max_sharpe" (com regularização L2 `gamma`, como em `optimize_portfolio`) e "min_volatility".
+    `retornos="black_litterman"` troca a média histórica pelo posterior de Black-Litterman (o risco
+    continua vindo do modelo de fatores).
+    Retorna (pesos, performance, diagnostico); diagnostico traz status, solver e tempos, mesmo em falha.
+    """
+    diagnostico = {"metodo": optimization_method, "status": None, "solver": None, "tempo_solver_s": 0.0,
+                   "tempo_total_s": None, "n_ativos": len(prices_df.columns), "n_fatores": None, "passadas": 0}
+    if prices_df.empty or len(prices_df.columns) < 2:
+        print("Dados de preços insuficientes para otimização (necessário pelo menos 2 ativos).")
+        return None, None, diagnostico
+    if optimization_method not in ("max_sharpe", "min_volatility"):
+        print(f"Método de otimização '{optimization_method}' não suportado.")
+        return None, None, diagnostico
+
+    start = time.perf_counter()
+    print(f"\n--- Otimização Restrita ({optimization_method}, {len(prices_df.columns)} ativos) ---")
+    tickers = list(prices_df.columns)
+    try:
+        if retornos == "black_litterman":
+            mu = expected_inputs(prices_df, retornos)[0].reindex(tickers).to_numpy(dtype=np.float64)
+        else:
+            mu = expected_returns.mean_historical_return(prices_df).reindex(tickers).to_numpy(dtype=np.float64)
+        gamma_eff = gamma if optimization_method == "max_sharpe" else 0.0
+        with instrumentacao.medir_etapa("otimizacao.modelo_fatores", ativos=len(tickers)):
+            exposures, specific = factor_risk_model(prices_df, n_fatores)
+    except Exception as e:
+        print(f"Erro ao calcular retornos esperados ou modelo de risco: {e}")
+        return None, None, diagnostico
+    diagnostico["n_fatores"] = exposures.shape[0]
+    if optimization_method == "max_sharpe" and not (mu > risk_free_rate).any():
+        print("Nenhum ativo com retorno esperado acima da taxa livre de risco; use 'min_volatility'.")
+        diagnostico["status"] = "infeasible"
+        return None, None, diagnostico
+
+    lower = _weight_bounds(peso_min, tickers, 0.0)
+    upper = _weight_bounds(peso_max, tickers, 1.0)
+    if valor_carteira and limite_adv:
+        liquidez.DATA_DIR = DATA_DIR
+        adv_caps = liquidez.position_caps(tickers, valor_carteira, limite_adv, moeda=moeda)
+        upper = np.minimum(upper, _weight_bounds(adv_caps, tickers, 1.0))
+        diagnostico["limites_adv"] = adv_caps
+        if upper.sum() < 1.0 - 1e-9:
+            print(f"Os tetos de liquidez somam {upper.sum():.1%}: a carteira de {moeda} {valor_carteira:,.0f} não cabe em "
+                  f"{limite_adv:.0%} do ADV desses ativos.")
+            diagnostico["status"] = "infeasible"
+            return None, None, diagnostico
+
+    sector_matrix = sector_caps = None
+    if limites_setor is not None:
+        setores = setores or sector_map(tickers)
+        labels = [setores.get(t) or SEM_SETOR for t in tickers]
+        names = sorted(set(labels))
+        caps = np.array([limites_setor.get(s, 1.0) if isinstance(limites_setor, dict) else float(limites_setor) for s in names])
+        rows = np.array([names.index(label) for label in labels])
+        sector_matrix = sparse.csr_matrix((np.ones(len(tickers)), (rows, np.arange(len(tickers)))), shape=(len(names), len(tickers)))
+        sector_caps = caps
+        diagnostico["setores"] = dict(zip(names, caps.tolist()))
+
+    w0 = np.zeros(len(tickers))
+    turnover_outside = 0.0
+    if pesos_atuais:
+        w0 = np.array([pesos_atuais.get(t, 0.0) for t in tickers], dtype=np.float64)
+        turnover_outside = float(sum(v for t, v in pesos_atuais.items() if t not in prices_df.columns))
+    elif turnover_max is not None:
+        print("Limite de giro ignorado: pesos atuais não informados.")
+        turnover_max = None
+
+    # 1ª passada: problema relaxado (sem mínimo por ativo e sem cardinalidade)
+    selected = np.ones(len(tickers), dtype=bool)
+    args = (mu, exposures, specific, optimization_method)
+    weights, status, solver, solve_time = _solve_constrained(*args, np.zeros(len(tickers)), upper, selected, sector_matrix,
+                                                             sector_caps, w0, turnover_max, turnover_outside, gamma_eff, risk_free_rate)
+    diagnostico.update(status=status, solver=solver, tempo_solver_s=solve_time or 0.0, passadas=1)
+
+    # 2ª passada: seleciona os maiores pesos e aplica o mínimo por ativo apenas a eles
+    needs_second = weights is not None and (max_ativos is not None or (lower > 0).any())
+    if needs_second:
+        held = np.flatnonzero(weights > WEIGHT_TOLERANCE)
+        order = held[np.argsort(-weights[held])]
+        limit = len(order) if max_ativos is None else int(max_ativos)
+        if (lower > 0).any():
+            # Sem espaço para o mínimo de todos: mantém só os que cabem no orçamento de 100%
+            fits = np.cumsum(lower[order]) <= 1.0 + 1e-9
+            limit = min(limit, int(fits.sum()))
+        selected = np.zeros(len(tickers), dtype=bool)
+        selected[order[:limit]] = True
+        weights, status, solver, solve_time = _solve_constrained(*args, lower, upper, selected, sector_matrix, sector_caps,
+                                                                 w0, turnover_max, turnover_outside, gamma_eff, risk_free_rate)
+        diagnostico.update(status=status, solver=solver, passadas=2,
+                           tempo_solver_s=diagnostico["tempo_solver_s"] + (solve_time or 0.0))
+
+    diagnostico["tempo_total_s"] = time.perf_counter() - start
+    instrumentacao.anotar(ativos=len(tickers), status=status, solver=solver, tempo_solver_s=diagnostico["tempo_solver_s"])
+    if weights is None:
+        print(f"Otimização restrita sem solução (status: {status}). Verifique se as restrições são compatíveis.")
+        return None, None, diagnostico
+
+    ret = float(mu @ weights)
+    vol = float(np.sqrt((exposures @ weights) @ (exposures @ weights) + specific @ weights ** 2))
+    performance = (ret, vol, (ret - risk_free_rate) / vol if vol > 0 else None)
+    diagnostico["n_posicoes"] = int((weights > 0).sum())
+    diagnostico["turnover"] = float(np.abs(weights - w0).sum() + turnover_outside) if pesos_atuais else None
+    if sector_matrix is not None:
+        diagnostico["exposicao_setor"] = dict(zip(diagnostico["setores"], (sector_matrix @ weights).round(6).tolist()))
+    print(f"Status: {status} ({solver}), solver {diagnostico['tempo_solver_s']:.3f}s, total {diagnostico['tempo_total_s']:.3f}s, "
+          f"{diagnostico['n_posicoes']} posições")
+    cleaned_weights = {t: round(float(w), 5) for t, w in zip(tickers, weights)}
+    return cleaned_weights, performance, diagnostico
+
 def calculate_return_confidence_interval(expected_annual_return, annual_volatility, confidence_level=0.95):
     """Calcula o intervalo de confiança para o retorno anualizado."""
     if expected_annual_return is None or annual_volatility is None:
@@ -102,8 +586,11 @@ def calculate_return_confidence_interval(expected_annual_return, annual_volatili
     
     return lower_bound, upper_bound
 
-def suggest_contributions(current_portfolio_value, current_weights, optimal_weights, new_contribution_amount):
-    """Sugere aportes para alcançar os pesos ótimos."""
+def suggest_contributions(current_portfolio_value, current_weights, optimal_weights, new_contribution_amount,
+                          limites_compra=None):
+    """Sugere aportes para alcançar os pesos ótimos.
+    `limites_compra` ({ticker: valor máximo}, ex: `liquidez.purchase_caps`) limita a compra de cada ativo;
+    o que não couber nos limites fica sem alocação."""
     print("\n--- Sugestão de Aportes --- ")
     if not current_weights or not optimal_weights:
         print("Pesos atuais ou ótimos não fornecidos.")
@@ -120,10 +607,15 @@ def suggest_contributions(current_portfolio_value, current_weights, optimal_weig
         optimal_value_ticker = total_new_value * optimal_weights.get(ticker, 0)
         current_value_ticker = current_portfolio_value * current_weights.get(ticker, 0)
         contribution_needed = optimal_value_ticker - current_value_ticker
+        if limites_compra and ticker in limites_compra and contribution_needed > limites_compra[ticker]:
+            print(f"  {ticker}: compra limitada pela liquidez a R${limites_compra[ticker]:.2f} (sugerido R${contribution_needed:.2f})")
+            contribution_needed = limites_compra[ticker]
         suggestions[ticker] = contribution_needed
         print(f"  {ticker}: Aportar R${contribution_needed:.2f} (Valor alvo: R${optimal_value_ticker:.2f}, Valor atual: R${current_value_ticker:.2f})")
     
     print(f"Soma dos aportes sugeridos: R${sum(suggestions.values()):.2f}")
+    if limites_compra:
+        print(f"Valor não alocado por limite de liquidez: R${new_contribution_amount - sum(suggestions.values()):.2f}")
     return suggestions
 
 if __name__ == "__main__":
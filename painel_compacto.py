@@ -0,0 +1,190 @@
+"""Modo compacto de carga do painel: só as colunas pedidas, tipos reduzidos e iteração em lotes de tickers.
+
+- Preços e indicadores em float32 (erro relativo de arredondamento <= 2**-24 por valor).
+- Volume em int32 (ou int64 se não couber; tipos anuláveis quando há lacunas).
+- Formato longo (Timestamp, ticker, colunas...) com o ticker categórico; `to_wide` monta o painel
+  datas x tickers com colunas categóricas.
+- `iter_universe_chunks` percorre o universo em lotes cujo tamanho estimado cabe no orçamento de memória,
+  de modo que cálculos sobre o universo inteiro (`map_universe`) não carregam todos os arquivos de uma vez.
+"""
+import os
+import numpy as np
+import pandas as pd
+import instrumentacao
+import universo
+
+DATA_DIR = "."
+PRICE_DTYPE = np.float32
+VOLUME_COLUMN = "Volume"
+MEMORY_BUDGET_MB = 256
+# Pico de memória do read_csv em relação ao resultado (buffers do parser e conversão de datas)
+PARSE_OVERHEAD = 3.0
+# Tolerâncias verificadas no modo compacto em relação à carga float64
+PRICE_RTOL = 2.0 ** -24
+RETURN_ATOL = 1e-6
+
+def downcast_volume(volume):
+    """Volume como inteiro do menor tipo que comporta o máximo (anulável se houver lacunas)."""
+    values = volume.to_numpy(dtype=float)
+    finite = values[np.isfinite(values)]
+    fits_int32 = finite.size == 0 or np.abs(finite).max() <= np.iinfo(np.int32).max
+    if np.isnan(values).any():
+        return volume.round().astype("Int32" if fits_int32 else "Int64")
+    return volume.round().astype(np.int32 if fits_int32 else np.int64)
+
+def read_compact(path, columns=("Adj Close",)):
+    """Lê só `columns` de um arquivo _chart/_quant_analysis, com preços/indicadores em float32 e volume inteiro.
+
+    O índice é normalizado para a data do pregão (sem hora/fuso), como em `calendario_mercado`.
+    """
+    columns = list(columns)
+    dtypes = {c: PRICE_DTYPE for c in columns if c != VOLUME_COLUMN}
+    df = pd.read_csv(path, usecols=["Timestamp", *columns], dtype=dtypes, index_col="Timestamp", parse_dates=True)
+    instrumentacao.anotar_arquivo_lido(path)
+    if VOLUME_COLUMN in df.columns:
+        df[VOLUME_COLUMN] = downcast_volume(df[VOLUME_COLUMN])
+    return _normalize_index(df)
+
+def _normalize_index(df):
+    index = pd.DatetimeIndex(df.index)
+    df.index = (index.tz_localize(None) if index.tz is not None else index).normalize()
+    df.index.name = "Timestamp"
+    return df[~df.index.duplicated(keep="last")]
+
+@instrumentacao.instrumentado("painel.compacto")
+def load_compact_panel(ticker_stems, columns=("Adj Close",), tipo="chart", data_dir=None):
+    """Painel no formato longo (Timestamp, ticker, *columns) com o ticker categórico.
+
+    Os tickers seguem o formato do yfinance (ex: "PETR4.SA"); stems sem arquivo são ignorados com aviso.
+    """
+    frames, tickers = [], []
+    for stem in dict.fromkeys(ticker_stems):
+        path = universo.file_path(stem, tipo, DATA_DIR if data_dir is None else data_dir)
+        if not os.path.exists(path):
+            print(f"Arquivo não encontrado: {path} para o stem {stem}")
+            continue
+        try:
+            frames.append(read_compact(path, columns))
+        except Exception as e:
+            print(f"Erro ao carregar {list(columns)} de {path}: {e}")
+            continue
+        tickers.append(universo.ticker_of(stem))
+    if not frames:
+        return pd.DataFrame(columns=["Timestamp", "ticker", *columns])
+    lengths = np.array([len(f) for f in frames])
+    long_panel = pd.concat(frames).reset_index()
+    # Códigos do categórico montados direto (sem materializar uma string por linha)
+    codes = np.repeat(np.arange(len(tickers), dtype=np.int32), lengths)
+    long_panel.insert(1, "ticker", pd.Categorical.from_codes(codes, categories=tickers))
+    instrumentacao.anotar(tickers=len(tickers), linhas=len(long_panel), memoria_mb=round(memory_usage_mb(long_panel), 2))
+    return long_panel
+
+def to_wide(long_panel, column="Adj Close"):
+    """Painel datas x tickers (float32, colunas categóricas) a partir do formato longo."""
+    dates, date_codes = np.unique(long_panel["Timestamp"].to_numpy(), return_inverse=True)
+    ticker_codes = long_panel["ticker"].cat.codes.to_numpy()
+    categories = long_panel["ticker"].cat.categories
+    values = long_panel[column].to_numpy(dtype=PRICE_DTYPE, na_value=np.nan)
+    wide = np.full((len(dates), len(categories)), np.nan, dtype=PRICE_DTYPE)
+    wide[date_codes, ticker_codes] = values
+    return pd.DataFrame(wide, index=pd.DatetimeIndex(dates, name="Timestamp"),
+                        columns=pd.CategoricalIndex(categories, categories=categories, name="ticker"))
+
+def memory_usage_mb(df):
+    """Memória ocupada pelo DataFrame (incluindo índice e categorias), em MB."""
+    return df.memory_usage(index=True, deep=True).sum() / 2 ** 20
+
+def _bytes_per_row(columns):
+    """Bytes por linha do formato longo: data (8), código do ticker (4) e as colunas compactas."""
+    return 8 + 4 + sum(8 if c == VOLUME_COLUMN else np.dtype(PRICE_DTYPE).itemsize for c in columns)
+
+def _rows_per_byte(path, sample_bytes=65536):
+    """Linhas por byte do CSV estimadas pelo início do arquivo (evita ler o arquivo inteiro)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    n_lines = max(sample.count(b"\n") - 1, 1)
+    return n_lines / max(len(sample), 1)
+
+def plan_chunks(ticker_stems, columns=("Adj Close",), tipo="chart", memory_budget_mb=MEMORY_BUDGET_MB, data_dir=None):
+    """Divide os stems em lotes consecutivos cuja memória estimada (tamanho do CSV x densidade de linhas) cabe no orçamento."""
+    data_dir = DATA_DIR if data_dir is None else data_dir
+    paths = [universo.file_path(stem, tipo, data_dir) for stem in ticker_stems]
+    existing = [p for p in paths if os.path.exists(p)]
+    if not existing:
+        return [list(ticker_stems)] if ticker_stems else []
+    rows_per_byte = _rows_per_byte(existing[0])
+    budget = memory_budget_mb * 2 ** 20
+    row_bytes = _bytes_per_row(columns) * PARSE_OVERHEAD
+    chunks, current, current_bytes = [], [], 0.0
+    for stem, path in zip(ticker_stems, paths):
+        estimate = os.path.getsize(path) * rows_per_byte * row_bytes if os.path.exists(path) else 0.0
+        if current and current_bytes + estimate > budget:
+            chunks.append(current)
+            current, current_bytes = [], 0.0
+        current.append(stem)
+        current_bytes += estimate
+    if current:
+        chunks.append(current)
+    return chunks
+
+def iter_universe_chunks(ticker_stems=None, columns=("Adj Close",), tipo="chart", memory_budget_mb=MEMORY_BUDGET_MB,
+                         data_dir=None):
+    """Gera (stems_do_lote, painel_longo_compacto) percorrendo o universo dentro do orçamento de memória.
+
+    Sem `ticker_stems`, usa todos os stems do universo com o arquivo `tipo` disponível.
+    """
+    if ticker_stems is None:
+        universo.DATA_DIR = DATA_DIR if data_dir is None else data_dir
+        ticker_stems = universo.stems_with(tipo)
+    for chunk in plan_chunks(ticker_stems, columns, tipo, memory_budget_mb, data_dir):
+        yield chunk, load_compact_panel(chunk, columns, tipo, data_dir)
+
+def map_universe(function, ticker_stems=None, columns=("Adj Close",), tipo="chart", memory_budget_mb=MEMORY_BUDGET_MB,
+                 data_dir=None):
+    """Aplica `function(painel_longo)` a cada lote e concatena os resultados (Series/DataFrame por ticker)."""
+    results = [function(panel) for _, panel in iter_universe_chunks(ticker_stems, columns, tipo, memory_budget_mb, data_dir)]
+    results = [r for r in results if r is not None and len(r)]
+    return pd.concat(results) if results else pd.Series(dtype=float)
+
+def check_tolerances(ticker_stems, columns=("Open", "High", "Low", "Close", "Adj Close", "Volume"), tipo="chart",
+                     data_dir=None):
+    """Compara a carga compacta com a carga float64 e retorna o erro máximo por ticker.
+
+    Colunas: erro_relativo_preco, erro_retorno, erro_volume e ok (dentro de PRICE_RTOL / RETURN_ATOL, volume exato).
+    """
+    data_dir = DATA_DIR if data_dir is None else data_dir
+    rows = {}
+    for stem in ticker_stems:
+        path = universo.file_path(stem, tipo, data_dir)
+        if not os.path.exists(path):
+            continue
+        compact = read_compact(path, columns)
+        full = _normalize_index(pd.read_csv(path, usecols=["Timestamp", *columns], index_col="Timestamp", parse_dates=True))
+        prices = [c for c in columns if c != VOLUME_COLUMN]
+        exact = full[prices].to_numpy(dtype=float)
+        approx = compact[prices].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_error = np.nanmax(np.abs(approx - exact) / np.abs(exact))
+            return_error = np.nanmax(np.abs(np.diff(approx, axis=0) / approx[:-1] - np.diff(exact, axis=0) / exact[:-1]))
+        volume_error = (float(np.nanmax(np.abs(compact[VOLUME_COLUMN].to_numpy(dtype=float) - full[VOLUME_COLUMN].round().to_numpy())))
+                        if VOLUME_COLUMN in columns else 0.0)
+        rows[universo.ticker_of(stem)] = {
+            "erro_relativo_preco": price_error, "erro_retorno": return_error, "erro_volume": volume_error,
+            "ok": bool(price_error <= PRICE_RTOL and return_error <= RETURN_ATOL and volume_error == 0),
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+if __name__ == "__main__":
+    stems = ["br_PETR4_SA", "us_AAPL"]
+    columns = ("Open", "High", "Low", "Close", "Adj Close", "Volume")
+    compact = load_compact_panel(stems, columns)
+    full = pd.concat({universo.ticker_of(s): pd.read_csv(universo.file_path(s, "chart"), index_col="Timestamp", parse_dates=True)
+                      for s in stems})
+    print(f"Memória: float64 com todas as colunas {memory_usage_mb(full):.2f} MB; compacto {memory_usage_mb(compact):.2f} MB")
+    print(compact.dtypes.to_string())
+    print(check_tolerances(stems, columns))
+    print(f"Painel largo: {to_wide(compact).shape}")
+    for chunk, panel in iter_universe_chunks(stems, memory_budget_mb=0.1):
+        print(f"Lote {chunk}: {len(panel)} linhas")
+    last_prices = map_universe(lambda panel: panel.groupby("ticker", observed=True)["Adj Close"].last(), stems, memory_budget_mb=0.1)
+    print(last_prices)
@@ -0,0 +1,247 @@
+import os
+import secrets
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+import calendario_mercado
+import instrumentacao
+
+DATA_DIR = "."
+SHM_PREFIX = "qf_"
+
+# Campos publicados por padrão a partir dos arquivos *_quant_analysis.csv
+DEFAULT_FIELDS = ("Adj Close", "SMA_50", "SMA_200", "RSI_14")
+
+def _create_block(array):
+    """Cria um bloco de memória compartilhada e copia `array` para ele (única cópia dos dados)."""
+    name = f"{SHM_PREFIX}{os.getpid()}_{secrets.token_hex(6)}"
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, {"shm": shm.name, "shape": list(array.shape), "dtype": array.dtype.str}
+
+def _attach_block(spec):
+    """Anexa um bloco existente sem registrá-lo no resource_tracker do processo leitor.
+
+    Sem isso, o tracker do worker removeria (unlink) o segmento quando o worker terminasse,
+    apagando os dados ainda em uso pelo dono e pelos outros workers. Registrar e depois remover o
+    registro também não serve: com 'fork' o tracker é o mesmo do dono, que perderia a proteção contra crash.
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=spec["shm"], track=False)  # Python 3.13+
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            shm = shared_memory.SharedMemory(name=spec["shm"])
+        finally:
+            resource_tracker.register = register
+    view = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+    view.flags.writeable = False
+    return shm, view
+
+def _release(blocks, unlink):
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # Ainda há views numpy apontando para o buffer; o SO libera o mapeamento ao fim do processo
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+class PainelCompartilhado:
+    """Painel (datas x tickers) com um array float64 por campo em memória compartilhada.
+
+    O processo dono publica os arrays uma única vez com `publicar(...)` e repassa aos workers apenas
+    o `descritor` (um dict pequeno e serializável). Os workers chamam `anexar(descritor)` e leem os
+    arrays sem cópia (somente leitura).
+
+    Limpeza: o dono remove os segmentos ao sair do bloco `with`, ao chamar `fechar()` ou quando o
+    objeto é coletado. Se o dono morrer, o resource_tracker do multiprocessing remove os segmentos;
+    se um worker morrer, nada vaza, pois os workers nunca são donos dos segmentos.
+    """
+
+    def __init__(self, descritor, blocks, arrays, owner):
+        self.descritor = descritor
+        self.owner = owner
+        self._arrays = arrays
+        self._blocks = blocks
+        self.index = pd.DatetimeIndex(arrays.pop("__index__").view("datetime64[ns]"), name=descritor["indice_nome"])
+        self.columns = pd.Index(descritor["colunas"])
+        self._finalizer = weakref.finalize(self, _release, blocks, owner)
+
+    @classmethod
+    def publicar(cls, frames):
+        """Publica um dict {campo: DataFrame} em memória compartilhada.
+
+        Todos os DataFrames são alinhados ao índice e às colunas do primeiro campo.
+        """
+        if not frames:
+            raise ValueError("Nenhum campo informado para publicar no painel compartilhado.")
+        reference = next(iter(frames.values()))
+        index = pd.DatetimeIndex(reference.index)
+        columns = reference.columns
+        blocks = []
+        arrays = {}
+        descritor = {"campos": {}, "colunas": [str(c) for c in columns], "indice_nome": index.name}
+        try:
+            shm, spec = _create_block(index.values.astype("datetime64[ns]").view(np.int64))
+            blocks.append(shm)
+            descritor["indice"] = spec
+            arrays["__index__"] = np.ndarray(tuple(spec["shape"]), dtype=np.int64, buffer=shm.buf)
+            for field, df in frames.items():
+                values = df.reindex(index=index, columns=columns).to_numpy(dtype=np.float64)
+                shm, spec = _create_block(np.ascontiguousarray(values))
+                blocks.append(shm)
+                descritor["campos"][field] = spec
+                arrays[field] = np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)
+        except Exception:
+            _release(blocks, unlink=True)
+            raise
+        return cls(descritor, blocks, arrays, owner=True)
+
+    @classmethod
+    def anexar(cls, descritor):
+        """Anexa (sem cópia) a um painel publicado por outro processo."""
+        blocks = []
+        arrays = {}
+        try:
+            shm, arrays["__index__"] = _attach_block(descritor["indice"])
+            blocks.append(shm)
+            for field, spec in descritor["campos"].items():
+                shm, arrays[field] = _attach_block(spec)
+                blocks.append(shm)
+        except Exception:
+            _release(blocks, unlink=False)
+            raise
+        return cls(descritor, blocks, arrays, owner=False)
+
+    @property
+    def campos(self):
+        return list(self.descritor["campos"])
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._arrays.values()) + self.index.values.nbytes
+
+    def valores(self, campo):
+        """Array numpy (datas x tickers) do campo, apontando diretamente para a memória compartilhada."""
+        return self._arrays[campo]
+
+    def frame(self, campo):
+        """DataFrame do campo sem cópia dos dados (use `.copy()` antes de modificar)."""
+        return pd.DataFrame(self._arrays[campo], index=self.index, columns=self.columns, copy=False)
+
+    def ticker(self, ticker):
+        """DataFrame (datas x campos) de um único ticker, no formato dos arquivos quant_analysis."""
+        j = self.columns.get_loc(ticker)
+        return pd.DataFrame({campo: self._arrays[campo][:, j] for campo in self.campos}, index=self.index)
+
+    def fechar(self):
+        """Libera o mapeamento; no processo dono também remove os segmentos."""
+        self._arrays.clear()
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fechar()
+
+    def __repr__(self):
+        papel = "dono" if self.owner else "anexado"
+        return (f"PainelCompartilhado({len(self.index)} datas x {len(self.columns)} tickers, "
+                f"campos={self.campos}, {papel})")
+
+@instrumentacao.instrumentado("painel.publicar_quant_analysis")
+def publicar_quant_analysis(ticker_stems, campos=DEFAULT_FIELDS, how="union"):
+    """Carrega os campos dos arquivos quant_analysis alinhados ao calendário e os publica em memória compartilhada."""
+    calendario_mercado.DATA_DIR = DATA_DIR
+    frames = {}
+    for campo in campos:
+        panel = calendario_mercado.load_aligned_prices(ticker_stems, column=campo, how=how)
+        if not panel.empty:
+            frames[campo] = panel
+    return PainelCompartilhado.publicar(frames)
+
+# --- Pool de processos com o painel anexado uma vez por worker ---
+
+_WORKER_PANEL = None
+
+def _init_worker(descritor):
+    global _WORKER_PANEL
+    _WORKER_PANEL = PainelCompartilhado.anexar(descritor)
+
+def _run_task(function, task):
+    return function(_WORKER_PANEL, task)
+
+def painel_do_worker():
+    """Painel anexado no processo worker atual (None fora de um pool criado por `criar_pool`)."""
+    return _WORKER_PANEL
+
+def criar_pool(painel, max_workers=None):
+    """ProcessPoolExecutor cujos workers anexam o painel na inicialização (o descritor é o único dado enviado)."""
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(painel.descritor,))
+
+def map_em_paralelo(function, tasks, painel, max_workers=None, lote=None, parar=None):
+    """Executa `function(painel, tarefa)` para cada tarefa em um pool de processos.
+
+    `function` precisa ser definida no nível de módulo (picklable). Apenas a tarefa e o resultado
+    trafegam entre processos; os arrays do painel são lidos da memória compartilhada.
+    Com `parar`, as tarefas são enviadas em lotes de `lote` (padrão: uma por worker) e, depois de cada
+    lote, `parar(resultados_do_lote)` decide se as restantes são descartadas (parada antecipada).
+    `max_workers=1` executa no próprio processo, sem pool. Retorna os resultados das tarefas executadas, em ordem.
+    """
+    tasks = list(tasks)
+    workers = max_workers or os.cpu_count() or 1
+    lote = len(tasks) if parar is None else (lote or workers)
+    results = []
+    with instrumentacao.medir_etapa("painel.map_em_paralelo", tarefas=len(tasks), funcao=getattr(function, "__qualname__", None)):
+        pool = criar_pool(painel, max_workers=workers) if workers > 1 else None
+        try:
+            for start in range(0, len(tasks), max(lote, 1)):
+                batch = tasks[start:start + lote]
+                if pool is None:
+                    outcomes = [function(painel, task) for task in batch]
+                else:
+                    outcomes = list(pool.map(_run_task, [function] * len(batch), batch))
+                results.extend(outcomes)
+                if parar is not None and parar(outcomes):
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        instrumentacao.anotar(executadas=len(results))
+    return results
+
+def _sma_crossover_total_return(painel, ticker):
+    """Exemplo de tarefa: retorno total de uma estratégia comprada quando SMA_50 > SMA_200."""
+    j = painel.columns.get_loc(ticker)
+    price = painel.valores("Adj Close")[:, j]
+    position = painel.valores("SMA_50")[:, j] > painel.valores("SMA_200")[:, j]
+    returns = np.diff(price) / price[:-1]
+    strategy = np.where(position[:-1], returns, 0.0)
+    return ticker, float(np.nanprod(1 + strategy) - 1)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2005-01-01", periods=5000, name="Timestamp")
+    tickers = [f"SYN{i:04d}" for i in range(200)]
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (len(dates), len(tickers))), axis=0)),
+                         index=dates, columns=tickers)
+    frames = {"Adj Close": close, "SMA_50": close.rolling(50).mean(), "SMA_200": close.rolling(200).mean()}
+
+    with PainelCompartilhado.publicar(frames) as painel:
+        print(painel, f"{painel.nbytes / 1e6:.1f} MB publicados")
+        resultados = map_em_paralelo(_sma_crossover_total_return, tickers[:8], painel, max_workers=2)
+        for ticker, total in resultados:
+            print(f"  {ticker}: retorno total {total:+.2%}")
+        nomes = [spec["shm"] for spec in painel.descritor["campos"].values()]
+    restantes = [n for n in nomes if os.path.exists(os.path.join("/dev/shm", n))]
+    print(f"Segmentos restantes após fechar: {restantes}")
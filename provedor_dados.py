@@ -0,0 +1,363 @@
+"""Camada de acesso aos provedores remotos (yfinance e APIs HTTP de séries macro).
+
+- Sessões persistentes: uma sessão curl_cffi compartilhada por todos os `yf.Ticker` (reutilizados por
+  símbolo) e uma `requests.Session` com pool de conexões para as APIs HTTP.
+- Cache em disco com TTL por tipo de endpoint (histórico diário, intradiário, info, macro). Ao expirar,
+  o histórico diário é atualizado incrementalmente (só os últimos pregões) e as respostas HTTP são
+  revalidadas com ETag/Last-Modified.
+- Modos (variável de ambiente QUANTFUND_PROVIDER_MODE):
+  "live" (padrão, com cache), "record" (live + grava cada resposta em REPLAY_DIR),
+  "replay" (somente as gravações, sem rede) e "off" (sem cache).
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+import yfinance as yf
+import eventos_corporativos
+import instrumentacao
+import universo
+
+DATA_DIR = "."
+CACHE_SUBDIR = "provider_cache"
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures_provedor")
+MODE = os.environ.get("QUANTFUND_PROVIDER_MODE", "live")
+MODES = ("live", "record", "replay", "off")
+
+# Validade do cache por tipo de endpoint (segundos)
+TTL_SECONDS = {
+    "historico": 12 * 3600,
+    "intradiario": 5 * 60,
+    "info": 24 * 3600,
+    "macro": 12 * 3600,
+}
+# Na atualização incremental do histórico, os últimos dias são buscados de novo (ajustes e barra parcial)
+REFRESH_OVERLAP_DAYS = 5
+# Respostas HTTP guardadas no cache além das 2xx: o 404 é a resposta "sem dados no período" do BCB SGS.
+# Erros de autenticação e de limite de requisições (401, 403, 429...) nunca são guardados.
+CACHEABLE_STATUS = {404}
+# Diferença relativa aceita entre o cache reajustado localmente e os pregões baixados de novo
+# (o Yahoo arredonda os fatores de ajuste)
+READJUST_RTOL = 1e-4
+
+class ReplayMissError(LookupError):
+    """Pedido sem gravação correspondente no modo replay."""
+
+_lock = threading.Lock()
+_yf_session = None
+_http_session = None
+_tickers = {}
+
+def _mode():
+    if MODE not in MODES:
+        raise ValueError(f"Modo de provedor '{MODE}' inválido. Use um de {MODES}.")
+    return MODE
+
+# --- Sessões ---
+
+def get_yf_session():
+    """Sessão curl_cffi compartilhada pelo yfinance (None se curl_cffi não estiver disponível)."""
+    global _yf_session
+    with _lock:
+        if _yf_session is None:
+            try:
+                from curl_cffi import requests as curl_requests
+            except ImportError:
+                return None
+            _yf_session = curl_requests.Session(impersonate="chrome")
+        return _yf_session
+
+def get_ticker(symbol):
+    """`yf.Ticker` reutilizado por símbolo (mesma sessão e mesmo estado de cookies/crumb)."""
+    with _lock:
+        ticker = _tickers.get(symbol)
+    if ticker is None:
+        session = get_yf_session()
+        ticker = yf.Ticker(symbol, session=session) if session is not None else yf.Ticker(symbol)
+        with _lock:
+            _tickers[symbol] = ticker
+    return ticker
+
+def get_http_session():
+    """Sessão HTTP (com cache/record/replay) usada pelos provedores macro; interface `get(url, params, timeout)`."""
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            _http_session = CachedHttpSession()
+        return _http_session
+
+# --- Armazenamento do cache e das gravações ---
+
+def _key(endpoint, symbol, params):
+    raw = json.dumps([endpoint, symbol, params], sort_keys=True, default=str)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    safe_symbol = "".join(c if c.isalnum() else "_" for c in str(symbol))[:60]
+    return f"{endpoint}_{safe_symbol}_{digest}"
+
+def _cache_path(key):
+    return os.path.join(DATA_DIR, CACHE_SUBDIR, f"{key}.pkl")
+
+def _replay_path(key):
+    return os.path.join(REPLAY_DIR, f"{key}.pkl")
+
+def _read_entry(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Erro ao ler entrada de cache {path}: {e}")
+        return None
+
+def _write_entry(path, entry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def _lookup(endpoint, symbol, params):
+    """(entrada_em_cache, fresca?) conforme o modo; no replay, a gravação ou ReplayMissError."""
+    key = _key(endpoint, symbol, params)
+    mode = _mode()
+    if mode == "replay":
+        entry = _read_entry(_replay_path(key))
+        if entry is None:
+            raise ReplayMissError(f"Sem gravação para {endpoint} {symbol} {params} ({_replay_path(key)})")
+        return entry, True
+    if mode == "off":
+        return None, False
+    entry = _read_entry(_cache_path(key))
+    fresh = entry is not None and time.time() - entry["obtido_em"] < TTL_SECONDS.get(endpoint, 0)
+    return entry, fresh
+
+def _store(endpoint, symbol, params, value, **extra):
+    key = _key(endpoint, symbol, params)
+    entry = {"valor": value, "obtido_em": time.time(), "endpoint": endpoint, "simbolo": symbol, "params": params, **extra}
+    mode = _mode()
+    if mode in ("live", "record"):
+        _write_entry(_cache_path(key), entry)
+    if mode == "record":
+        _write_entry(_replay_path(key), entry)
+    return entry
+
+# --- yfinance ---
+
+def _trim_to_period(df, period):
+    """Corta o histórico combinado ao tamanho do período pedido (ex: '5y', '6mo', '7d'; 'max' não corta)."""
+    if df.empty or not period or period in ("max", "ytd"):
+        return df
+    for suffix, unit in (("mo", "months"), ("y", "years"), ("d", "days")):
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            start = df.index.max() - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+            return df[df.index >= start]
+    return df
+
+def _readjust_locally(cached, recent):
+    """Combina o cache com os pregões recentes reaplicando ao trecho antigo só os eventos novos.
+
+    Retorna None se não houver provento/desdobramento novo ou se o cache reajustado não reproduzir, dentro de
+    READJUST_RTOL, os pregões baixados de novo (a divergência não é explicada só pelos eventos novos).
+    """
+    known = eventos_corporativos.extract_events(cached)
+    new_events = eventos_corporativos.extract_events(recent).merge(known, on=["data", "tipo", "valor"], how="left", indicator=True)
+    new_events = new_events[new_events["_merge"] == "left_only"].drop(columns="_merge")
+    overlap = cached.index.intersection(recent.index)
+    if new_events.empty or overlap.empty:
+        return None
+    adjusted = eventos_corporativos.apply_new_splits(cached, new_events[new_events["tipo"] == "desdobramento"])
+    # Fator de proventos calculado com os pregões novos no fim (fechamento anterior à data ex de eventos recentes)
+    combined = pd.concat([adjusted, recent[recent.index > adjusted.index.max()]])
+    dividend_factor = eventos_corporativos.cumulative_factor(combined.index, new_events, "dividendo", close=combined["Close"].to_numpy())
+    adjusted = adjusted.copy()
+    adjusted["Adj Close"] *= dividend_factor.to_numpy()[:len(adjusted)]
+    columns = [c for c in ("Close", "Adj Close") if c in recent.columns]
+    if not np.allclose(adjusted.loc[overlap, columns].to_numpy(dtype=float), recent.loc[overlap, columns].to_numpy(dtype=float),
+                       rtol=READJUST_RTOL, equal_nan=True):
+        return None
+    return pd.concat([adjusted[adjusted.index < recent.index.min()], recent])
+
+@instrumentacao.instrumentado("provedor.historico")
+def fetch_history(symbol, period="5y", interval="1d", **kwargs):
+    """`Ticker.history` com cache em disco.
+
+    Dentro do TTL devolve o cache; depois disso, se já houver histórico, busca só a partir dos últimos
+    `REFRESH_OVERLAP_DAYS` dias e combina com o que está em cache (atualização incremental). Com
+    `actions=True`, um provento/desdobramento novo é reaplicado localmente ao histórico em cache
+    (`eventos_corporativos`); sem as colunas de eventos, o período inteiro é baixado de novo.
+    """
+    endpoint = "historico" if interval in ("1d", "5d", "1wk", "1mo", "3mo") else "intradiario"
+    params = {"period": period, "interval": interval, **kwargs}
+    entry, fresh = _lookup(endpoint, symbol, params)
+    if entry is not None and fresh:
+        instrumentacao.anotar(cache_hit=True)
+        return entry["valor"].copy()
+    instrumentacao.anotar(cache_hit=False)
+
+    ticker = get_ticker(symbol)
+    cached = entry["valor"] if entry is not None else None
+    if cached is not None and not cached.empty and endpoint == "historico":
+        start = (cached.index.max() - pd.Timedelta(days=REFRESH_OVERLAP_DAYS)).strftime("%Y-%m-%d")
+        recent = ticker.history(start=start, interval=interval, **kwargs)
+        overlap = cached.index.intersection(recent.index)
+        if recent.empty:
+            data = cached
+        elif "Adj Close" in recent.columns and len(overlap) and not np.allclose(
+                cached.loc[overlap, "Adj Close"], recent.loc[overlap, "Adj Close"], rtol=1e-6, equal_nan=True):
+            # Novo provento/split reajustou o histórico: reaplica o evento localmente ou, sem eventos, baixa o período inteiro
+            readjusted = _readjust_locally(cached, recent) if kwargs.get("actions", True) else None
+            if readjusted is None:
+                data = ticker.history(period=period, interval=interval, **kwargs)
+            else:
+                data = _trim_to_period(readjusted[~readjusted.index.duplicated(keep="last")], period)
+            instrumentacao.anotar(reajuste_detectado=True, reajuste_local=readjusted is not None)
+        else:
+            data = pd.concat([cached[cached.index < recent.index.min()], recent])
+            data = _trim_to_period(data[~data.index.duplicated(keep="last")], period)
+        instrumentacao.anotar(incremental=True, linhas_novas=len(recent))
+    else:
+        data = ticker.history(period=period, interval=interval, **kwargs)
+    if not data.empty:
+        _store(endpoint, symbol, params, data)
+    return data.copy()
+
+@instrumentacao.instrumentado("provedor.info")
+def fetch_info(symbol):
+    """`Ticker.info` com cache em disco (TTL de 'info')."""
+    entry, fresh = _lookup("info", symbol, {})
+    if entry is not None and fresh:
+        instrumentacao.anotar(cache_hit=True)
+        return dict(entry["valor"])
+    instrumentacao.anotar(cache_hit=False)
+    info = get_ticker(symbol).info
+    if info:
+        _store("info", symbol, {}, dict(info))
+    return info
+
+def symbol_has_data(symbol):
+    """Verifica se o símbolo tem cotações, reaproveitando qualquer histórico já em cache antes de ir à rede."""
+    try:
+        entry, _ = _lookup("historico", symbol, {"period": "5y", "interval": "1d", "auto_adjust": False, "actions": True})
+    except ReplayMissError:
+        entry = None
+    if entry is not None and not entry["valor"].empty:
+        return True
+    return not fetch_history(symbol, period="5d", interval="1d").empty
+
+# --- HTTP (séries macro) ---
+
+class CachedResponse:
+    """Resposta HTTP servida do cache/gravação (subconjunto da interface de requests.Response)."""
+
+    def __init__(self, status_code, text, url):
+        self.status_code = status_code
+        self.text = text
+        self.url = url
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} para {self.url}", response=self)
+
+class CachedHttpSession:
+    """`requests.Session` com pool de conexões, cache com TTL e revalidação condicional (ETag/Last-Modified)."""
+
+    def __init__(self, endpoint="macro", pool_size=10):
+        self.endpoint = endpoint
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None, timeout=None):
+        params = dict(params or {})
+        with instrumentacao.medir_etapa("provedor.http", url=url.split("?")[0]):
+            entry, fresh = _lookup(self.endpoint, url, params)
+            if entry is not None and fresh:
+                instrumentacao.anotar(cache_hit=True)
+                return CachedResponse(entry["valor"]["status_code"], entry["valor"]["text"], url)
+            instrumentacao.anotar(cache_hit=False)
+
+            headers = {}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            response = self.session.get(url, params=params, timeout=timeout, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                # Conteúdo não mudou: renova a validade do cache sem baixar o corpo de novo
+                instrumentacao.anotar(revalidado=True)
+                _store(self.endpoint, url, params, entry["valor"], etag=entry.get("etag"), last_modified=entry.get("last_modified"))
+                return CachedResponse(entry["valor"]["status_code"], entry["valor"]["text"], url)
+            if response.status_code in CACHEABLE_STATUS or 200 <= response.status_code < 300:
+                _store(self.endpoint, url, params, {"status_code": response.status_code, "text": response.text},
+                       etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+            return response
+
+# --- Manutenção ---
+
+def clear_cache(endpoint=None):
+    """Remove as entradas do cache em disco (todas ou só as de um tipo de endpoint)."""
+    cache_dir = os.path.join(DATA_DIR, CACHE_SUBDIR)
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith(".pkl") and (endpoint is None or name.startswith(f"{endpoint}_")):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+def record_from_local_files(ticker_stems, data_dir=None):
+    """Cria gravações de replay a partir dos arquivos *_chart.csv e *_insights.json já coletados.
+
+    Permite exercitar o caminho de coleta inteiro sem rede (QUANTFUND_PROVIDER_MODE=replay).
+    """
+    data_dir = DATA_DIR if data_dir is None else data_dir
+    recorded = 0
+    for stem in ticker_stems:
+        symbol = universo.ticker_of(stem)
+        chart = os.path.join(data_dir, f"{stem}_chart.csv")
+        if os.path.exists(chart):
+            df = pd.read_csv(chart, index_col="Timestamp", parse_dates=True)
+            # As colunas de eventos (actions=True) vêm do armazenamento de eventos corporativos
+            events = eventos_corporativos.load_events(symbol)
+            for column, tipo in eventos_corporativos.ACTION_COLUMNS.items():
+                selected = events[events["tipo"] == tipo]
+                df[column] = pd.Series(selected["valor"].to_numpy(), index=pd.DatetimeIndex(selected["data"])).reindex(
+                    df.index.normalize()).fillna(0.0).to_numpy()
+            params = {"period": "5y", "interval": "1d", "auto_adjust": False, "actions": True}
+            entry = {"valor": df, "obtido_em": time.time(), "endpoint": "historico", "simbolo": symbol, "params": params}
+            _write_entry(_replay_path(_key("historico", symbol, params)), entry)
+            recorded += 1
+        insights = os.path.join(data_dir, f"{stem}_insights.json")
+        if os.path.exists(insights):
+            with open(insights, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            entry = {"valor": info, "obtido_em": time.time(), "endpoint": "info", "simbolo": symbol, "params": {}}
+            _write_entry(_replay_path(_key("info", symbol, {})), entry)
+            recorded += 1
+    return recorded
+
+if __name__ == "__main__":
+    import tempfile
+    REPLAY_DIR = tempfile.mkdtemp()
+    print(f"Gravações criadas a partir dos arquivos locais: {record_from_local_files(['br_PETR4_SA', 'us_AAPL'])}")
+    MODE = "replay"
+    hist = fetch_history("PETR4.SA", period="5y", interval="1d", auto_adjust=False, actions=True)
+    print(f"Replay do histórico de PETR4.SA: {len(hist)} pregões, último {hist.index.max()}")
+    print(f"Replay do info de AAPL: {sorted(fetch_info('AAPL'))[:5]}")
+    try:
+        fetch_info("XYZW.SA")
+    except ReplayMissError as e:
+        print(f"Sem gravação (esperado): {e}")
@@ -1,9 +1,31 @@
 import pandas as pd
+import numpy as np
 import json
 import os
+import dados_macro
+import instrumentacao
+import universo
 
 DATA_DIR = "."
 
+# Regras de pontuação (compartilhadas com a pesquisa de fatores, que as aplica ao painel histórico)
+RSI_OVERSOLD = 30
+RSI_OVERBOUGHT = 70
+RATING_SCORES = {"STRONG BUY": 2, "BUY": 2, "OUTPERFORM": 2, "HOLD": 0, "SELL": -1, "UNDERPERFORM": -1}
+
+def rsi_score(rsi):
+    """Pontos do RSI: +2 sobrevendido, -1 sobrecomprado, +1 caso contrário (escalar ou array)."""
+    return np.select([np.less(rsi, RSI_OVERSOLD), np.greater(rsi, RSI_OVERBOUGHT)], [2, -1], 1)
+
+def macro_regime_score(regime):
+    """Pontos do cenário macro do país: +1 positivo, -1 negativo."""
+    if "Positivo" in regime:
+        return 1
+    if "Negativo" in regime:
+        return -1
+    return 0
+
+@instrumentacao.instrumentado("io.dados_processados")
 def load_processed_data(ticker_stem):
     """Carrega dados quantitativos e fundamentalistas processados."""
     quant_file = os.path.join(DATA_DIR, f"{ticker_stem}_quant_analysis.csv")
@@ -15,6 +37,7 @@ def load_processed_data(ticker_stem):
     if os.path.exists(quant_file):
         try:
             df_quant = pd.read_csv(quant_file, index_col='Timestamp', parse_dates=True)
+            instrumentacao.anotar_arquivo_lido(quant_file)
         except Exception as e:
             print(f"Erro ao carregar dados quantitativos de {quant_file}: {e}")
             
@@ -22,34 +45,46 @@ def load_processed_data(ticker_stem):
         try:
             with open(insights_file, 'r') as f:
                 insights_data = json.load(f)
+            instrumentacao.anotar_arquivo_lido(insights_file)
         except Exception as e:
             print(f"Erro ao carregar insights de {insights_file}: {e}")
             
     return df_quant, insights_data
 
-def analyze_macro_scenario():
-    """Analisa o cenário macroeconômico (placeholder puro)."""
-    print("\n--- Análise de Cenário Macroeconômico (Placeholder) ---")
-    
-    macro_outlook = {
-        "BR": "Neutro",
-        "US": "Neutro",
-        "detail": "A coleta e análise de dados macroeconômicos detalhados não está implementada nesta versão. Usando outlook padrão."
-    }
-    
-    print(f"Cenário Macroeconômico (Placeholder): {macro_outlook}")
+def analyze_macro_scenario(atualizar=False):
+    """Analisa o cenário macroeconômico a partir dos scores de regime calculados em `dados_macro`.
+    Com `atualizar=True`, as séries do catálogo são atualizadas incrementalmente antes do cálculo.
+    """
+    print("\n--- Análise de Cenário Macroeconômico ---")
+    dados_macro.DATA_DIR = DATA_DIR
+    regimes = dados_macro.latest_country_regimes(atualizar=atualizar)
+
+    macro_outlook = {"BR": "Neutro", "US": "Neutro"}
+    scores = {}
+    for country, info in regimes.items():
+        macro_outlook[country] = info["regime"]
+        scores[country] = info["score"]
+    macro_outlook["scores"] = scores
+    if regimes:
+        datas = ", ".join(f"{c}: {info['data']}" for c, info in regimes.items())
+        macro_outlook["detail"] = f"Regimes calculados a partir das séries macro em cache (última observação - {datas})."
+    else:
+        macro_outlook["detail"] = "Nenhuma série macroeconômica em cache. Usando outlook neutro padrão."
+
+    print(f"Cenário Macroeconômico: {macro_outlook}")
     return macro_outlook
 
+@instrumentacao.instrumentado("recomendacoes.gerar")
 def generate_recommendations(tickers_stems, macro_scenario):
     """Gera recomendações com base em análises e cenário macro."""
     print("\n--- Geração de Recomendações ---")
     recommendations = []
 
     for stem in tickers_stems:
-        # Extrai ticker e país do stem. Ex: "br_PETR4_SA" -> ticker="PETR4.SA", country_code="BR"
-        parts = stem.split('_', 1)
-        country_code = parts[0].upper()
-        ticker_name = parts[1].replace('_', '.') if len(parts) > 1 else stem # Garante que o ticker seja reconstruído corretamente
+        # Ticker e país vêm da tabela do universo. Ex: "br_PETR4_SA" -> ticker="PETR4.SA", country_code="BR"
+        meta = universo.asset(stem)
+        country_code = meta["regiao"]
+        ticker_name = meta["ticker"]
         
         df_quant, insights = load_processed_data(stem)
         
@@ -77,14 +112,11 @@ def generate_recommendations(tickers_stems, macro_scenario):
         if rsi_col_found and not df_quant[rsi_col_found].empty:
             last_rsi = df_quant[rsi_col_found].iloc[-1]
             reasons.append(f"RSI ({rsi_col_found}) atual: {last_rsi:.2f}")
-            if last_rsi < 30:
-                recommendation_score += 2 
-                reasons.append("Ativo sobrevendido (RSI < 30)")
-            elif last_rsi > 70:
-                recommendation_score -= 1 
-                reasons.append("Ativo sobrecomprado (RSI > 70)")
-            else:
-                recommendation_score += 1 
+            recommendation_score += int(rsi_score(last_rsi))
+            if last_rsi < RSI_OVERSOLD:
+                reasons.append(f"Ativo sobrevendido (RSI < {RSI_OVERSOLD})")
+            elif last_rsi > RSI_OVERBOUGHT:
+                reasons.append(f"Ativo sobrecomprado (RSI > {RSI_OVERBOUGHT})")
         else:
             reasons.append("RSI não disponível ou dados vazios.")
         
@@ -93,22 +125,18 @@ def generate_recommendations(tickers_stems, macro_scenario):
         if insights and isinstance(insights.get("recommendation"), dict) and insights["recommendation"].get("rating"):
             rating = insights["recommendation"]["rating"].upper()
             reasons.append(f"Rating de Analistas: {rating}")
-            if rating in ["STRONG BUY", "BUY", "OUTPERFORM"]:
-                recommendation_score += 2
-            elif rating in ["SELL", "UNDERPERFORM"]:
-                recommendation_score -=1
-            elif rating == "HOLD":
-                recommendation_score +=0
+            recommendation_score += RATING_SCORES.get(rating, 0)
         else:
             reasons.append("Rating de analistas não disponível.")
         
         # Cenário Macroeconômico do País
         country_macro_outlook = macro_scenario.get(country_code, "Neutro")
-        reasons.append(f"Cenário Macro ({country_code}): {country_macro_outlook}")
-        if "Positivo" in country_macro_outlook:
-            recommendation_score += 1
-        elif "Negativo" in country_macro_outlook:
-            recommendation_score -= 1
+        country_macro_score = macro_scenario.get("scores", {}).get(country_code)
+        if country_macro_score is not None:
+            reasons.append(f"Cenário Macro ({country_code}): {country_macro_outlook} (score {country_macro_score:+.2f})")
+        else:
+            reasons.append(f"Cenário Macro ({country_code}): {country_macro_outlook}")
+        recommendation_score += macro_regime_score(country_macro_outlook)
 
         final_recommendation = "Manter/Neutro"
         if recommendation_score >= 3:
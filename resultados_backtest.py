@@ -0,0 +1,315 @@
+"""Armazenamento colunar dos resultados de backtest, para consultar e comparar milhares de execuções.
+
+Cada execução grava (append-only, um Parquet por lote em cada tabela):
+- execucoes/: uma linha por execução com os metadados (ticker, estratégia, parâmetros, modelo de custos,
+  versão dos dados) e todas as estatísticas numéricas do bt (daily_sharpe, cagr, max_drawdown, ...);
+- patrimonio/: curva de patrimônio no formato longo (run_id, data, valor);
+- posicoes/: peso e quantidade por ativo, só nas datas em que mudam (a série completa é reconstruída
+  com preenchimento para frente).
+
+O run_id é um hash de (ticker, estratégia, parâmetros, modelo de custos, versão dos dados); a versão dos
+dados é o hash do painel de preços usado e o modelo de custos é o `liquidez.cost_model` aplicado ({} sem
+custos). Repetir o mesmo backtest sobre os mesmos dados não duplica a execução.
+As consultas de execuções usam a tabela de metadados em memória (cacheada pelo mtime dos arquivos);
+curvas e posições são lidas só para os run_ids pedidos, com filtro aplicado na leitura do Parquet.
+"""
+import glob
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import estrategias
+import instrumentacao
+import visualizacao_graficos
+
+DATA_DIR = "."
+STORE_SUBDIR = "resultados_backtest"
+DEFAULT_METRIC = "daily_sharpe"
+
+EQUITY_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("data", pa.timestamp("ns")),
+    ("valor", pa.float64()),
+])
+
+POSITIONS_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("data", pa.timestamp("ns")),
+    ("ativo", pa.string()),
+    ("peso", pa.float64()),
+    ("quantidade", pa.float64()),
+])
+
+# Colunas de metadados; as estatísticas do bt vêm depois, uma coluna float64 por métrica
+RUN_COLUMNS = ["run_id", "criado_em", "ticker", "estrategia", "params", "custos", "versao_dados", "inicio", "fim", "pregoes"]
+
+_RUNS_CACHE = {}
+
+def _table_dir(tabela):
+    return os.path.join(DATA_DIR, STORE_SUBDIR, tabela)
+
+def _part_files(tabela):
+    return sorted(glob.glob(os.path.join(_table_dir(tabela), "part-*.parquet")))
+
+def data_version(price_data):
+    """Hash curto do painel de preços (índice e valores): muda se qualquer preço ou data mudar."""
+    hashed = pd.util.hash_pandas_object(price_data, index=True).to_numpy()
+    columns = "|".join(map(str, price_data.columns)) if isinstance(price_data, pd.DataFrame) else str(price_data.name)
+    return hashlib.sha1(hashed.tobytes() + columns.encode()).hexdigest()[:12]
+
+def params_key(params):
+    """Parâmetros em JSON canônico (chaves ordenadas, inteiros sem casas decimais)."""
+    return json.dumps({k: (int(v) if float(v).is_integer() else float(v)) for k, v in params.items()}, sort_keys=True)
+
+def costs_key(custos):
+    """Modelo de custos em JSON canônico ("{}" para backtests sem custos)."""
+    return json.dumps(custos or {}, sort_keys=True)
+
+def run_id_for(ticker, estrategia, params, versao_dados, custos=None):
+    raw = f"{ticker}|{estrategia}|{params_key(params)}|{costs_key(custos)}|{versao_dados}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def _numeric_stats(stats):
+    """Estatísticas do bt (coluna object) como {métrica: float}; datas e textos ficam de fora."""
+    values = pd.to_numeric(stats, errors="coerce")
+    return {name: float(v) for name, v in values.items() if name not in ("start", "end") and pd.notna(v)}
+
+def _changes_only(frame):
+    """Linhas em que algum valor mudou em relação à anterior (a primeira sempre entra)."""
+    values = frame.to_numpy(dtype=float)
+    changed = np.ones(len(values), dtype=bool)
+    changed[1:] = (np.abs(np.diff(values, axis=0)) > 0).any(axis=1) | (np.isnan(values[1:]) != np.isnan(values[:-1])).any(axis=1)
+    return frame[changed]
+
+def run_record(results, ticker, estrategia, params, price_data, custos=None):
+    """Extrai de um resultado do bt as três tabelas de uma execução: {'execucao', 'patrimonio', 'posicoes'}.
+
+    `custos` é o modelo de custos aplicado no backtest (`backtest_module.cost_model_for`; None sem custos).
+    """
+    versao = data_version(price_data)
+    run_id = run_id_for(ticker, estrategia, params, versao, custos)
+    equity = results.prices.iloc[:, 0].dropna()
+    execucao = {
+        "run_id": run_id, "criado_em": pd.Timestamp.now().floor("s"), "ticker": ticker, "estrategia": estrategia,
+        "params": params_key(params), "custos": costs_key(custos), "versao_dados": versao,
+        "inicio": equity.index[0], "fim": equity.index[-1], "pregoes": len(equity),
+        **_numeric_stats(results.stats.iloc[:, 0]),
+    }
+    patrimonio = pd.DataFrame({"run_id": run_id, "data": equity.index, "valor": equity.to_numpy(dtype=float)})
+
+    backtest = next(iter(results.backtests.values()))
+    # Custos de transação pagos (spread + impacto) como fração do capital inicial
+    execucao["custos_transacao"] = float(backtest.strategy.data["fees"].sum() / backtest.initial_capital)
+    weights = backtest.security_weights.fillna(0.0)
+    quantities = backtest.positions.reindex(index=weights.index, columns=weights.columns).fillna(0.0)
+    # Peso e quantidade por ativo só quando mudam (a série é uma função em degraus)
+    frames = []
+    for asset in weights.columns:
+        pair = _changes_only(pd.DataFrame({"peso": weights[asset], "quantidade": quantities[asset]}))
+        frames.append(pd.DataFrame({"run_id": run_id, "data": pair.index, "ativo": str(asset),
+                                    "peso": pair["peso"].to_numpy(), "quantidade": pair["quantidade"].to_numpy()}))
+    posicoes = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=POSITIONS_SCHEMA.names)
+    return {"execucao": execucao, "patrimonio": patrimonio, "posicoes": posicoes}
+
+def _write_part(tabela, df, schema=None):
+    os.makedirs(_table_dir(tabela), exist_ok=True)
+    filepath = os.path.join(_table_dir(tabela), f"part-{pd.Timestamp.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    pq.write_table(table, filepath, compression="zstd")
+
+def _runs_frame(execucoes):
+    runs = pd.DataFrame(execucoes)
+    metrics = sorted(c for c in runs.columns if c not in RUN_COLUMNS)
+    runs = runs[RUN_COLUMNS + metrics]
+    runs[metrics] = runs[metrics].astype(np.float64)
+    runs["pregoes"] = runs["pregoes"].astype(np.int64)
+    return runs
+
+@instrumentacao.instrumentado("resultados.gravar")
+def save_runs(records):
+    """Grava um lote de execuções (saídas de `run_record`) num arquivo por tabela.
+
+    Execuções cujo run_id já está no armazenamento são ignoradas. Retorna os run_ids gravados.
+    """
+    known = set(load_runs()["run_id"])
+    unique = {}
+    for record in records:
+        run_id = record["execucao"]["run_id"]
+        if run_id not in known:
+            unique[run_id] = record
+    instrumentacao.anotar(execucoes=len(records), novas=len(unique))
+    if not unique:
+        return []
+    # Ordenado por run_id: os filtros de leitura aproveitam as estatísticas de cada row group
+    ordered = [unique[k] for k in sorted(unique)]
+    _write_part("patrimonio", pd.concat([r["patrimonio"] for r in ordered], ignore_index=True), EQUITY_SCHEMA)
+    _write_part("posicoes", pd.concat([r["posicoes"] for r in ordered], ignore_index=True), POSITIONS_SCHEMA)
+    # Metadados por último: uma execução só aparece nas consultas depois que as curvas estão gravadas
+    _write_part("execucoes", _runs_frame([r["execucao"] for r in ordered]))
+    return list(unique)
+
+def save_run(results, ticker, estrategia, params, price_data, custos=None):
+    """Grava uma execução do bt e retorna o seu run_id (o mesmo se ela já estava gravada)."""
+    record = run_record(results, ticker, estrategia, params, price_data, custos)
+    save_runs([record])
+    return record["execucao"]["run_id"]
+
+def load_runs():
+    """Tabela de execuções (uma linha por run_id), cacheada pelo mtime dos arquivos."""
+    parts = _part_files("execucoes")
+    if not parts:
+        return pd.DataFrame(columns=RUN_COLUMNS)
+    cache_key = (os.path.abspath(_table_dir("execucoes")), tuple((p, os.path.getmtime(p)) for p in parts))
+    runs = _RUNS_CACHE.get(cache_key)
+    if runs is None:
+        # Lotes diferentes podem ter conjuntos de métricas diferentes; a união das colunas fica com NaN
+        runs = pd.concat([pq.read_table(p).to_pandas() for p in parts], ignore_index=True)
+        runs = runs.drop_duplicates("run_id", keep="first").reset_index(drop=True)
+        _RUNS_CACHE.clear()
+        _RUNS_CACHE[cache_key] = runs
+    return runs
+
+@instrumentacao.instrumentado("resultados.consultar")
+def query_runs(ticker=None, estrategia=None, params=None, ordenar_por=DEFAULT_METRIC, top=None, ascendente=False,
+               versao_dados=None):
+    """Execuções filtradas e ordenadas por uma métrica, com os parâmetros expandidos em colunas.
+
+    `ticker` e `estrategia` aceitam um valor ou uma lista; `params` é um dict parcial (ex:
+    {"short_window": 20, "long_window": 50}) comparado aos parâmetros gravados.
+    Ex: top 20 por Sharpe de PETR4 -> query_runs("PETR4.SA", top=20).
+    """
+    runs = load_runs()
+    mask = np.ones(len(runs), dtype=bool)
+    for column, value in (("ticker", ticker), ("estrategia", estrategia), ("versao_dados", versao_dados)):
+        if value is not None:
+            values = [value] if isinstance(value, str) else list(value)
+            mask &= runs[column].isin(values).to_numpy()
+    selected = runs[mask]
+    expanded = pd.DataFrame([json.loads(p) for p in selected["params"]], index=selected.index)
+    if params:
+        keep = np.ones(len(selected), dtype=bool)
+        for name, value in params.items():
+            keep &= (expanded[name] == value).to_numpy() if name in expanded.columns else False
+        selected, expanded = selected[keep], expanded[keep]
+    result = pd.concat([selected[["run_id", "ticker", "estrategia"]], expanded,
+                        selected.drop(columns=["run_id", "ticker", "estrategia"])], axis=1)
+    if ordenar_por in result.columns:
+        result = result.sort_values(ordenar_por, ascending=ascendente, na_position="last", kind="stable")
+    instrumentacao.anotar(execucoes=len(result))
+    return (result.head(top) if top else result).reset_index(drop=True)
+
+def run_stats(run_id):
+    """Estatísticas e metadados de uma execução como Series (None se o run_id não existir)."""
+    runs = load_runs()
+    row = runs[runs["run_id"] == run_id]
+    if row.empty:
+        print(f"Execução de backtest não encontrada: {run_id}")
+        return None
+    return row.iloc[0].dropna()
+
+def _read_for_runs(tabela, run_ids, schema):
+    parts = _part_files(tabela)
+    if not parts or not run_ids:
+        return schema.empty_table().to_pandas()
+    table = pq.ParquetDataset(parts, schema=schema, filters=[("run_id", "in", list(run_ids))]).read()
+    for part in parts:
+        instrumentacao.anotar_arquivo_lido(part)
+    return table.to_pandas()
+
+def run_label(run):
+    """Rótulo legível de uma execução (linha de `load_runs`/`query_runs`), com os parâmetros na ordem declarada."""
+    params = json.loads(run["params"])
+    spec = estrategias.STRATEGIES.get(run["estrategia"])
+    order = [p for p in spec["parametros"] if p in params] if spec else sorted(params)
+    params = "x".join(str(params[p]) for p in order)
+    sem_custos = " sem custos" if run.get("custos") == costs_key(None) else ""
+    return f"{run['ticker']} {run['estrategia']} {params}{sem_custos}"
+
+def load_equity(run_ids, rotular=False):
+    """Curvas de patrimônio (datas x execuções) dos run_ids, na ordem pedida.
+
+    Com `rotular=True`, as colunas usam `run_label` em vez do run_id.
+    """
+    run_ids = list(dict.fromkeys(run_ids))
+    long_equity = _read_for_runs("patrimonio", run_ids, EQUITY_SCHEMA).drop_duplicates(["run_id", "data"])
+    wide = long_equity.pivot(index="data", columns="run_id", values="valor")
+    wide = wide.reindex(columns=[r for r in run_ids if r in wide.columns])
+    wide.index.name, wide.columns.name = None, None
+    if rotular:
+        runs = load_runs().set_index("run_id")
+        wide.columns = [run_label(runs.loc[r]) for r in wide.columns]
+    return wide
+
+def load_positions(run_id, campo="peso"):
+    """Peso (ou 'quantidade') por ativo em cada data da curva de patrimônio da execução."""
+    positions = _read_for_runs("posicoes", [run_id], POSITIONS_SCHEMA)
+    if positions.empty:
+        return pd.DataFrame()
+    wide = positions.drop_duplicates(["data", "ativo"]).pivot(index="data", columns="ativo", values=campo)
+    dates = load_equity([run_id]).index
+    wide = wide.reindex(wide.index.union(dates)).ffill().reindex(dates).fillna(0.0)
+    wide.columns.name = None
+    return wide
+
+def plot_runs(run_ids, title=None):
+    """Figura Plotly (patrimônio e drawdown) das execuções, montada a partir das curvas gravadas."""
+    return visualizacao_graficos.build_backtest_figure(load_equity(run_ids, rotular=True), title=title)
+
+def compactar():
+    """Reúne os arquivos de cada tabela num único Parquet ordenado por run_id (o conteúdo não muda)."""
+    for tabela, schema in (("patrimonio", EQUITY_SCHEMA), ("posicoes", POSITIONS_SCHEMA), ("execucoes", None)):
+        parts = _part_files(tabela)
+        if len(parts) <= 1:
+            continue
+        if tabela == "execucoes":
+            df = load_runs()
+        else:
+            df = pq.ParquetDataset(parts, schema=schema).read().to_pandas()
+        _write_part(tabela, df.sort_values(["run_id"] + (["data"] if "data" in df.columns else []), kind="stable"), schema)
+        for part in parts:
+            os.remove(part)
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    import bt
+
+    DATA_DIR = tempfile.mkdtemp()
+    rng = np.random.default_rng(1)
+    dates = pd.bdate_range("2015-01-01", periods=1500)
+    tickers = ["PETR4.SA", "VALE3.SA", "ITUB4.SA", "AAPL"]
+    records = []
+    inicio = time.perf_counter()
+    for ticker in tickers:
+        prices = pd.DataFrame({ticker: 30 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(dates))))}, index=dates)
+        for short in (10, 20, 30, 50):
+            for long in (50, 100, 150, 200):
+                if short >= long:
+                    continue
+                params = {"short_window": short, "long_window": long}
+                weights = estrategias.target_weights("sma_crossover", ticker, prices[ticker], **params).to_frame()
+                strategy = bt.Strategy(f"{ticker}_sma_crossover", [bt.algos.SelectAll(), bt.algos.WeighTarget(weights),
+                                                                   bt.algos.Rebalance()])
+                results = bt.run(bt.Backtest(strategy, prices))
+                records.append(run_record(results, ticker, "sma_crossover", params, prices))
+    print(f"{len(records)} backtests em {time.perf_counter() - inicio:.1f} s")
+    print(f"Gravadas: {len(save_runs(records))}; regravação: {len(save_runs(records))}")
+
+    inicio = time.perf_counter()
+    top = query_runs("PETR4.SA", top=5)
+    print(f"Top 5 por Sharpe de PETR4.SA ({1000 * (time.perf_counter() - inicio):.1f} ms):")
+    print(top[["run_id", "short_window", "long_window", "daily_sharpe", "cagr", "max_drawdown"]])
+    print("SMA 20x50 em todos os tickers:")
+    print(query_runs(estrategia="sma_crossover", params={"short_window": 20, "long_window": 50})[
+        ["ticker", "daily_sharpe", "cagr", "max_drawdown"]])
+    melhor = top["run_id"].iloc[0]
+    curvas = load_equity(top["run_id"], rotular=True)
+    print(curvas.tail(3))
+    print(load_positions(melhor).tail(3))
+    compactar()
+    print(f"Após compactar: {len(load_runs())} execuções, curvas iguais: {load_equity(top['run_id'], rotular=True).equals(curvas)}")
+    plot_runs(top["run_id"], title="Top 5 PETR4.SA")
@@ -0,0 +1,239 @@
+"""Varredura de sinais do universo a cada nova barra, com alertas só nas transições de estado.
+
+As regras são expressões de `DataFrame.eval` sobre uma linha por ticker com os valores da última barra.
+Variáveis disponíveis (w = janela em pregões; o sufixo `_ant` dá o valor na barra anterior):
+    close, close_ant           preço de fechamento ajustado
+    sma_w, sma_w_ant           média móvel simples (mesma fórmula de `analise_quantitativa`)
+    rsi_w, rsi_w_ant           RSI com médias simples (mesma fórmula de `analise_quantitativa`)
+    ret_w, ret_w_ant           retorno acumulado de w pregões
+    max_w, min_w (e _ant)      máxima/mínima dos últimos w fechamentos
+    vol_w, vol_w_ant           volatilidade anualizada dos retornos diários de w pregões
+Só as variáveis citadas nas regras são calculadas, e só sobre as últimas barras do painel.
+
+Uma regra gera alerta quando passa de falsa para verdadeira num ticker (o estado anterior fica em
+`alertas_estado.parquet`); repetir a varredura sobre a mesma barra não gera alertas de novo.
+"""
+import json
+import os
+import queue
+import re
+import time
+import numpy as np
+import pandas as pd
+import calendario_mercado
+import instrumentacao
+import universo
+
+DATA_DIR = "."
+STATE_FILE = "alertas_estado.parquet"
+ALERTS_FILE = "alertas.jsonl"
+TRADING_DAYS = 252
+
+REGRAS_PADRAO = {
+    "rsi_sobrevendido": "rsi_14 < 30",
+    "rsi_sobrecomprado": "rsi_14 > 70",
+    "sma_50_acima_200": "sma_50 > sma_200",
+    "sma_50_abaixo_200": "sma_50 < sma_200",
+    "preco_acima_sma_200": "close > sma_200",
+    "maxima_52_semanas": "close >= max_252",
+    "minima_52_semanas": "close <= min_252",
+    "queda_diaria_5pct": "ret_1 < -0.05",
+    "alta_diaria_5pct": "ret_1 > 0.05",
+}
+
+_VARIAVEL = re.compile(r"\b(sma|rsi|ret|max|min|vol)_(\d+)(_ant)?\b")
+
+def required_features(regras):
+    """{(tipo, janela)} citados nas expressões das regras."""
+    return {(tipo, int(janela)) for expr in regras.values() for tipo, janela, _ in _VARIAVEL.findall(expr)}
+
+def _window_feature(tipo, window, tail):
+    """Valor da variável na última linha de `tail` (barras x tickers), com a semântica do rolling do pandas:
+    NaN se faltar qualquer dado da janela."""
+    if tipo == "sma":
+        return tail[-window:].mean(axis=0)
+    if tipo == "max":
+        return tail[-window:].max(axis=0)
+    if tipo == "min":
+        return tail[-window:].min(axis=0)
+    if tipo == "ret":
+        return tail[-1] / tail[-1 - window] - 1.0
+    delta = np.diff(tail[-window - 1:], axis=0)
+    if tipo == "rsi":
+        gain = np.where(delta > 0, delta, 0.0).mean(axis=0)
+        loss = np.where(delta < 0, -delta, 0.0).mean(axis=0)
+        gain[np.isnan(delta).any(axis=0)] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return 100.0 - 100.0 / (1.0 + gain / loss)
+    if tipo == "vol":
+        return np.std(delta / tail[-window - 1:-1], axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    raise ValueError(f"Variável desconhecida: {tipo}_{window}")
+
+def snapshot(prices, regras=REGRAS_PADRAO):
+    """Uma linha por ticker com as variáveis das regras na última barra (e na anterior, `_ant`).
+
+    Só as últimas `max(janela) + 2` barras do painel (datas x tickers) são usadas; cada ticker é avaliado
+    na sua última barra com dado (o painel é preenchido para frente até a data mais recente).
+    """
+    features = required_features(regras)
+    depth = max([w + 1 for _, w in features] + [1]) + 1
+    tail = prices.ffill().iloc[-depth:].to_numpy(dtype=np.float64)
+    current, previous = tail, tail[:-1]
+    data = {"close": current[-1], "close_ant": previous[-1] if len(previous) else np.full(tail.shape[1], np.nan)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for tipo, window in sorted(features):
+            data[f"{tipo}_{window}"] = _window_feature(tipo, window, current) if len(current) > window else np.nan
+            data[f"{tipo}_{window}_ant"] = _window_feature(tipo, window, previous) if len(previous) > window else np.nan
+    frame = pd.DataFrame(data, index=pd.Index(prices.columns, name="ticker"))
+    last_valid = prices.notna().to_numpy()[::-1].argmax(axis=0)
+    frame["data"] = prices.index[len(prices) - 1 - last_valid]
+    return frame
+
+def evaluate_rules(frame, regras=REGRAS_PADRAO):
+    """Estado booleano (tickers x regras), com todas as regras avaliadas num único `eval` de várias linhas.
+
+    Comparações com NaN (dados insuficientes) dão falso.
+    """
+    names = list(regras)
+    program = "\n".join(f"__r{i} = {regras[name]}" for i, name in enumerate(names))
+    result = frame.eval(program, engine="python")
+    states = result[[f"__r{i}" for i in range(len(names))]]
+    states.columns = names
+    return states.fillna(False).astype(bool)
+
+def validate_rules(regras):
+    """Erros de sintaxe/variável de cada regra ({nome: mensagem}); vazio se todas forem válidas."""
+    sample = snapshot(pd.DataFrame({"X": np.linspace(1.0, 2.0, 300)}, index=pd.bdate_range("2020-01-01", periods=300)), regras)
+    errors = {}
+    for name, expr in regras.items():
+        try:
+            sample.eval(expr, engine="python")
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+    return errors
+
+# --- Destinos dos alertas ---
+
+class JsonlSink:
+    """Acrescenta cada alerta como uma linha JSON em `path`."""
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def emitir(self, alertas):
+        path = self.path or os.path.join(DATA_DIR, ALERTS_FILE)
+        with open(path, "a", encoding="utf-8") as f:
+            for record in alertas.to_dict(orient="records"):
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+class QueueSink:
+    """Coloca cada alerta (dict) numa `queue.Queue` para consumo por outra thread."""
+
+    def __init__(self, fila=None):
+        self.fila = fila if fila is not None else queue.Queue()
+
+    def emitir(self, alertas):
+        for record in alertas.to_dict(orient="records"):
+            self.fila.put(record)
+
+def load_alerts(limit=None, path=None):
+    """Alertas gravados pelo JsonlSink (mais recentes por último)."""
+    path = path or os.path.join(DATA_DIR, ALERTS_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["data", "ticker", "regra", "expressao", "close", "emitido_em"])
+    alerts = pd.read_json(path, lines=True)
+    return alerts.tail(limit) if limit else alerts
+
+# --- Varredura ---
+
+def _state_path():
+    return os.path.join(DATA_DIR, STATE_FILE)
+
+def _load_state():
+    path = _state_path()
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+@instrumentacao.instrumentado("alertas.escanear")
+def scan(prices, regras=None, sinks=None, alertar_novos=False):
+    """Avalia as regras na última barra de cada ticker e emite as transições falso -> verdadeiro.
+
+    `prices`: painel datas x tickers. Tickers/regras sem estado anterior só geram alerta com
+    `alertar_novos=True` (evita a enxurrada da primeira varredura). Retorna o DataFrame de alertas.
+    """
+    regras = dict(REGRAS_PADRAO if regras is None else regras)
+    sinks = [JsonlSink()] if sinks is None else sinks
+    frame = snapshot(prices, regras)
+    states = evaluate_rules(frame, regras)
+
+    saved = _load_state()
+    if saved is None:
+        previous = pd.DataFrame(index=states.index, columns=states.columns, dtype=object)
+    else:
+        previous = saved.reindex(index=states.index, columns=states.columns)
+    missing = previous.isna().to_numpy()
+    previous_bool = np.where(missing, False, previous.to_numpy()).astype(bool)
+    if not alertar_novos:
+        previous_bool = np.where(missing, states.to_numpy(), previous_bool)
+    transitions = states.to_numpy() & ~previous_bool
+
+    rows, cols = np.nonzero(transitions)
+    alerts = pd.DataFrame({
+        "data": frame["data"].to_numpy()[rows],
+        "ticker": states.index.to_numpy()[rows],
+        "regra": states.columns.to_numpy()[cols],
+        "expressao": [regras[states.columns[c]] for c in cols],
+        "close": frame["close"].to_numpy()[rows],
+        "emitido_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+    })
+    instrumentacao.anotar(tickers=len(states), regras=len(regras), alertas=len(alerts))
+
+    # O estado salvo mantém os tickers/regras que não entraram nesta varredura
+    merged = states if saved is None else states.combine_first(saved.astype(bool)).astype(bool)
+    merged.to_parquet(_state_path())
+    if len(alerts):
+        for sink in sinks:
+            sink.emitir(alerts)
+    return alerts
+
+def scan_universe(ticker_stems=None, regras=None, sinks=None, alertar_novos=False):
+    """Carrega os fechamentos do universo (painel memorizado de `calendario_mercado`) e roda `scan`."""
+    if ticker_stems is None:
+        universo.DATA_DIR = DATA_DIR
+        ticker_stems = universo.stems_with("chart")
+    calendario_mercado.DATA_DIR = DATA_DIR
+    prices = calendario_mercado.load_aligned_prices(ticker_stems, column="Adj Close", how="union", file_suffix="chart")
+    if prices.empty:
+        print("Nenhum histórico disponível para a varredura de alertas.")
+        return None
+    return scan(prices, regras, sinks, alertar_novos)
+
+if __name__ == "__main__":
+    import tempfile
+    DATA_DIR = tempfile.mkdtemp()
+    rng = np.random.default_rng(0)
+    n_tickers, n_barras = 5000, 300
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_barras, n_tickers)), axis=0)),
+                          index=pd.bdate_range("2024-01-01", periods=n_barras), columns=[f"T{i:04d}" for i in range(n_tickers)])
+    regras = dict(REGRAS_PADRAO)
+    for w in (5, 9, 21):
+        regras.update({f"rsi_{w}_baixo": f"rsi_{w} < 25", f"rsi_{w}_alto": f"rsi_{w} > 75",
+                       f"cruzou_sma_{w}": f"(close > sma_{w}) & (close_ant <= sma_{w}_ant)",
+                       f"ret_{w}_forte": f"ret_{w} > 0.1", f"vol_{w}_alta": f"vol_{w} > 0.5"})
+    for curta, longa in ((10, 30), (20, 50), (20, 100), (50, 100), (10, 50)):
+        regras[f"sma_{curta}_{longa}"] = f"sma_{curta} > sma_{longa}"
+    regras.update({"rompimento_60": "close >= max_60", "perda_60": "close <= min_60"})
+    print(f"Regras inválidas: {validate_rules(regras) or 'nenhuma'}")
+
+    scan(prices.iloc[:-1], regras, sinks=[])
+    fila = QueueSink()
+    inicio = time.perf_counter()
+    alertas = scan(prices, regras, sinks=[JsonlSink(), fila])
+    print(f"{n_tickers} tickers x {len(regras)} regras: {1000 * (time.perf_counter() - inicio):.0f} ms, "
+          f"{len(alertas)} alertas ({fila.fila.qsize()} na fila)")
+    print(f"Repetindo a mesma barra: {len(scan(prices, regras, sinks=[]))} alertas")
+    print(alertas.groupby("regra").size().sort_values(ascending=False).head(8))
+
+    from analise_quantitativa import calculate_rsi
+    ref = calculate_rsi(prices[["T0000"]].rename(columns={"T0000": "Adj Close"}), 14).iloc[-1]
+    print(f"RSI_14 de T0000: varredura {snapshot(prices, {'r': 'rsi_14 > 0'}).loc['T0000', 'rsi_14']:.6f}, "
+          f"analise_quantitativa {ref:.6f}")
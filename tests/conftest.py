@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos ficam na raiz do repositório (sem pacote instalável)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,58 @@
+"""Erro numérico do modo compacto (float32 / volume inteiro) em relação à carga float64."""
+import numpy as np
+import pandas as pd
+import pytest
+import painel_compacto
+import universo
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close"]
+STEMS = ["us_SINT1", "us_SINT2", "br_SINT3_SA"]
+
+@pytest.fixture
+def synthetic_dir(tmp_path):
+    """Arquivos _chart com preços float64 de precisão total e volumes inteiros (um deles acima de int32)."""
+    rng = np.random.default_rng(42)
+    dates = pd.bdate_range("2015-01-01", periods=2000, name="Timestamp")
+    expected = {}
+    for i, stem in enumerate(STEMS):
+        close = (10.0 ** (i + 1)) * np.exp(np.cumsum(rng.normal(0.0, 0.02, len(dates))))
+        df = pd.DataFrame({
+            "Open": close * rng.uniform(0.98, 1.02, len(dates)),
+            "High": close * rng.uniform(1.0, 1.05, len(dates)),
+            "Low": close * rng.uniform(0.95, 1.0, len(dates)),
+            "Close": close,
+            "Adj Close": close * rng.uniform(0.8, 1.0),
+            "Volume": rng.integers(0, 10 ** (7 + 2 * i), len(dates)).astype(np.float64),
+        }, index=dates)
+        df.to_csv(universo.file_path(stem, "chart", str(tmp_path)), float_format="%.17g")
+        expected[universo.ticker_of(stem)] = df
+    return tmp_path, expected
+
+def test_painel_compacto_dentro_das_tolerancias(synthetic_dir):
+    data_dir, expected = synthetic_dir
+    panel = painel_compacto.load_compact_panel(STEMS, [*PRICE_COLUMNS, "Volume"], data_dir=str(data_dir))
+    assert all(panel[c].dtype == painel_compacto.PRICE_DTYPE for c in PRICE_COLUMNS)
+    assert set(expected) == set(panel["ticker"].cat.categories)
+    for ticker, full in expected.items():
+        compact = panel[panel["ticker"] == ticker].set_index("Timestamp")
+        exact = full[PRICE_COLUMNS].to_numpy()
+        approx = compact[PRICE_COLUMNS].to_numpy(dtype=np.float64)
+        assert np.abs(approx - exact).max() > 0  # os preços sintéticos não cabem exatamente em float32
+        assert (np.abs(approx - exact) / np.abs(exact)).max() <= painel_compacto.PRICE_RTOL
+        returns_error = np.abs(np.diff(approx, axis=0) / approx[:-1] - np.diff(exact, axis=0) / exact[:-1])
+        assert returns_error.max() <= painel_compacto.RETURN_ATOL
+        np.testing.assert_array_equal(compact["Volume"].to_numpy(dtype=np.int64), full["Volume"].to_numpy(dtype=np.int64))
+
+def test_volume_acima_de_int32_usa_int64(synthetic_dir):
+    data_dir, expected = synthetic_dir
+    path = universo.file_path("br_SINT3_SA", "chart", str(data_dir))
+    volume = painel_compacto.read_compact(path, ["Volume"])["Volume"]
+    assert expected["SINT3.SA"]["Volume"].max() > np.iinfo(np.int32).max
+    assert volume.dtype == np.int64
+
+def test_check_tolerances_aprova_os_arquivos_sinteticos(synthetic_dir):
+    data_dir, expected = synthetic_dir
+    report = painel_compacto.check_tolerances(STEMS, data_dir=str(data_dir))
+    assert list(report.index) == list(expected)
+    assert report["ok"].all()
+    assert (report["erro_relativo_preco"] > 0).all()
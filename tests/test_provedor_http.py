@@ -0,0 +1,23 @@
+"""Quais respostas HTTP a sessão do provedor guarda no cache."""
+from unittest import mock
+import pytest
+import provedor_dados
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = "{}"
+        self.headers = {}
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(provedor_dados, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(provedor_dados, "MODE", "live")
+    return provedor_dados.CachedHttpSession()
+
+@pytest.mark.parametrize("status_code, network_calls", [(200, 1), (404, 1), (401, 2), (403, 2), (429, 2), (503, 2)])
+def test_so_respostas_validas_ficam_no_cache(session, status_code, network_calls):
+    with mock.patch.object(session.session, "get", return_value=FakeResponse(status_code)) as get:
+        session.get("https://api.exemplo/serie")
+        session.get("https://api.exemplo/serie")
+    assert get.call_count == network_calls
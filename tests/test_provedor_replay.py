@@ -0,0 +1,59 @@
+"""Coleta completa (histórico + insights) sem rede, com o provedor em QUANTFUND_PROVIDER_MODE=replay.
+
+As gravações são criadas a partir dos arquivos _chart.csv/_insights.json versionados no repositório
+(`provedor_dados.record_from_local_files`), num diretório temporário.
+"""
+import json
+import os
+import subprocess
+import sys
+import pandas as pd
+from conftest import REPO_DIR
+
+SCRIPT = """
+import sys
+import coleta_dados, eventos_corporativos, provedor_dados
+data_dir, replay_dir = sys.argv[1], sys.argv[2]
+coleta_dados.DATA_DIR = eventos_corporativos.DATA_DIR = provedor_dados.DATA_DIR = data_dir
+provedor_dados.REPLAY_DIR = replay_dir
+assert provedor_dados.MODE == "replay", provedor_dados.MODE  # lido de QUANTFUND_PROVIDER_MODE
+provedor_dados.record_from_local_files(["br_PETR4_SA", "us_AAPL"], data_dir=sys.argv[3])
+for symbol, region in (("PETR4.SA", "BR"), ("AAPL", "US"), ("XYZW.SA", "BR")):
+    chart = coleta_dados.fetch_and_save_stock_chart(symbol, region, region.lower())
+    insights = coleta_dados.fetch_and_save_stock_insights(symbol, region, region.lower())
+    print("RESULTADO", symbol, chart, insights)
+"""
+
+def run_collection(tmp_path):
+    data_dir, replay_dir = tmp_path / "dados", tmp_path / "gravacoes"
+    data_dir.mkdir()
+    env = {**os.environ, "QUANTFUND_PROVIDER_MODE": "replay", "PYTHONPATH": REPO_DIR,
+           # Qualquer acesso à rede falha em vez de ser atendido
+           "HTTP_PROXY": "http://127.0.0.1:9", "HTTPS_PROXY": "http://127.0.0.1:9", "NO_PROXY": ""}
+    completed = subprocess.run([sys.executable, "-c", SCRIPT, str(data_dir), str(replay_dir), REPO_DIR],
+                               capture_output=True, text=True, env=env, timeout=120, cwd=tmp_path)
+    assert completed.returncode == 0, completed.stderr
+    results = {}
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULTADO"):
+            _, symbol, chart, insights = line.split()
+            results[symbol] = (chart == "True", insights == "True")
+    return data_dir, results
+
+def test_coleta_em_replay_reproduz_os_arquivos_gravados(tmp_path):
+    data_dir, results = run_collection(tmp_path)
+    assert results["PETR4.SA"] == (True, True)
+    assert results["AAPL"] == (True, True)
+    for stem in ("br_PETR4_SA", "us_AAPL"):
+        original = pd.read_csv(os.path.join(REPO_DIR, f"{stem}_chart.csv"), index_col="Timestamp")
+        collected = pd.read_csv(data_dir / f"{stem}_chart.csv", index_col="Timestamp")
+        pd.testing.assert_frame_equal(collected[original.columns], original, check_exact=False, rtol=1e-12)
+        with open(os.path.join(REPO_DIR, f"{stem}_insights.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+        with open(data_dir / f"{stem}_insights.json", encoding="utf-8") as f:
+            assert json.load(f) == expected
+
+def test_ticker_sem_gravacao_falha_sem_ir_a_rede(tmp_path):
+    data_dir, results = run_collection(tmp_path)
+    assert results["XYZW.SA"] == (False, False)
+    assert not (data_dir / "br_XYZW_SA_chart.csv").exists()
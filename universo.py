@@ -0,0 +1,258 @@
+"""Universo de ativos: listas de componentes de índices, validação de símbolos em lote e tabela de metadados.
+
+Toda conversão entre ticker (ex: "PETR4.SA") e stem de arquivo (ex: "br_PETR4_SA") passa por aqui.
+A tabela de metadados (ticker, região, bolsa, moeda, setor, arquivos) é indexada por stem e por ticker,
+com consulta O(1); ela é reconstruída apenas quando o diretório de dados ou as listas de índices mudam.
+"""
+import glob
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import calendario_mercado
+import instrumentacao
+
+DATA_DIR = "."
+LISTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "universos")
+
+# Listas locais de componentes (parciais, mantidas manualmente; ver cabeçalho de cada arquivo)
+INDICES = {
+    "IBOV": {"arquivo": "ibovespa.csv", "regiao": "BR", "nome": "Ibovespa (parcial)"},
+    "SP500": {"arquivo": "sp500.csv", "regiao": "US", "nome": "S&P 500 (parcial)"},
+}
+REGION_SUFFIXES = {"BR": ".SA"}
+DEFAULT_REGION = "US"
+FILE_SUFFIXES = {"chart": "chart.csv", "quant": "quant_analysis.csv", "insights": "insights.json"}
+SYMBOL_PATTERNS = {
+    "BR": re.compile(r"^[A-Z]{4}\d{1,2}F?\.SA$"),
+    "US": re.compile(r"^[A-Z][A-Z0-9]{0,5}([.-][A-Z0-9]{1,2})?$"),
+}
+COLUMNS = ["ticker", "regiao", "bolsa", "moeda", "setor", "nome", "indices",
+           "arquivo_chart", "arquivo_quant", "arquivo_insights", "tem_chart", "tem_quant", "tem_insights"]
+
+_TABLE = {"chave": None, "tabela": None, "por_stem": {}, "por_ticker": {}}
+
+def infer_region(ticker):
+    """Região pelo sufixo do ticker (".SA" -> BR); sem sufixo conhecido, DEFAULT_REGION."""
+    ticker = ticker.strip().upper()
+    for region, suffix in REGION_SUFFIXES.items():
+        if ticker.endswith(suffix):
+            return region
+    return DEFAULT_REGION
+
+def normalize_symbol(symbol, region=None):
+    """Ticker no formato do yfinance (maiúsculo, com o sufixo da região quando faltar)."""
+    symbol = symbol.strip().upper()
+    suffix = REGION_SUFFIXES.get((region or "").upper())
+    if suffix and not symbol.endswith(suffix):
+        symbol += suffix
+    return symbol
+
+def stem_for(ticker, region=None):
+    """Stem de arquivo de um ticker (ex: "PETR4.SA" -> "br_PETR4_SA", "AAPL" -> "us_AAPL")."""
+    ticker = ticker.strip().upper()
+    region = (region or infer_region(ticker)).upper()
+    return f"{region.lower()}_{ticker.replace('.', '_')}"
+
+def parse_stem(stem):
+    """(região, ticker) de um stem (ex: "br_PETR4_SA" -> ("BR", "PETR4.SA")).
+
+    É a única regra de decomposição de stems do projeto; os demais módulos usam `asset`/`ticker_of`.
+    """
+    parts = stem.split("_", 1)
+    if len(parts) == 1:
+        return DEFAULT_REGION, parts[0].upper()
+    return parts[0].upper(), parts[1].replace("_", ".")
+
+def file_path(stem, tipo, data_dir=None):
+    """Caminho do arquivo `tipo` ("chart", "quant" ou "insights") de um stem."""
+    return os.path.join(DATA_DIR if data_dir is None else data_dir, f"{stem}_{FILE_SUFFIXES[tipo]}")
+
+# --- Listas de componentes ---
+
+def load_constituents(indice):
+    """Componentes de um índice a partir da lista local (colunas: ticker, setor, nome, regiao, stem, indice)."""
+    spec = INDICES.get(indice.upper())
+    if spec is None:
+        print(f"Índice desconhecido: {indice}. Disponíveis: {', '.join(INDICES)}")
+        return None
+    filepath = os.path.join(LISTS_DIR, spec["arquivo"])
+    if not os.path.exists(filepath):
+        print(f"Lista de componentes não encontrada: {filepath}")
+        return None
+    df = pd.read_csv(filepath, comment="#", dtype=str).fillna("")
+    df["ticker"] = [normalize_symbol(t, spec["regiao"]) for t in df["ticker"]]
+    df["regiao"] = spec["regiao"]
+    df["stem"] = [stem_for(t, spec["regiao"]) for t in df["ticker"]]
+    df["indice"] = indice.upper()
+    return df.drop_duplicates(subset="stem")
+
+# --- Tabela de metadados ---
+
+def _sector_from_insights(filepath):
+    try:
+        with open(filepath, "r") as f:
+            insights = json.load(f)
+    except (OSError, ValueError):
+        return None
+    sector = (insights.get("companySnapshot") or {}).get("sectorInfo")
+    if not sector:
+        sector = ((insights.get("instrumentInfo") or {}).get("technicalEvents") or {}).get("sector")
+    return sector or insights.get("sector")
+
+def _local_stems(data_dir):
+    stems = set()
+    for suffix in FILE_SUFFIXES.values():
+        for path in glob.glob(os.path.join(data_dir, f"*_{suffix}")):
+            stems.add(os.path.basename(path)[:-len(suffix) - 1])
+    return stems
+
+def _record(stem, data_dir, setor=None, nome=None, indices=()):
+    region, ticker = parse_stem(stem)
+    paths = {tipo: file_path(stem, tipo, data_dir) for tipo in FILE_SUFFIXES}
+    exists = {tipo: os.path.exists(path) for tipo, path in paths.items()}
+    if exists["insights"]:
+        setor = _sector_from_insights(paths["insights"]) or setor
+    return {
+        "ticker": ticker, "regiao": region,
+        "bolsa": calendario_mercado.REGION_EXCHANGE.get(region, "NYSE"),
+        "moeda": calendario_mercado.REGION_CURRENCY.get(region, "USD"),
+        "setor": setor or None, "nome": nome or None, "indices": ",".join(indices),
+        "arquivo_chart": paths["chart"], "arquivo_quant": paths["quant"], "arquivo_insights": paths["insights"],
+        "tem_chart": exists["chart"], "tem_quant": exists["quant"], "tem_insights": exists["insights"],
+    }
+
+def _table_key(data_dir):
+    lists = tuple(os.path.getmtime(os.path.join(LISTS_DIR, spec["arquivo"]))
+                  if os.path.exists(os.path.join(LISTS_DIR, spec["arquivo"])) else None for spec in INDICES.values())
+    dir_mtime = os.stat(data_dir).st_mtime_ns if os.path.isdir(data_dir) else None
+    return (os.path.abspath(data_dir), dir_mtime, lists)
+
+@instrumentacao.instrumentado("universo.tabela")
+def asset_table(refresh=False):
+    """Tabela de metadados indexada por stem: componentes dos índices locais + ativos com arquivos no DATA_DIR.
+
+    Memorizada pelo mtime do diretório de dados e das listas (criar ou apagar arquivos invalida o cache;
+    use `refresh=True` ou `invalidate()` após sobrescrever um insights.json).
+    """
+    key = _table_key(DATA_DIR)
+    if not refresh and _TABLE["chave"] == key:
+        instrumentacao.anotar(cache_hit=True)
+        return _TABLE["tabela"]
+    instrumentacao.anotar(cache_hit=False)
+
+    listed = {}
+    for indice in INDICES:
+        constituents = load_constituents(indice)
+        if constituents is None:
+            continue
+        for row in constituents.itertuples(index=False):
+            entry = listed.setdefault(row.stem, {"setor": row.setor, "nome": row.nome, "indices": []})
+            entry["indices"].append(indice)
+    records = {}
+    for stem in sorted(set(listed) | _local_stems(DATA_DIR)):
+        extra = listed.get(stem, {})
+        records[stem] = _record(stem, DATA_DIR, extra.get("setor"), extra.get("nome"), extra.get("indices", ()))
+
+    table = pd.DataFrame.from_dict(records, orient="index", columns=COLUMNS)
+    table.index.name = "stem"
+    _TABLE.update(chave=key, tabela=table, por_stem={stem: dict(rec, stem=stem) for stem, rec in records.items()},
+                  por_ticker={rec["ticker"]: stem for stem, rec in records.items()})
+    instrumentacao.anotar(linhas=len(table))
+    return table
+
+def invalidate():
+    """Descarta a tabela memorizada (a próxima consulta reconstrói)."""
+    _TABLE.update(chave=None, tabela=None, por_stem={}, por_ticker={})
+
+def asset(chave):
+    """Metadados (dict) de um ativo por stem ou ticker. Stems fora da tabela são registrados na hora."""
+    if _TABLE["chave"] != _table_key(DATA_DIR):
+        asset_table()
+    record = _TABLE["por_stem"].get(chave)
+    if record is None and chave in _TABLE["por_ticker"]:
+        record = _TABLE["por_stem"][_TABLE["por_ticker"][chave]]
+    if record is None:
+        stem = chave if "_" in chave else stem_for(chave)
+        record = dict(_record(stem, DATA_DIR), stem=stem)
+        _TABLE["por_stem"][stem] = record
+        _TABLE["por_ticker"][record["ticker"]] = stem
+    return record
+
+def ticker_of(stem):
+    """Ticker no formato do yfinance de um stem (ex: "br_PETR4_SA" -> "PETR4.SA")."""
+    return asset(stem)["ticker"]
+
+def region_of(stem):
+    """Região (BR, US, ...) de um stem."""
+    return asset(stem)["regiao"]
+
+def stems_with(tipo="quant", indice=None, regiao=None):
+    """Stems com o arquivo `tipo` disponível, opcionalmente filtrados por índice e região."""
+    table = asset_table()
+    mask = table[f"tem_{tipo}"].to_numpy(dtype=bool)
+    if indice is not None:
+        mask &= table["indices"].str.split(",").apply(lambda items: indice.upper() in items).to_numpy()
+    if regiao is not None:
+        mask &= (table["regiao"] == regiao.upper()).to_numpy()
+    return list(table.index[mask])
+
+# --- Validação em lote ---
+
+def _check_remote(symbol):
+    import provedor_dados  # import tardio: o provedor depende do yfinance/curl_cffi
+    try:
+        return ("ok", "") if provedor_dados.symbol_has_data(symbol) else ("sem_dados", "Sem cotações no provedor")
+    except Exception as e:
+        return "erro", str(e)
+
+@instrumentacao.instrumentado("universo.validar")
+def validate_symbols(symbols, region=None, verificar_provedor=True, max_workers=8):
+    """Valida uma lista de símbolos de uma vez.
+
+    Etapas: normalização (maiúsculas, sufixo da região), formato por região, duplicados, arquivos locais
+    e, para o que restar, consulta ao provedor em paralelo (com cache). Retorna DataFrame com
+    simbolo, ticker, regiao, stem, status ("ok", "invalido", "duplicado", "sem_dados", "erro",
+    "nao_verificado") e motivo.
+    """
+    rows = []
+    seen = set()
+    pending = []
+    for symbol in symbols:
+        if not isinstance(symbol, str) or not symbol.strip():
+            continue
+        ticker = normalize_symbol(symbol, region)
+        row_region = (region or infer_region(ticker)).upper()
+        stem = stem_for(ticker, row_region)
+        row = {"simbolo": symbol, "ticker": ticker, "regiao": row_region, "stem": stem, "status": "ok", "motivo": ""}
+        pattern = SYMBOL_PATTERNS.get(row_region)
+        if pattern is not None and not pattern.match(ticker):
+            row.update(status="invalido", motivo=f"Formato inválido para a região {row_region}")
+        elif stem in seen:
+            row.update(status="duplicado", motivo="Símbolo repetido na lista")
+        else:
+            seen.add(stem)
+            if asset(stem)["tem_chart"]:
+                row["motivo"] = "Dados locais"
+            elif verificar_provedor:
+                pending.append(len(rows))
+            else:
+                row.update(status="nao_verificado", motivo="Formato válido; provedor não consultado")
+        rows.append(row)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            outcomes = list(pool.map(_check_remote, [rows[i]["ticker"] for i in pending]))
+        for i, (status, motivo) in zip(pending, outcomes):
+            rows[i].update(status=status, motivo=motivo)
+
+    report = pd.DataFrame(rows, columns=["simbolo", "ticker", "regiao", "stem", "status", "motivo"])
+    instrumentacao.anotar(linhas=len(report), consultas_provedor=len(pending))
+    return report
+
+if __name__ == "__main__":
+    table = asset_table()
+    print(table[["ticker", "regiao", "moeda", "setor", "indices", "tem_chart", "tem_quant"]].head(10))
+    print(f"{len(table)} ativos no universo; com análise quantitativa: {stems_with('quant')}")
+    print(validate_symbols(["petr4", "VALE3.SA", "PETR4.SA", "AAPL", "12XX"], region=None, verificar_provedor=False))
@@ -0,0 +1,176 @@
+import os
+import numpy as np
+import pandas as pd
+import instrumentacao
+
+DATA_DIR = "."
+QUALITY_REPORT_FILE = "quality_report.csv"
+
+# Limiares padrão das verificações
+SPIKE_LOG_RETURN = 0.25          # |log-retorno| acima disso é candidato a spike/salto
+SPIKE_REVERSION_RATIO = 0.6      # spike: o retorno seguinte desfaz pelo menos 60% do salto
+SPLIT_RATIOS = np.array([2, 3, 4, 5, 8, 10, 20, 50, 100], dtype=np.float64)
+SPLIT_TOLERANCE = 0.06           # tolerância relativa para considerar o salto igual a uma razão de split
+STALE_RUN_DAYS = 10              # pregões seguidos com preço idêntico
+GAP_DAYS = 10                    # dias corridos sem observação dentro da vida da série
+MAX_PROBLEM_PCT = 0.02           # reprovado se mais de 2% das observações tiverem problema
+
+def build_price_panel(series_by_ticker):
+    """Monta o painel (datas x tickers) a partir de séries individuais, contando timestamps duplicados.
+
+    Retorna (painel, duplicados_por_ticker). Em duplicatas, a última observação é mantida.
+    """
+    duplicates = {}
+    cleaned = {}
+    for ticker, series in series_by_ticker.items():
+        dup_mask = series.index.duplicated(keep="last")
+        duplicates[ticker] = int(dup_mask.sum())
+        cleaned[ticker] = series[~dup_mask]
+    if not cleaned:
+        return pd.DataFrame(), pd.Series(dtype="int64")
+    panel = pd.concat(cleaned, axis=1).sort_index()
+    return panel, pd.Series(duplicates, dtype="int64")
+
+def _runs_since_last_true(flags):
+    """Para cada célula, quantas linhas se passaram desde o último True na coluna (vetorizado)."""
+    n_rows = flags.shape[0]
+    row_idx = np.arange(n_rows)[:, None]
+    last_true = np.where(flags, row_idx, 0)
+    np.maximum.accumulate(last_true, axis=0, out=last_true)
+    return row_idx - last_true
+
+@instrumentacao.instrumentado("validacao.painel")
+def validate_price_panel(panel, duplicates=None, repair=False,
+                         spike_log_return=SPIKE_LOG_RETURN, stale_run_days=STALE_RUN_DAYS,
+                         gap_days=GAP_DAYS, max_problem_pct=MAX_PROBLEM_PCT):
+    """Executa todas as verificações de qualidade sobre o painel inteiro em uma única passada vetorizada.
+
+    Verificações: preços não positivos, spikes (salto que reverte no pregão seguinte), saltos com razão
+    de split não ajustado, preços parados por muitos pregões e lacunas longas entre observações.
+
+    Retorna (painel_resultante, flags, relatorio):
+    - painel_resultante: o próprio painel ou, com `repair=True`, com spikes e preços não positivos
+      substituídos pelo último preço válido;
+    - flags: DataFrame booleano (datas x tickers) marcando as observações problemáticas;
+    - relatorio: DataFrame por ticker com as contagens e a coluna `aprovado`.
+    """
+    if panel is None or panel.empty:
+        return panel, pd.DataFrame(), pd.DataFrame()
+
+    values = panel.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    non_positive = valid & (values <= 0)
+
+    # Log-retornos entre observações válidas consecutivas de cada coluna
+    positive = np.where(valid & ~non_positive, values, np.nan)
+    filled = pd.DataFrame(positive).ffill().to_numpy()
+    log_ret = np.full_like(values, np.nan)
+    log_ret[1:] = np.log(filled[1:] / filled[:-1])
+    log_ret[~valid | non_positive] = np.nan
+    next_ret = np.full_like(values, np.nan)
+    next_ret[:-1] = log_ret[1:]
+
+    abs_ret = np.abs(log_ret)
+    big_move = abs_ret > spike_log_return
+    reverts = (np.sign(next_ret) == -np.sign(log_ret)) & (np.abs(next_ret) >= SPIKE_REVERSION_RATIO * abs_ret)
+    spikes = big_move & reverts
+
+    # O pregão que desfaz um spike também é um salto grande, mas não deve ser tratado como split
+    after_spike = np.zeros_like(spikes)
+    after_spike[1:] = spikes[:-1]
+    candidates = big_move & ~reverts & ~after_spike
+    split_jumps = np.zeros_like(candidates)
+    if candidates.any():
+        jump_ratio = np.exp(abs_ret[candidates])
+        closest = np.abs(jump_ratio[:, None] / SPLIT_RATIOS - 1).min(axis=1)
+        split_jumps[candidates] = closest < SPLIT_TOLERANCE
+
+    unchanged = np.zeros_like(valid)
+    unchanged[1:] = valid[1:] & (filled[1:] == filled[:-1])
+    stale_run = _runs_since_last_true(~unchanged)
+    stale = unchanged & (stale_run >= stale_run_days)
+
+    # Lacunas: dias corridos desde a observação válida anterior (apenas dentro da vida da série)
+    dates = panel.index.values.astype("datetime64[D]").astype(np.int64)
+    last_valid_day = np.where(valid, dates[:, None], np.iinfo(np.int64).min)
+    prev_valid_day = np.full_like(last_valid_day, np.iinfo(np.int64).min)
+    prev_valid_day[1:] = np.maximum.accumulate(last_valid_day, axis=0)[:-1]
+    has_prev = prev_valid_day > np.iinfo(np.int64).min
+    gap_len = np.where(valid & has_prev, dates[:, None] - prev_valid_day, 0)
+    gaps = gap_len > gap_days
+
+    problems = non_positive | spikes | split_jumps | stale | gaps
+    flags = pd.DataFrame(problems, index=panel.index, columns=panel.columns)
+
+    n_obs = valid.sum(axis=0)
+    report = pd.DataFrame({
+        "n_obs": n_obs,
+        "n_duplicados": (duplicates.reindex(panel.columns).fillna(0).astype("int64").to_numpy()
+                         if duplicates is not None else np.zeros(panel.shape[1], dtype=np.int64)),
+        "n_nao_positivos": non_positive.sum(axis=0),
+        "n_spikes": spikes.sum(axis=0),
+        "n_saltos_split": split_jumps.sum(axis=0),
+        "n_parados": stale.sum(axis=0),
+        "max_pregoes_parado": np.where(unchanged, stale_run, 0).max(axis=0),
+        "max_gap_dias": gap_len.max(axis=0),
+    }, index=pd.Index(panel.columns, name="ticker"))
+    report["pct_problemas"] = (problems.sum(axis=0) / np.maximum(n_obs, 1)).round(4)
+    report["aprovado"] = (
+        (report["n_obs"] > 0)
+        & (report["n_saltos_split"] == 0)
+        & (report["pct_problemas"] <= max_problem_pct)
+    )
+    report["data_validacao"] = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    if repair:
+        repaired = np.where(spikes | non_positive, np.nan, values)
+        repaired = pd.DataFrame(repaired, index=panel.index, columns=panel.columns)
+        # Só preenche os buracos criados pelo reparo, não o período antes do início da série
+        panel = repaired.where(~(spikes | non_positive), repaired.ffill())
+    return panel, flags, report
+
+def validate_price_series(series, ticker, **kwargs):
+    """Atalho para validar uma única série de preços (usado na coleta)."""
+    panel, duplicates = build_price_panel({ticker: series})
+    return validate_price_panel(panel, duplicates=duplicates, **kwargs)
+
+def save_quality_report(report):
+    """Atualiza o relatório de qualidade persistido (uma linha por ticker, a mais recente prevalece)."""
+    if report is None or report.empty:
+        return None
+    filepath = os.path.join(DATA_DIR, QUALITY_REPORT_FILE)
+    existing = load_quality_report()
+    if existing is not None and not existing.empty:
+        report = pd.concat([existing[~existing.index.isin(report.index)], report])
+    report.sort_index().to_csv(filepath)
+    return filepath
+
+def load_quality_report():
+    """Carrega o relatório de qualidade persistido (ou None)."""
+    filepath = os.path.join(DATA_DIR, QUALITY_REPORT_FILE)
+    if not os.path.exists(filepath):
+        return None
+    try:
+        return pd.read_csv(filepath, index_col="ticker")
+    except Exception as e:
+        print(f"Erro ao carregar relatório de qualidade {filepath}: {e}")
+        return None
+
+def failing_tickers(report):
+    """Lista os tickers reprovados em um relatório de qualidade."""
+    if report is None or report.empty:
+        return []
+    return report.index[~report["aprovado"].astype(bool)].tolist()
+
+if __name__ == "__main__":
+    # Exemplo: painel sintético com defeitos injetados
+    dates = pd.bdate_range("2020-01-01", periods=1000)
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (1000, 4)), axis=0)),
+                          index=dates, columns=["OK", "SPIKE", "SPLIT", "PARADO"])
+    prices.iloc[500, 1] *= 3            # spike de um pregão
+    prices.iloc[600:, 2] /= 2           # split 2:1 não ajustado
+    prices.iloc[300:330, 3] = prices.iloc[300, 3]  # 30 pregões parados
+    repaired, flags, report = validate_price_panel(prices, repair=True)
+    print(report.drop(columns="data_validacao").to_string())
+    print(f"Preço reparado do spike: {repaired.iloc[500, 1]:.2f} (original {prices.iloc[500, 1]:.2f})")
@@ -0,0 +1,263 @@
+import time
+import json
+import io
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Número padrão de pontos por série enviados ao navegador.
+# ~2x a largura típica de um gráfico em pixels é suficiente para não perder picos visuais.
+DEFAULT_MAX_POINTS = 2000
+
+def _as_frame(data):
+    """Normaliza Series/DataFrame para DataFrame com índice ordenado."""
+    if isinstance(data, pd.Series):
+        data = data.to_frame(name=data.name if data.name is not None else "valor")
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    return data
+
+def _x_as_numeric(index):
+    """Converte o índice (DatetimeIndex ou numérico) para float64, usado no cálculo das áreas do LTTB."""
+    if isinstance(index, pd.DatetimeIndex):
+        return index.asi8.astype(np.float64)
+    return np.asarray(index, dtype=np.float64)
+
+def minmax_downsample(df, max_points=DEFAULT_MAX_POINTS):
+    """Reduz cada coluna para no máximo `max_points` pontos mantendo o mínimo e o máximo de cada bucket.
+
+    A operação é vetorizada sobre todas as colunas de uma vez (buckets de tamanho fixo em linhas).
+    Retorna um dicionário {coluna: pd.Series} pois cada coluna seleciona posições diferentes.
+    """
+    df = _as_frame(df)
+    n_rows = len(df)
+    if n_rows <= max_points or max_points < 4:
+        return {col: df[col] for col in df.columns}
+
+    n_buckets = max_points // 2
+    bucket_size = int(np.ceil(n_rows / n_buckets))
+    n_buckets = int(np.ceil(n_rows / bucket_size))
+    padded_rows = n_buckets * bucket_size
+
+    values = df.to_numpy(dtype=np.float64)
+    padded = np.full((padded_rows, values.shape[1]), np.nan)
+    padded[:n_rows] = values
+    nan_mask = np.isnan(padded)
+    buckets_for_min = np.where(nan_mask, np.inf, padded).reshape(n_buckets, bucket_size, -1)
+    buckets_for_max = np.where(nan_mask, -np.inf, padded).reshape(n_buckets, bucket_size, -1)
+
+    offsets = np.arange(n_buckets)[:, None] * bucket_size
+    idx_min = buckets_for_min.argmin(axis=1) + offsets
+    idx_max = buckets_for_max.argmax(axis=1) + offsets
+
+    # Mantém a ordem temporal dentro de cada bucket (primeiro o ponto que ocorre antes)
+    first = np.minimum(idx_min, idx_max)
+    second = np.maximum(idx_min, idx_max)
+    selected = np.empty((n_buckets * 2, values.shape[1]), dtype=np.int64)
+    selected[0::2] = first
+    selected[1::2] = second
+    selected = np.minimum(selected, n_rows - 1)
+
+    result = {}
+    for j, col in enumerate(df.columns):
+        rows = np.unique(selected[:, j])
+        series = df[col].iloc[rows]
+        result[col] = series.dropna()
+    return result
+
+def lttb_downsample(df, max_points=DEFAULT_MAX_POINTS):
+    """Largest-Triangle-Three-Buckets aplicado a todas as colunas simultaneamente.
+
+    O laço percorre apenas os buckets (no máximo `max_points`); dentro de cada bucket o cálculo
+    da área dos triângulos é feito em bloco para todas as colunas com NumPy.
+    Retorna um dicionário {coluna: pd.Series}.
+    """
+    df = _as_frame(df)
+    n_rows = len(df)
+    if n_rows <= max_points or max_points < 3:
+        return {col: df[col] for col in df.columns}
+
+    x = _x_as_numeric(df.index)
+    y = df.to_numpy(dtype=np.float64)
+    # NaN (ex.: antes do início da série) não pode vencer a disputa de área
+    y_filled = pd.DataFrame(y).ffill().bfill().to_numpy()
+    n_cols = y.shape[1]
+
+    edges = np.linspace(1, n_rows - 1, max_points - 1).astype(np.int64)
+    selected = np.empty((max_points, n_cols), dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n_rows - 1
+    prev = np.zeros(n_cols, dtype=np.int64)
+    col_idx = np.arange(n_cols)
+
+    for b in range(max_points - 2):
+        start, end = edges[b], edges[b + 1]
+        if end <= start:
+            end = start + 1
+        next_start, next_end = end, edges[b + 2] if b + 2 < len(edges) else n_rows
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y_filled[next_start:next_end].mean(axis=0)
+
+        ax = x[prev]
+        ay = y_filled[prev, col_idx]
+        bucket_x = x[start:end][:, None]
+        bucket_y = y_filled[start:end]
+        areas = np.abs((ax - avg_x) * (bucket_y - ay) - (ax - bucket_x) * (avg_y - ay))
+        chosen = areas.argmax(axis=0) + start
+        selected[b + 1] = chosen
+        prev = chosen
+
+    result = {}
+    for j, col in enumerate(df.columns):
+        rows = np.unique(selected[:, j])
+        result[col] = df[col].iloc[rows].dropna()
+    return result
+
+def downsample(df, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Seleciona o algoritmo de redução ('lttb' ou 'minmax')."""
+    if method == "minmax":
+        return minmax_downsample(df, max_points)
+    if method == "lttb":
+        return lttb_downsample(df, max_points)
+    raise ValueError(f"Método de downsampling '{method}' não suportado.")
+
+def _x_for_plotly(index):
+    """Converte o índice para um array NumPy antes de entregá-lo ao Plotly.
+
+    Passar o DatetimeIndex diretamente faz o Plotly validar/serializar elemento a elemento (lento).
+    Para séries diárias, datas sem hora reduzem o payload JSON em ~25%.
+    """
+    if isinstance(index, pd.DatetimeIndex):
+        values = index.tz_localize(None).to_numpy() if index.tz is not None else index.to_numpy()
+        if len(index) and (index.normalize() == index).all():
+            return np.datetime_as_string(values, unit="D")
+        return values
+    return np.asarray(index)
+
+def _add_traces(fig, series_by_name, row=None, col=None):
+    for name, series in series_by_name.items():
+        trace = go.Scattergl(x=_x_for_plotly(series.index), y=series.to_numpy(), mode="lines", name=str(name))
+        if row is None:
+            fig.add_trace(trace)
+        else:
+            fig.add_trace(trace, row=row, col=col)
+
+def build_line_figure(data, title=None, max_points=DEFAULT_MAX_POINTS, method="lttb", y_title=None):
+    """Cria uma figura Plotly interativa a partir de uma Series/DataFrame, com downsampling no servidor."""
+    df = _as_frame(data)
+    fig = go.Figure()
+    _add_traces(fig, downsample(df, max_points, method))
+    fig.update_layout(title=title, hovermode="x unified", margin=dict(l=10, r=10, t=40 if title else 10, b=10))
+    if y_title:
+        fig.update_yaxes(title_text=y_title)
+    return fig
+
+def build_price_indicators_figure(df, price_column="Adj Close", sma_columns=None, rsi_column=None,
+                                  title=None, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Gráfico de preço com médias móveis e, opcionalmente, um painel inferior com o RSI."""
+    df = _as_frame(df)
+    price_cols = [price_column] + [c for c in (sma_columns or []) if c in df.columns]
+    has_rsi = rsi_column is not None and rsi_column in df.columns
+
+    if has_rsi:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.04)
+        _add_traces(fig, downsample(df[price_cols], max_points, method), row=1, col=1)
+        _add_traces(fig, downsample(df[[rsi_column]], max_points, method), row=2, col=1)
+        fig.add_hline(y=70, line_dash="dot", line_color="red", row=2, col=1)
+        fig.add_hline(y=30, line_dash="dot", line_color="green", row=2, col=1)
+        fig.update_yaxes(title_text="RSI", range=[0, 100], row=2, col=1)
+    else:
+        fig = go.Figure()
+        _add_traces(fig, downsample(df[price_cols], max_points, method))
+    fig.update_layout(title=title, hovermode="x unified", margin=dict(l=10, r=10, t=40 if title else 10, b=10))
+    return fig
+
+def build_backtest_figure(equity_df, title=None, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Curva de patrimônio (e drawdown) de um backtest a partir dos arrays de resultado, sem gravar PNG.
+
+    `equity_df` pode ser `results.prices` do bt ou qualquer DataFrame de patrimônio por estratégia.
+    """
+    equity_df = _as_frame(equity_df)
+    drawdown = equity_df / equity_df.cummax() - 1
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.04)
+    _add_traces(fig, downsample(equity_df, max_points, method), row=1, col=1)
+    # minmax preserva os vales do drawdown, que são justamente o ponto de interesse
+    _add_traces(fig, {f"{name} (drawdown)": s for name, s in downsample(drawdown, max_points, "minmax").items()}, row=2, col=1)
+    fig.update_yaxes(title_text="Patrimônio", row=1, col=1)
+    fig.update_yaxes(title_text="Drawdown", tickformat=".0%", row=2, col=1)
+    fig.update_layout(title=title, hovermode="x unified", margin=dict(l=10, r=10, t=40 if title else 10, b=10))
+    return fig
+
+def build_correlation_heatmap(corr, title=None):
+    """Mapa de calor de uma matriz de correlação (já na ordem desejada, ex: agrupada), escala fixa em [-1, 1]."""
+    labels = [str(c) for c in corr.columns]
+    fig = go.Figure(go.Heatmap(z=corr.to_numpy(), x=labels, y=labels, zmin=-1, zmax=1, colorscale="RdBu_r",
+                               hovertemplate="%{y} x %{x}: %{z:.2f}<extra></extra>"))
+    fig.update_layout(title=title, margin=dict(l=10, r=10, t=40 if title else 10, b=10), height=max(400, min(12 * len(labels), 900)))
+    fig.update_yaxes(autorange="reversed")
+    return fig
+
+def _synthetic_panel(n_years, n_assets, seed=42):
+    """Gera um painel de preços sintético (passeio aleatório geométrico) em dias úteis."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=int(n_years * 252))
+    log_returns = rng.normal(0.0003, 0.02, size=(len(dates), n_assets))
+    prices = 100 * np.exp(np.cumsum(log_returns, axis=0))
+    return pd.DataFrame(prices, index=dates, columns=[f"ATIVO_{i:03d}" for i in range(n_assets)])
+
+def benchmark_charting(n_years=20, n_assets=50, max_points=DEFAULT_MAX_POINTS):
+    """Compara tamanho do payload e tempo de renderização entre o caminho antigo e o novo.
+
+    - 'matplotlib_png': plot + savefig em PNG (caminho antigo do backtest)
+    - 'plotly_completo': figura Plotly com todos os pontos
+    - 'plotly_lttb' / 'plotly_minmax': figura Plotly com downsampling no servidor
+    O tempo inclui a serialização da figura, que é o que o Streamlit envia ao navegador.
+    """
+    panel = _synthetic_panel(n_years, n_assets)
+    results = []
+
+    def _measure(label, build):
+        start = time.perf_counter()
+        payload = build()
+        elapsed = time.perf_counter() - start
+        results.append({"metodo": label, "tempo_s": round(elapsed, 4), "payload_bytes": len(payload)})
+
+    def _matplotlib_png():
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        ax = panel.plot(legend=False, figsize=(15, 5))
+        buffer = io.BytesIO()
+        ax.figure.savefig(buffer, format="png")
+        plt.close(ax.figure)
+        return buffer.getvalue()
+
+    def _plotly(method):
+        def build():
+            if method is None:
+                fig = go.Figure()
+                _add_traces(fig, {col: panel[col] for col in panel.columns})
+            else:
+                fig = build_line_figure(panel, max_points=max_points, method=method)
+            return fig.to_json().encode("utf-8")
+        return build
+
+    _measure("matplotlib_png", _matplotlib_png)
+    _measure("plotly_completo", _plotly(None))
+    _measure("plotly_lttb", _plotly("lttb"))
+    _measure("plotly_minmax", _plotly("minmax"))
+
+    df_results = pd.DataFrame(results)
+    df_results["pontos_por_serie"] = [len(panel), len(panel), min(len(panel), max_points), min(len(panel), max_points)]
+    return df_results
+
+if __name__ == "__main__":
+    print(f"--- Benchmark de gráficos: 20 anos x 50 ativos (max_points={DEFAULT_MAX_POINTS}) ---")
+    df_bench = benchmark_charting(n_years=20, n_assets=50)
+    print(df_bench.to_string(index=False))
+    with open("benchmark_graficos.json", "w") as f:
+        json.dump(df_bench.to_dict(orient="records"), f, indent=4)
+    print("Resultados salvos em benchmark_graficos.json")